@@ -0,0 +1,119 @@
+import numpy as np
+from dataclasses import dataclass
+
+# Longest schedule we materialize; payoffs beyond this are still counted
+# exactly by the closed form, only the per-month arrays are truncated.
+MAX_SCHEDULE_MONTHS = 600
+
+@dataclass
+class AmortizationSchedule:
+    """Month-by-month schedules for a broadcast batch of loans.
+
+    Scalar inputs have shape ``()``; per-month arrays add a trailing axis of
+    length ``balance.shape[-1]``, trimmed to the longest payoff in the batch.
+    """
+    principal: np.ndarray
+    annual_rate: np.ndarray
+    payment: np.ndarray
+    months: np.ndarray                 # int, -1 where the loan never pays off
+    negative_amortization: np.ndarray  # payment <= monthly interest
+    total_interest: np.ndarray         # nan where the loan never pays off
+    balance: np.ndarray                # balance after each month's payment
+    interest: np.ndarray               # interest charged each month
+    principal_paid: np.ndarray         # principal repaid each month
+
+    @property
+    def total_payment(self) -> np.ndarray:
+        return self.principal + self.total_interest
+
+def payoff_months(principal, annual_rate, payment):
+    """Closed-form number of payments; -1 where the payment never retires the debt"""
+    principal, annual_rate, payment = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64),
+        np.asarray(annual_rate, dtype=np.float64),
+        np.asarray(payment, dtype=np.float64)
+    )
+    r = annual_rate / 12 / 100
+    interest_only = principal * r
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # n = -log(1 - rP/A) / log(1 + r), or P/A without interest
+        amortizing = -np.log1p(-interest_only / payment) / np.log1p(r)
+        exact = np.where(r > 0, amortizing, principal / payment)
+
+    negative = (payment <= interest_only) | (payment <= 0)
+    # Guard ceil() against values like 12.000000001 from rounding
+    months = np.ceil(np.where(negative, 0, exact) - 1e-9).astype(np.int64)
+    months = np.where(principal <= 0, 0, months)
+    return np.where(negative & (principal > 0), -1, months), negative & (principal > 0)
+
+def _balance_after(principal, r, payment, k):
+    growth = np.power(1 + r, k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(r > 0, (growth - 1) / r, k)
+    return principal * growth - payment * annuity
+
+def amortize(principal, annual_rate, payment, max_months=MAX_SCHEDULE_MONTHS) -> AmortizationSchedule:
+    """Full schedules for every combination of the broadcast inputs.
+
+    ``principal``, ``annual_rate`` (percent) and ``payment`` follow NumPy
+    broadcasting, so sweeping payments for several debts is e.g.
+    ``amortize(balances[:, None], rates[:, None], payments[None, :])``.
+    """
+    principal, annual_rate, payment = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64),
+        np.asarray(annual_rate, dtype=np.float64),
+        np.asarray(payment, dtype=np.float64)
+    )
+    r = annual_rate / 12 / 100
+    months, negative = payoff_months(principal, annual_rate, payment)
+
+    # Totals from the closed form: n-1 full payments plus a final partial one
+    last = np.maximum(months, 1)
+    final_payment = _balance_after(principal, r, payment, last - 1) * (1 + r)
+    total_paid = np.where(months > 0, payment * (last - 1) + final_payment, 0.0)
+    total_interest = np.where(negative, np.nan, total_paid - principal)
+
+    finite = months[months >= 0]
+    horizon = int(finite.max()) if finite.size else 0
+    if negative.any():
+        horizon = max_months
+    horizon = min(horizon, max_months)
+
+    k = np.arange(horizon + 1, dtype=np.float64)
+    balance = _balance_after(principal[..., None], r[..., None], payment[..., None], k)
+    paid_off = (k >= months[..., None]) & ~negative[..., None]
+    balance = np.where(paid_off, 0.0, balance)
+    balance[..., 0] = principal
+
+    interest = balance[..., :-1] * r[..., None]
+    principal_paid = balance[..., :-1] - balance[..., 1:]
+
+    return AmortizationSchedule(
+        principal=principal,
+        annual_rate=annual_rate,
+        payment=payment,
+        months=months,
+        negative_amortization=negative,
+        total_interest=total_interest,
+        balance=balance[..., 1:],
+        interest=interest,
+        principal_paid=principal_paid
+    )
+
+def payoff_sweep(principal: float, annual_rate: float, payments) -> dict:
+    """Months and total interest for many payment amounts, without schedules"""
+    payments = np.asarray(payments, dtype=np.float64)
+    r = annual_rate / 12 / 100
+    months, negative = payoff_months(principal, annual_rate, payments)
+    last = np.maximum(months, 1)
+    final_payment = _balance_after(principal, r, payments, last - 1) * (1 + r)
+    total_interest = np.where(
+        negative, np.nan, payments * (last - 1) + final_payment - principal
+    )
+    return {
+        'payment': payments,
+        'months': months,
+        'total_interest': total_interest,
+        'negative_amortization': negative
+    }
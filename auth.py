@@ -1,12 +1,51 @@
+import ipaddress
+import os
 import streamlit as st
 from database import get_db_connection
+from auth_service import AuthBusy, LoginThrottled, get_auth_service
 from models import User
 
+# Comma-separated addresses or networks of the reverse proxies in front of
+# the app, e.g. "127.0.0.1,10.0.0.0/8". X-Forwarded-For is only believed
+# when the connection comes from one of them.
+TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.environ.get('TRUSTED_PROXIES', '').split(',') if proxy.strip()
+)
+
 def init_auth():
     if 'user' not in st.session_state:
         st.session_state.user = None
 
-def login_user(username: str, password: str) -> bool:
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def _forwarded_client(forwarded: list):
+    """Right-most X-Forwarded-For hop that isn't one of our proxies"""
+    hops = [hop.strip() for header in forwarded for hop in header.split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    # Every hop is a proxy; the left-most is the closest we know to the client
+    return hops[0] if hops else None
+
+def client_ip():
+    """Best-effort client address for throttling; None outside a browser session"""
+    try:
+        peer = st.context.ip_address
+        # Streamlit reports loopback peers, e.g. a proxy on this host, as None
+        if _is_trusted_proxy(peer or '127.0.0.1'):
+            return _forwarded_client(st.context.headers.get_all('X-Forwarded-For')) or peer
+        return peer
+    except Exception:
+        return None
+
+def _fetch_login(username: str):
+    # The connection goes back to the pool before any hashing happens
     conn = get_db_connection()
     cur = conn.cursor()
     try:
@@ -14,22 +53,33 @@ def login_user(username: str, password: str) -> bool:
             "SELECT id, username, password_hash, is_admin, created_at FROM users WHERE username = %s",
             (username,)
         )
-        user_data = cur.fetchone()
-        
-        if user_data and User.verify_password(password, user_data[2]):
-            st.session_state.user = User(
-                id=user_data[0],
-                username=user_data[1],
-                is_admin=user_data[3],
-                created_at=user_data[4]
-            )
-            return True
-        return False
+        return cur.fetchone()
     finally:
         cur.close()
         conn.close()
 
+def login_user(username: str, password: str) -> bool:
+    """Log in; raises LoginThrottled or AuthBusy when the attempt can't be checked"""
+    service = get_auth_service()
+    service.throttle(username, client_ip())
+
+    user_data = _fetch_login(username)
+    if user_data and service.verify_password(password, user_data[2]):
+        service.login_succeeded(username)
+        st.session_state.user = User(
+            id=user_data[0],
+            username=user_data[1],
+            is_admin=user_data[3],
+            created_at=user_data[4]
+        )
+        return True
+    return False
+
 def register_user(username: str, password: str) -> bool:
+    """Register and log in; raises LoginThrottled or AuthBusy like login_user"""
+    service = get_auth_service()
+    service.throttle(ip=client_ip())
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
@@ -37,15 +87,29 @@ def register_user(username: str, password: str) -> bool:
         cur.execute("SELECT COUNT(*) FROM users WHERE username = %s", (username,))
         if cur.fetchone()[0] > 0:
             return False
-        
-        password_hash = User.hash_password(password)
+    finally:
+        cur.close()
+        conn.close()
+
+    password_hash = service.hash_password(password)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
         cur.execute(
-            "INSERT INTO users (username, password_hash) VALUES (%s, %s) RETURNING id, created_at",
+            """
+            INSERT INTO users (username, password_hash) VALUES (%s, %s)
+            ON CONFLICT (username) DO NOTHING
+            RETURNING id, created_at
+            """,
             (username, password_hash)
         )
-        user_id, created_at = cur.fetchone()
+        created = cur.fetchone()
         conn.commit()
-        
+        if not created:
+            return False
+        user_id, created_at = created
+
         st.session_state.user = User(
             id=user_id,
             username=username,
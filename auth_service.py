@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models import User
+
+# bcrypt runs in a small worker pool instead of on the Streamlit script
+# thread, and callers never hold a DB connection while it runs. Login and
+# registration attempts are throttled per username and per client IP with
+# in-memory token buckets, so a brute-force burst is turned away before it
+# costs a hash.
+
+AUTH_WORKERS = int(os.environ.get('AUTH_WORKERS', 4))
+AUTH_MAX_PENDING = int(os.environ.get('AUTH_MAX_PENDING', 64))
+AUTH_QUEUE_TIMEOUT = float(os.environ.get('AUTH_QUEUE_TIMEOUT', 5))
+LOGIN_ATTEMPTS_PER_USERNAME = float(os.environ.get('LOGIN_ATTEMPTS_PER_USERNAME', 5))
+LOGIN_ATTEMPTS_PER_IP = float(os.environ.get('LOGIN_ATTEMPTS_PER_IP', 20))
+LOGIN_ATTEMPT_WINDOW = float(os.environ.get('LOGIN_ATTEMPT_WINDOW', 60))
+THROTTLE_MAX_KEYS = 10000
+
+class AuthBusy(Exception):
+    """The hashing pool is saturated"""
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many attempts; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Per-key token buckets: ``capacity`` attempts, refilled over ``window`` seconds"""
+
+    def __init__(self, capacity: float, window: float, max_keys: int = THROTTLE_MAX_KEYS):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def try_acquire(self, key) -> float:
+        """Take a token; returns 0 on success, otherwise seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _prune(self, now):
+        # Buckets that have refilled are indistinguishable from new ones
+        full = [key for key in self._buckets if self._tokens(key, now) >= self.capacity]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            oldest = sorted(self._buckets, key=lambda key: self._buckets[key][1])
+            for key in oldest[:len(self._buckets) - self.max_keys]:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+class AuthService:
+    def __init__(self, workers: int = AUTH_WORKERS, max_pending: int = AUTH_MAX_PENDING,
+                 queue_timeout: float = AUTH_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._throttled = 0
+        self._hash_time_total = 0.0
+        self._wait_time_total = 0.0
+        self.usernames = TokenBucket(LOGIN_ATTEMPTS_PER_USERNAME, LOGIN_ATTEMPT_WINDOW)
+        self.addresses = TokenBucket(LOGIN_ATTEMPTS_PER_IP, LOGIN_ATTEMPT_WINDOW)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise AuthBusy("Authentication is busy; please try again")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                self._running += 1
+                self._wait_time_total += started - submitted
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._hash_time_total += time.perf_counter() - started
+                self._slots.release()
+
+        return self._executor.submit(task).result()
+
+    def hash_password(self, password: str) -> str:
+        return self._run(User.hash_password, password)
+
+    def verify_password(self, password: str, password_hash: str) -> bool:
+        return self._run(User.verify_password, password, password_hash)
+
+    def throttle(self, username=None, ip=None):
+        """Spend one attempt for the username and the client IP, or raise LoginThrottled"""
+        waits = []
+        if username:
+            waits.append(self.usernames.try_acquire(username.lower()))
+        if ip:
+            waits.append(self.addresses.try_acquire(ip))
+        retry_after = max(waits, default=0.0)
+        if retry_after > 0:
+            with self._lock:
+                self._throttled += 1
+            raise LoginThrottled(retry_after)
+
+    def login_succeeded(self, username: str):
+        self.usernames.reset(username.lower())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self._pending,
+                'running': self._running,
+                'peak_queue_depth': self._peak_pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'throttled': self._throttled,
+                'avg_hash_ms': (self._hash_time_total / self._completed * 1000)
+                               if self._completed else 0.0,
+                'avg_queue_wait_ms': (self._wait_time_total / self._completed * 1000)
+                                     if self._completed else 0.0,
+                'tracked_usernames': len(self.usernames),
+                'tracked_addresses': len(self.addresses),
+            }
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_auth_service() -> AuthService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AuthService()
+    return _service
+
+def get_auth_stats() -> dict:
+    return get_auth_service().stats()
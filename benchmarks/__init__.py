@@ -0,0 +1,6 @@
+"""Synthetic datasets and timing suites for performance work.
+
+datagen.py seeds benchmark users with COPY, suite.py times the data-access
+functions and pages against them, and compare.py diffs two result files.
+loadtest.py drives many concurrent sessions against a running server.
+"""
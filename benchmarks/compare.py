@@ -0,0 +1,69 @@
+"""Compare two benchmark result files and flag regressions.
+
+Compares the median cold time of each function and the median render time
+of each page. Exits non-zero if anything is slower than ``--threshold``
+times the baseline and more than ``--min-ms`` slower in absolute terms:
+
+    python -m benchmarks.compare base.json new.json --threshold 1.2
+"""
+import argparse
+import json
+import sys
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def medians(report: dict) -> dict:
+    """benchmark name -> median ms"""
+    values = {}
+    for name, result in report.get('functions', {}).items():
+        values[name] = result['cold_ms']['median']
+    for page, result in report.get('pages', {}).items():
+        if 'error' not in result:
+            values[f"page {page}"] = result['ms']['median']
+    return values
+
+def compare(base: dict, new: dict, threshold: float, min_ms: float) -> list:
+    """Print a side-by-side table; return the names that regressed"""
+    base_ms, new_ms = medians(base), medians(new)
+    if base['meta'].get('scale') != new['meta'].get('scale'):
+        print(f"warning: comparing scale {base['meta'].get('scale')} "
+              f"with {new['meta'].get('scale')}")
+    print(f"{'benchmark':55} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = []
+    for name in sorted(base_ms.keys() | new_ms.keys()):
+        if name not in base_ms or name not in new_ms:
+            before = f"{base_ms[name]:10.2f}" if name in base_ms else f"{'-':>10}"
+            after = f"{new_ms[name]:10.2f}" if name in new_ms else f"{'-':>10}"
+            print(f"{name:55} {before} {after}")
+            continue
+        ratio = new_ms[name] / base_ms[name] if base_ms[name] else float('inf')
+        regressed = ratio > threshold and new_ms[name] - base_ms[name] > min_ms
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:55} {base_ms[name]:10.2f} {new_ms[name]:10.2f} {ratio:7.2f}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument('--min-ms', type=float, default=1.0,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    base, new = load(args.base), load(args.new)
+    print(f"base {base['meta'].get('commit', '')[:10]}  new {new['meta'].get('commit', '')[:10]}\n")
+    regressions = compare(base, new, args.threshold, args.min_ms)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
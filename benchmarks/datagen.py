@@ -0,0 +1,403 @@
+"""Seed deterministic synthetic users for benchmarks.
+
+Each benchmark user gets ``years`` of income and expenses ending at
+``end_date`` (today by default), plus payment sources, custom categories,
+budgets, debts, goals and two monthly recurring rules. Rows are streamed
+with COPY. The fingerprint and rollup triggers still fire, so the data is
+indistinguishable from rows entered through the app. The same seed and
+end date always produce the same rows. Run it from the repository root
+against a scratch database:
+
+    python -m benchmarks.datagen --scale 100k
+    python -m benchmarks.datagen --users 5 --years 3 --per-month 60
+    python -m benchmarks.datagen --scale 100k --drop
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from typing import Dict, List
+import numpy as np
+from cache import invalidate_user
+from database import _connect, run_migrations
+from importer import _CopyStream, _csv_chunks
+from models import User
+from recurrence import RECURRENCE_LOOKAHEAD_DAYS, sweep
+
+# Every benchmark user logs in with this password (see benchmarks/loadtest.py)
+BENCH_PASSWORD = 'benchmark'
+
+# Transactions per user per month are split between one-off income and
+# expenses; salary and rent come from the recurring rules on top of that.
+SCALES = {
+    '1k': {'users': 2, 'years': 2, 'per_month': 21},
+    '100k': {'users': 20, 'years': 5, 'per_month': 84},
+    '10m': {'users': 500, 'years': 10, 'per_month': 167},
+}
+INCOME_SHARE = 0.08
+
+# name -> (share of expenses, typical amount, necessity level, merchants)
+EXPENSE_CATEGORIES = {
+    'Groceries': (0.30, 45.0, 'Essential', ('FreshCo', 'Corner Grocer', 'Green Market', 'Aldway')),
+    'Dining Out': (0.15, 28.0, 'Optional', ('Cafe Luna', 'Pizza Place', 'Noodle Bar', 'Taqueria')),
+    'Transportation': (0.15, 35.0, 'Important',
+                       ('Metro Transit', 'Fuel Stop', 'RideShare', 'City Parking')),
+    'Entertainment': (0.10, 40.0, 'Optional', ('Cinema', 'Concert Hall', 'Bookshop', 'Game Store')),
+    'Subscriptions': (0.10, 14.0, 'Important', ('Streaming', 'Music', 'Cloud Storage', 'Gym')),
+    'Housing': (0.10, 90.0, 'Essential',
+                ('Electric Co', 'Water Utility', 'Internet', 'Hardware Store')),
+    'Healthcare': (0.05, 60.0, 'Essential', ('Pharmacy', 'Dental Clinic', 'Optician')),
+    'Education': (0.05, 75.0, 'Important', ('Online Course', 'Textbooks')),
+}
+# name -> (share of one-off income, typical amount, payers)
+INCOME_CATEGORIES = {
+    'Freelance': (0.6, 450.0, ('Client invoice', 'Consulting', 'Design work')),
+    'Side Projects': (0.3, 120.0, ('Marketplace sale', 'Tutoring')),
+    'Bonus': (0.1, 1500.0, ('Performance bonus', 'Referral bonus')),
+}
+# Categories created per user; the rest are the app's defaults
+CUSTOM_CATEGORIES = (('Dining Out', 'expense'), ('Subscriptions', 'expense'),
+                     ('Side Projects', 'income'))
+
+# (name, type, bank, active); expenses use the active ones with these weights
+PAYMENT_SOURCES = (
+    ('Everyday Checking', 'bank_account', 'First Bank', True),
+    ('Rewards Visa', 'credit_card', 'First Bank', True),
+    ('Debit Card', 'debit_card', 'Credit Union', True),
+    ('Old Mastercard', 'credit_card', 'Other Bank', False),
+)
+PAYMENT_SOURCE_WEIGHTS = (0.25, 0.5, 0.25)
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    name: str
+    users: int
+    years: int
+    per_month: int
+    seed: int = 42
+    end_date: date = field(default_factory=date.today)
+
+    @property
+    def prefix(self) -> str:
+        return f"bench_{self.name}_"
+
+    @property
+    def rows_per_user(self) -> int:
+        """One-off income and expense rows per user (recurring occurrences not counted)"""
+        return self.years * 12 * self.per_month
+
+    @property
+    def rows(self) -> int:
+        return self.users * self.rows_per_user
+
+    @property
+    def start_date(self) -> date:
+        first = np.datetime64(self.end_date, 'M') - (self.years * 12 - 1)
+        return first.astype('datetime64[D]').item()
+
+    def username(self, index: int) -> str:
+        return f"{self.prefix}{index:05d}"
+
+def spec_for(scale: str, **overrides) -> DatasetSpec:
+    """Preset ``scale`` with any non-None overrides (users, years, per_month, seed, end_date)"""
+    if scale not in SCALES:
+        raise ValueError(f"Unknown scale {scale!r}; choose one of {', '.join(SCALES)}")
+    spec = DatasetSpec(scale, **SCALES[scale])
+    return replace(spec, **{key: value for key, value in overrides.items() if value is not None})
+
+@dataclass
+class _UserRefs:
+    """Ids a generated user's rows point at"""
+    user_id: int
+    categories: Dict[str, int]
+    payment_sources: List[int]
+
+def _transactions(spec: DatasetSpec, index: int) -> dict:
+    """Column arrays for one user's one-off transactions; drawn identically for both tables"""
+    rng = np.random.default_rng([spec.seed, index])
+    count = spec.rows_per_user
+    first_month = np.datetime64(spec.end_date, 'M') - (spec.years * 12 - 1)
+    end = np.datetime64(spec.end_date, 'D')
+
+    month = first_month + np.repeat(np.arange(spec.years * 12), spec.per_month)
+    starts = month.astype('datetime64[D]')
+    # The last month stops at end_date
+    days = (np.minimum((month + 1).astype('datetime64[D]'), end + 1) - starts).astype(np.int64)
+    expense_weights = [share for share, *_ in EXPENSE_CATEGORIES.values()]
+    income_weights = [share for share, *_ in INCOME_CATEGORIES.values()]
+    return {
+        'date': (starts + (rng.random(count) * days).astype(np.int64)).tolist(),
+        'is_income': (rng.random(count) < INCOME_SHARE).tolist(),
+        'expense_category': rng.choice(len(EXPENSE_CATEGORIES), count, p=expense_weights).tolist(),
+        'income_category': rng.choice(len(INCOME_CATEGORIES), count, p=income_weights).tolist(),
+        'payment_source': rng.choice(len(PAYMENT_SOURCE_WEIGHTS), count,
+                                     p=PAYMENT_SOURCE_WEIGHTS).tolist(),
+        'scale': np.maximum(rng.lognormal(0.0, 0.6, count), 0.05).tolist(),
+        'name': rng.integers(0, 1 << 20, count).tolist(),
+    }
+
+def _money(amount: float) -> str:
+    return f"{amount:.2f}"
+
+def _income_rows(spec: DatasetSpec, users: List[_UserRefs]):
+    categories = list(INCOME_CATEGORIES.items())
+    for index, refs in enumerate(users):
+        rng = np.random.default_rng([spec.seed, index, 1])
+        # Salary rule; recurrence.sweep() materializes its monthly occurrences
+        yield ('Salary', _money(rng.uniform(3000, 9000)), refs.categories['Salary'],
+               spec.start_date, True, 'Monthly', refs.user_id)
+        t = _transactions(spec, index)
+        for i in range(spec.rows_per_user):
+            if not t['is_income'][i]:
+                continue
+            name, (_, typical, payers) = categories[t['income_category'][i]]
+            yield (f"{payers[t['name'][i] % len(payers)]} #{i}", _money(typical * t['scale'][i]),
+                   refs.categories[name], t['date'][i], False, 'One-time', refs.user_id)
+
+def _expense_rows(spec: DatasetSpec, users: List[_UserRefs]):
+    categories = list(EXPENSE_CATEGORIES.items())
+    for index, refs in enumerate(users):
+        rng = np.random.default_rng([spec.seed, index, 2])
+        checking = refs.payment_sources[0]
+        yield ('Rent', _money(rng.uniform(900, 2500)), refs.categories['Housing'], checking,
+               spec.start_date, 'Essential', True, 'Monthly', refs.user_id)
+        t = _transactions(spec, index)
+        for i in range(spec.rows_per_user):
+            if t['is_income'][i]:
+                continue
+            name, (_, typical, necessity, merchants) = categories[t['expense_category'][i]]
+            yield (f"{merchants[t['name'][i] % len(merchants)]} #{i}",
+                   _money(typical * t['scale'][i]), refs.categories[name],
+                   refs.payment_sources[t['payment_source'][i]], t['date'][i], necessity,
+                   False, 'One-time', refs.user_id)
+
+def _budget_rows(spec: DatasetSpec, users: List[_UserRefs]):
+    expense_share = spec.per_month * (1 - INCOME_SHARE)
+    for refs in users:
+        for name, (weight, typical, _, _) in EXPENSE_CATEGORIES.items():
+            # Roughly the expected monthly spend, so some categories run over
+            yield (refs.categories[name], _money(round(expense_share * weight * typical, -1) + 10),
+                   'monthly', spec.start_date, refs.user_id)
+        share, typical, _, _ = EXPENSE_CATEGORIES['Groceries']
+        weekly_groceries = expense_share * share * typical / 4.3
+        yield (refs.categories['Groceries'], _money(round(weekly_groceries, -1) + 10), 'weekly',
+               spec.start_date, refs.user_id)
+
+def _debt_rows(spec: DatasetSpec, users: List[_UserRefs]):
+    for index, refs in enumerate(users):
+        rng = np.random.default_rng([spec.seed, index, 3])
+        for name, low, high, rate, minimum_share in (('Credit Card', 1500, 8000, 19.99, 0.03),
+                                                    ('Car Loan', 6000, 20000, 6.5, 0.025),
+                                                    ('Student Loan', 8000, 40000, 4.5, 0.012)):
+            total = rng.uniform(low, high)
+            balance = total * rng.uniform(0.3, 0.95)
+            due = spec.end_date + timedelta(days=int(rng.integers(3, 28)))
+            yield (name, _money(total), _money(balance), rate,
+                   _money(max(balance * minimum_share, 25)), due, refs.user_id)
+
+def _goal_rows(spec: DatasetSpec, users: List[_UserRefs]):
+    for index, refs in enumerate(users):
+        rng = np.random.default_rng([spec.seed, index, 4])
+        for name, target, years, priority in (('Emergency Fund', 10000, 1, 'High'),
+                                              ('Vacation', 3000, 1, 'Medium'),
+                                              ('New Car', 15000, 3, 'Low')):
+            deadline = spec.end_date + timedelta(days=365 * years)
+            yield (name, _money(target), _money(target * rng.uniform(0, 0.6)), deadline,
+                   priority, 'in_progress', spec.start_date, refs.user_id)
+
+def _copy(cur, table: str, columns, rows) -> int:
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    _CopyStream(_csv_chunks(rows, rows_per_chunk=5000)))
+    return cur.rowcount
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace('\\', '\\\\').replace('_', '\\_').replace('%', '\\%') + '%'
+
+def dataset_user_ids(prefix: str) -> List[int]:
+    """Ids of a dataset's users, in generation order"""
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM users WHERE username LIKE %s ORDER BY username",
+                    (_like_prefix(prefix),))
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+def generated_rows(user_id: int) -> int:
+    """One-off income and expense rows of a user, for checking a dataset is complete"""
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM income
+                    WHERE user_id = %(user_id)s AND NOT is_recurring
+                    AND recurrence_parent_id IS NULL)
+                 + (SELECT COUNT(*) FROM expenses
+                    WHERE user_id = %(user_id)s AND NOT is_recurring
+                    AND recurrence_parent_id IS NULL)
+            """,
+            {'user_id': user_id}
+        )
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+def load(spec: DatasetSpec, log=print) -> List[int]:
+    """Generate ``spec`` in one transaction and return the new user ids"""
+    run_migrations()
+    password_hash = User.hash_password(BENCH_PASSWORD)
+    started = time.perf_counter()
+
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        _copy(cur, 'users', ('username', 'password_hash'),
+              ((spec.username(i), password_hash) for i in range(spec.users)))
+        cur.execute("SELECT id FROM users WHERE username LIKE %s ORDER BY username",
+                    (_like_prefix(spec.prefix),))
+        user_ids = [row[0] for row in cur.fetchall()]
+        if len(user_ids) != spec.users:
+            raise RuntimeError(f"users with prefix {spec.prefix!r} already exist; drop them first")
+
+        cur.execute("SELECT MIN(id), name FROM categories WHERE user_id IS NULL GROUP BY name")
+        defaults = {name: category_id for category_id, name in cur.fetchall()}
+        # Anything the app's defaults lack becomes a custom category too
+        needed = ([('Salary', 'income')] + [(name, 'income') for name in INCOME_CATEGORIES]
+                  + [(name, 'expense') for name in EXPENSE_CATEGORIES])
+        custom_categories = list(CUSTOM_CATEGORIES) + [
+            (name, kind) for name, kind in needed
+            if name not in defaults and (name, kind) not in CUSTOM_CATEGORIES
+        ]
+        _copy(cur, 'categories', ('name', 'type', 'is_custom', 'user_id'),
+              ((name, kind, True, user_id) for user_id in user_ids
+               for name, kind in custom_categories))
+        _copy(cur, 'payment_sources', ('name', 'type', 'bank_name', 'last_four', 'is_active',
+                                       'user_id'),
+              ((name, kind, bank, f"{(user_id * 7 + i) % 10000:04d}", active, user_id)
+               for user_id in user_ids
+               for i, (name, kind, bank, active) in enumerate(PAYMENT_SOURCES)))
+
+        cur.execute("SELECT user_id, name, id FROM categories WHERE user_id = ANY(%s)",
+                    (user_ids,))
+        custom = {}
+        for user_id, name, category_id in cur.fetchall():
+            custom.setdefault(user_id, {})[name] = category_id
+        cur.execute("SELECT user_id, id FROM payment_sources WHERE user_id = ANY(%s) ORDER BY id",
+                    (user_ids,))
+        sources = {}
+        for user_id, source_id in cur.fetchall():
+            sources.setdefault(user_id, []).append(source_id)
+        users = [_UserRefs(user_id, {**defaults, **custom[user_id]}, sources[user_id])
+                 for user_id in user_ids]
+
+        income = _copy(cur, 'income', ('description', 'amount', 'category_id', 'date',
+                                       'is_recurring', 'frequency', 'user_id'),
+                       _income_rows(spec, users))
+        expenses = _copy(cur, 'expenses', ('description', 'amount', 'category_id',
+                                           'payment_source_id', 'date', 'necessity_level',
+                                           'is_recurring', 'frequency', 'user_id'),
+                         _expense_rows(spec, users))
+        _copy(cur, 'budgets', ('category_id', 'amount', 'period', 'start_date', 'user_id'),
+              _budget_rows(spec, users))
+        _copy(cur, 'debts', ('name', 'total_amount', 'current_balance', 'interest_rate',
+                             'minimum_payment', 'due_date', 'user_id'),
+              _debt_rows(spec, users))
+        _copy(cur, 'financial_goals', ('name', 'target_amount', 'current_amount', 'deadline',
+                                       'priority', 'status', 'created_at', 'user_id'),
+              _goal_rows(spec, users))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    log(f"loaded {spec.users} users, {income} income and {expenses} expense rows "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    # Materialize the salary and rent rules the way the app's daily sweep would
+    result = sweep(through=spec.end_date + timedelta(days=RECURRENCE_LOOKAHEAD_DAYS))
+    analyze()
+    log(f"generated {result.total} recurring occurrences; "
+        f"total {time.perf_counter() - started:.1f}s")
+    return user_ids
+
+def analyze():
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("ANALYZE users, categories, payment_sources, budgets, debts, "
+                    "financial_goals, income, expenses, monthly_rollups")
+    finally:
+        cur.close()
+        conn.close()
+
+def drop(prefix: str, log=print) -> int:
+    """Delete every user whose name starts with ``prefix`` and all of their rows"""
+    user_ids = dataset_user_ids(prefix)
+    if not user_ids:
+        return 0
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        # Transactions reference categories and payment sources, so they go first
+        for table in ('budgets', 'financial_goals', 'debts', 'income', 'expenses',
+                      'payment_sources', 'categories', 'users'):
+            column = 'id' if table == 'users' else 'user_id'
+            cur.execute(f"DELETE FROM {table} WHERE {column} = ANY(%s)", (user_ids,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    log(f"dropped {len(user_ids)} users with prefix {prefix!r}")
+    return len(user_ids)
+
+def ensure_dataset(spec: DatasetSpec, regenerate: bool = False, log=print) -> List[int]:
+    """Reuse a complete dataset for ``spec`` if one exists, otherwise (re)generate it"""
+    user_ids = dataset_user_ids(spec.prefix)
+    if (user_ids and not regenerate and len(user_ids) == spec.users
+            and generated_rows(user_ids[0]) == spec.rows_per_user):
+        log(f"reusing {spec.users} users with prefix {spec.prefix!r}")
+        return user_ids
+    if user_ids:
+        drop(spec.prefix, log)
+    return load(spec, log)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=list(SCALES), default='1k')
+    parser.add_argument('--users', type=int, help="override the scale's user count")
+    parser.add_argument('--years', type=int, help="override the years of history per user")
+    parser.add_argument('--per-month', type=int,
+                        help="override the one-off transactions per user per month")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--end-date', type=date.fromisoformat,
+                        help="last day of generated history (default: today)")
+    parser.add_argument('--regenerate', action='store_true',
+                        help="drop and reload even if a matching dataset exists")
+    parser.add_argument('--drop', action='store_true', help="only delete the dataset")
+    args = parser.parse_args(argv)
+
+    spec = spec_for(args.scale, users=args.users, years=args.years, per_month=args.per_month,
+                    seed=args.seed, end_date=args.end_date)
+    if args.drop:
+        drop(spec.prefix)
+        return 0
+    print(f"{spec.prefix}*: {spec.users} users x {spec.years} years x {spec.per_month}/month "
+          f"= {spec.rows} rows")
+    ensure_dataset(spec, args.regenerate)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,534 @@
+"""Simulate many concurrent browser sessions against a local Streamlit server.
+
+Starts ``streamlit run main.py`` on a free local port (or uses ``--url``).
+Each virtual session then speaks Streamlit's websocket protocol the way a
+browser tab does: every interaction sends a rerun with the widget values
+and waits for the script run to finish. A session logs in as one of the
+benchmark users through the login form (auth.login_user). It then repeats
+a click path: dashboard, add an income, analytics over the whole history,
+and the debt payoff calculator. Each interaction is timed, and a monitor
+thread samples the database's connection count. Run from the repository
+root:
+
+    python -m benchmarks.loadtest --sessions 200 --iterations 3 --ramp-up 30
+    DB_POOL_MAX_SIZE=20 python -m benchmarks.loadtest --sessions 200 --output load.json
+
+The server inherits the environment, so pool, cache and auth settings can
+be varied between runs. The harness stands in for a reverse proxy: each
+session sends its own X-Forwarded-For address, and the started server
+trusts it through TRUSTED_PROXIES=127.0.0.1 (unless TRUSTED_PROXIES is
+already set), so per-IP throttling sees separate clients. A server given
+with --url only does so if it trusts the harness's address. The dataset (bench_load_* users) is generated on
+first use and reused. Income added during the run is deleted afterwards.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import date, datetime
+from urllib.parse import urlparse
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from benchmarks.datagen import BENCH_PASSWORD, DatasetSpec, ensure_dataset
+from cache import invalidate_user
+from database import POOL_MAX_SIZE, _connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Descriptions of the income sessions add, so it can be removed afterwards
+ADDED_PREFIX = 'Load test'
+
+# In click-path order
+STEPS = ('login_page', 'login', 'dashboard', 'open_transactions', 'add_transaction',
+         'analytics', 'analytics_full_range', 'debt', 'debt_calculator')
+
+WIDGET_TYPES = ('text_input', 'number_input', 'date_input', 'checkbox', 'button', 'selectbox')
+
+class StepFailed(Exception):
+    pass
+
+def percentile(sorted_values, pct) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class _WebSocket:
+    """Just enough of an RFC 6455 client for Streamlit's binary stream endpoint"""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host: str, port: int, path: str, headers: dict) -> '_WebSocket':
+        reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}", "Upgrade: websocket",
+                 "Connection: Upgrade", f"Sec-WebSocket-Key: {key}",
+                 "Sec-WebSocket-Version: 13", "Sec-WebSocket-Protocol: streamlit"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await writer.drain()
+        response = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in response.split(b'\r\n', 1)[0]:
+            writer.close()
+            raise ConnectionError(response.split(b'\r\n', 1)[0].decode(errors='replace'))
+        return cls(reader, writer)
+
+    async def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        header = bytearray([0x80 | opcode])
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header += length.to_bytes(2, 'big')
+        else:
+            header.append(0x80 | 127)
+            header += length.to_bytes(8, 'big')
+        # Client frames must be masked
+        mask = os.urandom(4)
+        header += mask
+        masked = (int.from_bytes(payload, 'big')
+                  ^ int.from_bytes((mask * (length // 4 + 1))[:length], 'big')).to_bytes(length, 'big')
+        self._writer.write(bytes(header) + masked)
+        await self._writer.drain()
+
+    async def send(self, payload: bytes):
+        await self._send_frame(0x2, payload)
+
+    async def recv(self) -> bytes:
+        message = b''
+        while True:
+            first, second = await self._reader.readexactly(2)
+            length = second & 0x7f
+            if length == 126:
+                length = int.from_bytes(await self._reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await self._reader.readexactly(8), 'big')
+            if second & 0x80:
+                await self._reader.readexactly(4)  # servers don't mask, but be lenient
+            data = await self._reader.readexactly(length)
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                raise ConnectionError("server closed the websocket")
+            if opcode == 0x9:
+                await self._send_frame(0xA, data)
+                continue
+            if opcode == 0xA:
+                continue
+            message += data
+            if first & 0x80:
+                return message
+
+    async def close(self):
+        try:
+            await self._send_frame(0x8, b'')
+        except (ConnectionError, OSError):
+            pass
+        self._writer.close()
+
+class Recorder:
+    """Per-step latencies and errors collected from every session"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def record(self, step: str, seconds: float, error=None):
+        self.latencies[step].append(seconds)
+        if error is not None:
+            self.errors[step] += 1
+            if len(self.error_samples[step]) < 5:
+                self.error_samples[step].append(str(error)[:300])
+
+    def report(self) -> dict:
+        steps = {}
+        for step in STEPS:
+            ms = sorted(s * 1000 for s in self.latencies.get(step, ()))
+            if not ms:
+                continue
+            steps[step] = {
+                'count': len(ms),
+                'errors': self.errors.get(step, 0),
+                'error_rate': self.errors.get(step, 0) / len(ms),
+                'p50_ms': round(percentile(ms, 50), 1),
+                'p95_ms': round(percentile(ms, 95), 1),
+                'p99_ms': round(percentile(ms, 99), 1),
+                'max_ms': round(ms[-1], 1),
+                'error_samples': list(self.error_samples.get(step, ())),
+            }
+        return steps
+
+class ConnectionMonitor(threading.Thread):
+    """Samples the database's client connections (total and active) until stopped"""
+
+    SQL = """
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE state = 'active')
+        FROM pg_stat_activity
+        WHERE datname = current_database()
+        AND backend_type = 'client backend'
+        AND pid <> pg_backend_pid()
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True, name='loadtest-monitor')
+        self.interval = interval
+        self.samples = []  # (connections, active)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        conn = _connect()
+        conn.autocommit = True
+        cur = conn.cursor()
+        try:
+            while not self._stop_event.is_set():
+                cur.execute(self.SQL)
+                self.samples.append(cur.fetchone())
+                self._stop_event.wait(self.interval)
+        finally:
+            cur.close()
+            conn.close()
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        self.join()
+        if not self.samples:
+            return {}
+        connections, active = zip(*self.samples)
+        return {
+            'samples': len(self.samples),
+            'peak_connections': max(connections),
+            'peak_active': max(active),
+            'mean_active': round(sum(active) / len(active), 2),
+        }
+
+class Session:
+    """One simulated browser tab following the click path"""
+
+    def __init__(self, number: int, url: str, username: str, recorder: Recorder,
+                 iterations: int, think_time: float, timeout: float, first_date: date):
+        self.number = number
+        self.url = urlparse(url)
+        self.username = username
+        self.recorder = recorder
+        self.iterations = iterations
+        self.think_time = think_time
+        self.timeout = timeout
+        self.first_date = first_date
+        self.rng = random.Random(number)
+        self.ws = None
+        self.pages = {}  # page name -> page_script_hash
+        self.page_hash = ''
+        self.widgets = {}  # (type, label) -> element proto, first occurrence in the last run
+        self.errors = []
+
+    async def _run_script(self, widget_states, page):
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.page_script_hash = self.pages.get(page, self.page_hash) if page else self.page_hash
+        client_state.widget_states.widgets.extend(widget_states)
+        await self.ws.send(message.SerializeToString())
+
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof('type')
+            if kind == 'new_session':
+                # Every script run starts with one; pages come from the first
+                self.widgets = {}
+                self.errors = []
+                self.page_hash = msg.new_session.page_script_hash
+                for app_page in msg.new_session.app_pages:
+                    self.pages[app_page.page_name.lower().replace(' ', '_')] = app_page.page_script_hash
+            elif kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+                element = msg.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in WIDGET_TYPES:
+                    widget = getattr(element, element_type)
+                    self.widgets.setdefault((element_type, widget.label), widget)
+                elif element_type == 'exception':
+                    self.errors.append(f"{element.exception.type}: {element.exception.message}")
+                elif element_type == 'alert' and element.alert.format == Alert.ERROR:
+                    self.errors.append(element.alert.body)
+            elif kind == 'page_not_found':
+                self.errors.append(f"page not found: {page}")
+            elif kind == 'script_finished':
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue  # st.rerun(): wait for the run it started
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append("script failed to compile")
+                return
+
+    async def step(self, name: str, widget_states=(), page=None):
+        """One interaction: rerun with ``widget_states`` and wait for the run to finish"""
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(self._run_script(list(widget_states), page), self.timeout)
+            if self.errors:
+                error = self.errors[0]
+        except asyncio.TimeoutError:
+            error = f"no response within {self.timeout:.0f}s"
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+            error = f"{type(e).__name__}: {e}"
+        self.recorder.record(name, time.perf_counter() - started, error)
+        if error is not None:
+            raise StepFailed(f"{name}: {error}")
+
+    def _widget(self, element_type: str, label: str):
+        widget = self.widgets.get((element_type, label))
+        if widget is None:
+            raise StepFailed(f"no {element_type} labelled {label!r}")
+        return widget
+
+    def _state(self, element_type: str, label: str, **value) -> WidgetState:
+        return WidgetState(id=self._widget(element_type, label).id, **value)
+
+    def _click(self, label: str) -> WidgetState:
+        return self._state('button', label, trigger_value=True)
+
+    async def _think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, self.think_time))
+
+    async def login(self):
+        # A distinct address per session, forwarded as a proxy would; only believed
+        # by a server whose TRUSTED_PROXIES includes this harness (see start_server)
+        address = f"10.{self.number >> 16 & 255}.{self.number >> 8 & 255}.{self.number & 255}"
+        started = time.perf_counter()
+        try:
+            self.ws = await asyncio.wait_for(
+                _WebSocket.connect(self.url.hostname, self.url.port or 80,
+                                   self.url.path.rstrip('/') + '/_stcore/stream',
+                                   {'X-Forwarded-For': address}),
+                self.timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            self.recorder.record('login_page', time.perf_counter() - started, e)
+            raise StepFailed(f"connect: {e}")
+        await self.step('login_page')
+        await self._think()
+        await self.step('login', [
+            self._state('text_input', "Username", string_value=self.username),
+            self._state('text_input', "Password", string_value=BENCH_PASSWORD),
+            self._click("Login"),
+        ])
+
+    async def add_income(self):
+        await self.step('open_transactions', page='income_expenses')
+        await self._think()
+        await self.step('add_transaction', [
+            self._state('text_input', "Description",
+                        string_value=f"{ADDED_PREFIX} {self.number} {self.rng.getrandbits(32)}"),
+            self._state('number_input', "Amount", double_value=round(self.rng.uniform(5, 500), 2)),
+            self._state('checkbox', "Save even if a similar transaction exists", bool_value=True),
+            self._click("Add Transaction"),
+        ])
+
+    async def analytics(self):
+        await self.step('analytics', page='analytics')
+        await self._think()
+        start = self.first_date.strftime('%Y/%m/%d')
+        await self.step('analytics_full_range', [
+            self._state('date_input', "Start Date",
+                        string_array_value={'data': [start]}),
+        ])
+
+    async def debt_calculator(self):
+        await self.step('debt', page='debt')
+        await self._think()
+        principal = round(self.rng.uniform(1000, 20000), 2)
+        rate = round(self.rng.uniform(3, 25), 2)
+        # Enough to cover the interest and pay it off in a few years
+        payment = round(principal * rate / 1200 + principal / self.rng.randint(12, 60), 2)
+        await self.step('debt_calculator', [
+            self._state('number_input', "Debt Amount", double_value=principal),
+            self._state('number_input', "Annual Interest Rate (%)", double_value=rate),
+            self._state('number_input', "Monthly Payment", double_value=payment),
+            self._click("Calculate Payoff Plan"),
+        ])
+
+    async def run(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.login()
+            for _ in range(self.iterations):
+                await self._think()
+                await self.step('dashboard', page='main')
+                await self._think()
+                await self.add_income()
+                await self._think()
+                await self.analytics()
+                await self._think()
+                await self.debt_calculator()
+        except StepFailed:
+            # Already recorded; a real user would give up on this path too
+            pass
+        finally:
+            if self.ws is not None:
+                await self.ws.close()
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(log_path: str, timeout: float = 60):
+    """Run ``streamlit run main.py`` on a free port; returns (process, url)"""
+    port = _free_port()
+    log = open(log_path, 'wb')
+    env = dict(os.environ)
+    env.setdefault('TRUSTED_PROXIES', '127.0.0.1')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', 'main.py',
+         '--server.headless', 'true', '--server.address', '127.0.0.1',
+         '--server.port', str(port), '--server.fileWatcherType', 'none',
+         '--browser.gatherUsageStats', 'false'],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with {process.returncode}; see {log_path}")
+        try:
+            with urllib.request.urlopen(url + '/_stcore/health', timeout=2) as response:
+                if response.status == 200:
+                    return process, url
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"streamlit did not start within {timeout:.0f}s; see {log_path}")
+
+def remove_added_rows(user_ids) -> int:
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM income WHERE user_id = ANY(%s) AND description LIKE %s",
+                    (user_ids, ADDED_PREFIX + ' %'))
+        deleted = cur.rowcount
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return deleted
+
+async def _run_sessions(sessions):
+    await asyncio.gather(*(session.run(delay) for session, delay in sessions))
+
+def run_load(sessions: int, users: int, iterations: int, ramp_up: float, think_time: float,
+             timeout: float, sample_interval: float, url=None, log=print) -> dict:
+    spec = DatasetSpec('load', users=users, years=2, per_month=60)
+    user_ids = ensure_dataset(spec, log=log)
+    remove_added_rows(user_ids)
+
+    server = None
+    server_log = os.path.join(tempfile.gettempdir(), 'loadtest-streamlit.log')
+    if url is None:
+        server, url = start_server(server_log)
+        log(f"started streamlit at {url} (log: {server_log})")
+
+    recorder = Recorder()
+    # Share out users round-robin; with more sessions than users some log in twice
+    workers = [(Session(i, url, spec.username(i % users), recorder, iterations, think_time,
+                        timeout, spec.start_date), i * ramp_up / sessions)
+               for i in range(sessions)]
+    monitor = ConnectionMonitor(sample_interval)
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        asyncio.run(_run_sessions(workers))
+    finally:
+        elapsed = time.perf_counter() - started
+        connections = monitor.stop()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    # The server process has its own caches; these rows are gone before it restarts
+    removed = remove_added_rows(user_ids)
+
+    steps = recorder.report()
+    interactions = sum(step['count'] for step in steps.values())
+    errors = sum(step['errors'] for step in steps.values())
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'url': url,
+            'sessions': sessions,
+            'users': users,
+            'iterations': iterations,
+            'ramp_up_s': ramp_up,
+            'think_time_s': think_time,
+            'pool_max_size': POOL_MAX_SIZE,
+        },
+        'elapsed_s': round(elapsed, 2),
+        'interactions': interactions,
+        'interactions_per_s': round(interactions / elapsed, 2) if elapsed else 0.0,
+        'error_rate': errors / interactions if interactions else 0.0,
+        'steps': steps,
+        'connections': connections,
+        'rows_removed': removed,
+    }
+
+def print_report(report: dict):
+    meta = report['meta']
+    print(f"\n{meta['sessions']} sessions, {report['interactions']} interactions "
+          f"in {report['elapsed_s']:.1f}s ({report['interactions_per_s']:.1f}/s), "
+          f"error rate {report['error_rate']:.2%}\n")
+    print(f"{'step':22} {'count':>6} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}")
+    for step, row in report['steps'].items():
+        print(f"{step:22} {row['count']:6} {row['errors']:7} {row['p50_ms']:9.1f} "
+              f"{row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['max_ms']:9.1f}")
+    connections = report['connections']
+    if connections:
+        print(f"\ndatabase connections: peak {connections['peak_connections']} open, "
+              f"peak {connections['peak_active']} active (mean {connections['mean_active']}); "
+              f"pool limit {meta['pool_max_size']} per server process")
+    for step, row in report['steps'].items():
+        for sample in row['error_samples']:
+            print(f"  {step} error: {sample}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50, help="concurrent sessions")
+    parser.add_argument('--users', type=int, default=100,
+                        help="benchmark users the sessions log in as")
+    parser.add_argument('--iterations', type=int, default=2,
+                        help="times each session repeats the click path after logging in")
+    parser.add_argument('--ramp-up', type=float, default=10.0,
+                        help="seconds over which sessions start")
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help="maximum random pause between interactions, in seconds")
+    parser.add_argument('--timeout', type=float, default=120.0,
+                        help="seconds before a single interaction counts as failed")
+    parser.add_argument('--sample-interval', type=float, default=0.1,
+                        help="seconds between connection samples")
+    parser.add_argument('--url', help="use an already running app instead of starting one")
+    parser.add_argument('--output', help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = run_load(args.sessions, args.users, args.iterations, args.ramp_up,
+                      args.think_time, args.timeout, args.sample_interval, args.url)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0 if report['error_rate'] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""Time the app's data-access functions and pages against a synthetic dataset.
+
+Seeds (or reuses) the dataset for ``--scale`` with benchmarks.datagen, then
+times every entry in FUNCTIONS and PAGES as the first benchmark user.
+Functions are timed with that user's caches dropped (cold) and once more
+from the cache (warm). Pages run headlessly through Streamlit's AppTest.
+Results are written as JSON that benchmarks.compare can diff against a run
+from another commit. Run from the repository root:
+
+    python -m benchmarks.suite --scale 100k --repeat 5
+    python -m benchmarks.compare benchmarks/results/100k-<old>.json benchmarks/results/100k-<new>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from analytics_engine import get_analytics_aggregates
+from benchmarks.datagen import SCALES, ensure_dataset, spec_for
+from cache import invalidate_user
+from dashboard import get_dashboard_summary
+from database import get_db_connection
+from dedupe import find_near_duplicates, get_duplicate_report
+from exporter import export_transactions
+from ledger import get_ledger
+from forecast import ForecastInputs, get_forecast_inputs, project
+from goal_simulation import get_savings_history, months_until, simulate_goals
+from lookups import get_active_payment_sources, get_categories
+from models import User
+from profiling import get_profiler
+from queries import get_budgets, get_debts, get_goals, get_payment_sources, get_transactions_page
+from query_log import get_query_log, track_page
+from rollups import verify
+from utils import calculate_all_budget_progress
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+@dataclass
+class BenchContext:
+    """The benchmark user plus inputs for the functions that don't touch the database"""
+    user: User
+    today: date
+    first_date: date
+    forecast_inputs: ForecastInputs
+    savings_history: object
+    goal_remaining: list
+    goal_months_left: list
+
+    @property
+    def user_id(self) -> int:
+        return self.user.id
+
+def build_context(user_id: int, first_date: date) -> BenchContext:
+    today = date.today()
+    goals = [goal for goal in get_goals(user_id) if goal[2] > goal[3]]
+    return BenchContext(
+        user=User(username='benchmark', id=user_id, is_admin=True),
+        today=today,
+        first_date=first_date,
+        forecast_inputs=get_forecast_inputs(user_id, today),
+        savings_history=get_savings_history(user_id, today),
+        goal_remaining=[float(goal[2]) - float(goal[3]) for goal in goals],
+        goal_months_left=[months_until(goal[4], today) for goal in goals],
+    )
+
+FUNCTIONS = {
+    'ledger.get_ledger': lambda ctx: get_ledger(ctx.user_id),
+    'lookups.get_categories': lambda ctx: get_categories(ctx.user_id, 'expense'),
+    'lookups.get_active_payment_sources': lambda ctx: get_active_payment_sources(ctx.user_id),
+    'queries.get_payment_sources': lambda ctx: get_payment_sources(ctx.user_id),
+    'queries.get_budgets': lambda ctx: get_budgets(ctx.user_id),
+    'queries.get_debts': lambda ctx: get_debts(ctx.user_id),
+    'queries.get_goals': lambda ctx: get_goals(ctx.user_id),
+    'queries.get_transactions_page[expenses]': (
+        lambda ctx: get_transactions_page(ctx.user_id, 'expenses')),
+    'queries.get_transactions_page[income, filtered]': (
+        lambda ctx: get_transactions_page(ctx.user_id, 'income', min_amount=100,
+                                          start_date=ctx.today - timedelta(days=365))),
+    'dashboard.get_dashboard_summary': lambda ctx: get_dashboard_summary(ctx.user_id),
+    'analytics_engine.get_analytics_aggregates[1 year]': (
+        lambda ctx: get_analytics_aggregates(ctx.user_id, ctx.today - timedelta(days=365),
+                                             ctx.today)),
+    'analytics_engine.get_analytics_aggregates[all]': (
+        lambda ctx: get_analytics_aggregates(ctx.user_id, ctx.first_date, ctx.today)),
+    'utils.calculate_all_budget_progress': lambda ctx: calculate_all_budget_progress(ctx.user_id),
+    'forecast.get_forecast_inputs': lambda ctx: get_forecast_inputs(ctx.user_id, ctx.today),
+    'forecast.project[24 months]': lambda ctx: project(ctx.forecast_inputs, 24),
+    'goal_simulation.get_savings_history': (
+        lambda ctx: get_savings_history(ctx.user_id, ctx.today)),
+    'goal_simulation.simulate_goals': (
+        lambda ctx: simulate_goals(ctx.savings_history, ctx.goal_remaining,
+                                   ctx.goal_months_left)),
+    'dedupe.get_duplicate_report[expenses]': (
+        lambda ctx: get_duplicate_report(ctx.user_id, 'expenses')),
+    'dedupe.find_near_duplicates[expenses]': (
+        lambda ctx: find_near_duplicates(ctx.user_id, 'expenses', Decimal('45.00'), ctx.today)),
+    'exporter.export_transactions[expenses, csv]': (
+        lambda ctx: export_transactions(ctx.user_id, 'expenses', 'csv', io.BytesIO())),
+    'exporter.export_transactions[expenses, parquet]': (
+        lambda ctx: export_transactions(ctx.user_id, 'expenses', 'parquet', io.BytesIO())),
+    'rollups.verify': lambda ctx: verify(ctx.user_id),
+}
+
+# page name (as passed to track_page) -> script
+PAGES = {
+    'main': 'main.py',
+    'analytics': 'pages/analytics.py',
+    'budget': 'pages/budget.py',
+    'debt': 'pages/debt.py',
+    'goals': 'pages/goals.py',
+    'income_expenses': 'pages/income_expenses.py',
+    'payment_sources': 'pages/payment_sources.py',
+    'user_management': 'pages/user_management.py',
+}
+
+def summarize(seconds: list) -> dict:
+    ms = sorted(s * 1000 for s in seconds)
+    return {
+        'runs': len(ms),
+        'min': round(ms[0], 3),
+        'median': round(statistics.median(ms), 3),
+        'mean': round(statistics.fmean(ms), 3),
+        'max': round(ms[-1], 3),
+    }
+
+def time_function(run, ctx: BenchContext, repeat: int) -> dict:
+    # First call warms the connection pool and any lazy imports
+    invalidate_user(ctx.user_id)
+    run(ctx)
+
+    cold = []
+    for _ in range(repeat):
+        invalidate_user(ctx.user_id)
+        with track_page('benchmark') as render:
+            started = time.perf_counter()
+            run(ctx)
+            cold.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    run(ctx)
+    warm = time.perf_counter() - started
+    return {
+        'cold_ms': summarize(cold),
+        'warm_ms': round(warm * 1000, 3),
+        # Per call, from the last cold run
+        'queries': render.queries,
+        'db_ms': round(render.db_time * 1000, 3),
+        'rows': render.rows,
+    }
+
+def time_page(page: str, script: str, ctx: BenchContext, repeat: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=timeout)
+    at.session_state['user'] = ctx.user
+    at.run()
+    if at.exception:
+        return {'error': at.exception[0].value}
+
+    get_query_log().reset()
+    get_profiler().reset()
+    renders = []
+    for _ in range(repeat):
+        invalidate_user(ctx.user_id)
+        started = time.perf_counter()
+        at.run()
+        renders.append(time.perf_counter() - started)
+        if at.exception:
+            return {'error': at.exception[0].value}
+
+    result = {'ms': summarize(renders)}
+    totals = next((row for row in get_query_log().page_totals() if row['page'] == page), None)
+    if totals:
+        result['queries_per_render'] = totals['queries_per_render']
+        result['db_ms_per_render'] = round(totals['db_ms_per_render'], 3)
+        result['kb_per_render'] = round(totals['kb_per_render'], 1)
+    phases = next((row for row in get_profiler().summary() if row['page'] == page), None)
+    if phases:
+        result['phases_ms'] = {name[:-3]: round(phases[name], 3)
+                               for name in ('query_ms', 'transform_ms', 'chart_ms', 'render_ms')}
+    return result
+
+def environment() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True,
+                                  text=True).stdout.strip()
+        except OSError:
+            return ''
+
+    conn = get_db_connection()
+    try:
+        server_version = conn.server_version
+    finally:
+        conn.close()
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'postgres': server_version,
+    }
+
+def run_suite(scale: str, repeat: int, only=None, pages: bool = True, functions: bool = True,
+              regenerate: bool = False, timeout: float = 120, log=print) -> dict:
+    spec = spec_for(scale)
+    user_ids = ensure_dataset(spec, regenerate, log)
+    ctx = build_context(user_ids[0], spec.start_date)
+    get_profiler().configure(enabled=True)
+
+    report = {
+        'meta': {**environment(), 'scale': scale, 'rows': spec.rows, 'users': spec.users,
+                 'years': spec.years, 'repeat': repeat},
+        'functions': {},
+        'pages': {},
+    }
+    if functions:
+        for name, run in FUNCTIONS.items():
+            if only and only not in name:
+                continue
+            result = report['functions'][name] = time_function(run, ctx, repeat)
+            log(f"{name:55} {result['cold_ms']['median']:10.2f} ms cold "
+                f"{result['warm_ms']:9.3f} ms warm {result['queries']:4} queries")
+    if pages:
+        for page, script in PAGES.items():
+            if only and only not in page:
+                continue
+            result = report['pages'][page] = time_page(page, script, ctx, repeat, timeout)
+            if 'error' in result:
+                log(f"{'page ' + page:55} ERROR {result['error']}")
+            else:
+                log(f"{'page ' + page:55} {result['ms']['median']:10.2f} ms "
+                    f"{result.get('queries_per_render', 0):6.1f} queries/render")
+    return report
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=list(SCALES), default='1k')
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--only', help="run only benchmarks whose name contains this")
+    parser.add_argument('--skip-pages', action='store_true')
+    parser.add_argument('--skip-functions', action='store_true')
+    parser.add_argument('--regenerate', action='store_true',
+                        help="reload the dataset even if a matching one exists")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds per page render")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/"
+                                         "<scale>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.scale, args.repeat, args.only, not args.skip_pages,
+                       not args.skip_functions, args.regenerate, args.timeout)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{args.scale}-{report['meta']['commit'][:10] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nwrote {output}")
+
+    errors = [page for page, result in report['pages'].items() if 'error' in result]
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+# Process-wide limits, overridable from the environment
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 4096))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Cached read namespaces that a write to each table makes stale
+TABLE_NAMESPACES = {
+    'income': ('ledger', 'transactions', 'dashboard', 'analytics', 'forecast', 'savings_history'),
+    'expenses': ('ledger', 'transactions', 'dashboard', 'analytics', 'budget_progress',
+                 'payment_sources', 'forecast', 'savings_history'),
+    'budgets': ('budgets', 'budget_progress'),
+    'debts': ('debts', 'forecast'),
+    'financial_goals': ('goals', 'forecast'),
+    'payment_sources': ('payment_sources', 'transactions', 'ledger', 'analytics'),
+    'categories': ('categories', 'transactions', 'budgets', 'goals', 'ledger',
+                   'dashboard', 'analytics', 'budget_progress'),
+}
+
+def estimate_size(value, _seen=None) -> int:
+    """Rough deep size in bytes, good enough to enforce the memory cap"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    memory_usage = getattr(value, 'memory_usage', None)
+    if callable(memory_usage):  # pandas objects
+        usage = memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):  # numpy arrays
+        return nbytes
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), _seen)
+    return size
+
+class ResultCache:
+    """Thread-safe TTL + LRU cache keyed by (namespace, user_id, call)"""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._index = {}  # (user_id, namespace) -> set of keys
+        # Bumped on every invalidation, so a load that raced one isn't stored
+        self._generations = {}  # (user_id, namespace) -> int
+        self._user_generations = {}  # user_id -> int
+        self._clears = 0
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._stale_sets = 0
+
+    def _remove(self, key):
+        value, expires_at, size = self._entries.pop(key)
+        self._bytes -= size
+        namespace, user_id = key[0], key[1]
+        keys = self._index.get((user_id, namespace))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._index[(user_id, namespace)]
+
+    def get(self, key):
+        """Return (hit, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[0]
+
+    def generation(self, user_id, namespace) -> tuple:
+        """Token to pass to set(); it changes whenever the entry would be invalidated"""
+        with self._lock:
+            return (self._clears, self._user_generations.get(user_id, 0),
+                    self._generations.get((user_id, namespace), 0))
+
+    def set(self, key, value, ttl=None, generation=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            # An invalidation that raced with the load wins; the caller still
+            # gets its value, but it isn't kept
+            if generation is not None and generation != (
+                    self._clears, self._user_generations.get(key[1], 0),
+                    self._generations.get((key[1], key[0]), 0)):
+                self._stale_sets += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._index.setdefault((key[1], key[0]), set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, user_id, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[(user_id, namespace)] = (
+                    self._generations.get((user_id, namespace), 0) + 1)
+                for key in list(self._index.get((user_id, namespace), ())):
+                    self._remove(key)
+                    self._invalidations += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._user_generations[user_id] = self._user_generations.get(user_id, 0) + 1
+            for user_key in [k for k in self._index if k[0] == user_id]:
+                for key in list(self._index.get(user_key, ())):
+                    self._remove(key)
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'stale_sets': self._stale_sets,
+            }
+
+_cache = ResultCache()
+
+def get_cache() -> ResultCache:
+    return _cache
+
+def get_cache_stats() -> dict:
+    return _cache.stats()
+
+def cached(namespace: str, ttl=None):
+    """Cache a read function per user; it must take a ``user_id`` argument.
+
+    Cached values are shared between sessions of the same user, so callers
+    must treat them as read-only.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        if 'user_id' not in signature.parameters:
+            raise TypeError(f"{func.__qualname__} needs a user_id parameter to be cached")
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            user_id = arguments.pop('user_id')
+            key = (namespace, user_id, func.__qualname__, tuple(sorted(arguments.items())))
+
+            hit, value = _cache.get(key)
+            if hit:
+                return value
+            generation = _cache.generation(user_id, namespace)
+            value = func(*args, **kwargs)
+            _cache.set(key, value, ttl, generation)
+            return value
+
+        return wrapper
+    return decorator
+
+_listeners = []
+
+def add_invalidation_listener(callback):
+    """Call ``callback(user_id, tables)`` on every invalidation.
+
+    ``tables`` is None when everything cached for the user is dropped. Used by
+    caches that live outside this module, such as lookups.py.
+    """
+    _listeners.append(callback)
+
+def invalidate_tables(user_id, *tables):
+    """Drop the cached reads a write to ``tables`` makes stale for one user"""
+    namespaces = set()
+    for table in tables:
+        namespaces.update(TABLE_NAMESPACES[table])
+    _cache.invalidate(user_id, *namespaces)
+    for callback in _listeners:
+        callback(user_id, tables)
+
+def invalidate_user(user_id):
+    _cache.invalidate_user(user_id)
+    for callback in _listeners:
+        callback(user_id, None)
@@ -1,7 +1,7 @@
 import streamlit as st
-from auth import logout_user
+from auth import client_ip, logout_user
+from auth_service import LoginThrottled, get_auth_service
 from database import get_db_connection
-from models import User
 
 def add_auth_controls():
     """Add authentication controls (logout button and password update) to the sidebar"""
@@ -23,29 +23,40 @@ def add_auth_controls():
                     elif not current_password:
                         st.error("Please enter your current password")
                     else:
-                        conn = get_db_connection()
-                        cur = conn.cursor()
+                        service = get_auth_service()
                         try:
-                            # Verify current password
-                            cur.execute(
-                                "SELECT password_hash FROM users WHERE id = %s",
-                                (st.session_state.user.id,)
-                            )
-                            current_hash = cur.fetchone()[0]
-                            
-                            if User.verify_password(current_password, current_hash):
-                                # Update password
-                                new_password_hash = User.hash_password(new_password)
+                            service.throttle(st.session_state.user.username, client_ip())
+                            conn = get_db_connection()
+                            cur = conn.cursor()
+                            try:
                                 cur.execute(
-                                    "UPDATE users SET password_hash = %s WHERE id = %s",
-                                    (new_password_hash, st.session_state.user.id)
+                                    "SELECT password_hash FROM users WHERE id = %s",
+                                    (st.session_state.user.id,)
                                 )
-                                conn.commit()
+                                current_hash = cur.fetchone()[0]
+                            finally:
+                                cur.close()
+                                conn.close()
+
+                            # Verify current password without holding a connection
+                            if service.verify_password(current_password, current_hash):
+                                new_password_hash = service.hash_password(new_password)
+                                conn = get_db_connection()
+                                cur = conn.cursor()
+                                try:
+                                    cur.execute(
+                                        "UPDATE users SET password_hash = %s WHERE id = %s",
+                                        (new_password_hash, st.session_state.user.id)
+                                    )
+                                    conn.commit()
+                                finally:
+                                    cur.close()
+                                    conn.close()
+                                service.login_succeeded(st.session_state.user.username)
                                 st.success("Password updated successfully!")
                             else:
                                 st.error("Current password is incorrect")
+                        except LoginThrottled as e:
+                            st.error(f"Too many attempts. Please try again in {e.retry_after:.0f} seconds.")
                         except Exception as e:
                             st.error(f"Error updating password: {str(e)}")
-                        finally:
-                            cur.close()
-                            conn.close()
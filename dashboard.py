@@ -0,0 +1,130 @@
+import json
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import List
+from cache import cached
+from database import get_db_connection
+from lookups import get_categories, get_category_name
+
+# Everything the dashboard's first paint needs, in one round trip. Month
+# totals come from monthly_rollups; recent transactions are bounded by an
+# index range on (user_id, date) that stops at today, skipping occurrences
+# generated ahead by recurrence.py. The cost stays flat no matter how many
+# years of history a user has. Category names are resolved from the shared
+# lookup cache rather than joined here.
+DASHBOARD_SUMMARY_SQL = """
+    WITH month_rollups AS (
+        SELECT r.kind, r.category_id, r.total
+        FROM monthly_rollups r
+        WHERE r.user_id = %(user_id)s
+        AND r.month = DATE_TRUNC('month', CURRENT_DATE)::date
+    ),
+    month_income AS (
+        SELECT COALESCE(SUM(total), 0) AS total
+        FROM month_rollups
+        WHERE kind = 'income'
+    ),
+    month_expenses AS (
+        SELECT category_id, SUM(total) AS amount
+        FROM month_rollups
+        WHERE kind = 'expense'
+        GROUP BY category_id
+    ),
+    recent AS (
+        (SELECT 'Expense' AS type, e.description, e.amount, e.date, e.category_id
+         FROM expenses e
+         WHERE e.user_id = %(user_id)s
+         AND e.date <= CURRENT_DATE
+         AND e.category_id IS NOT NULL
+         ORDER BY e.date DESC
+         LIMIT %(recent_limit)s)
+        UNION ALL
+        (SELECT 'Income' AS type, i.description, i.amount, i.date, i.category_id
+         FROM income i
+         WHERE i.user_id = %(user_id)s
+         AND i.date <= CURRENT_DATE
+         AND i.category_id IS NOT NULL
+         ORDER BY i.date DESC
+         LIMIT %(recent_limit)s)
+        ORDER BY date DESC
+        LIMIT %(recent_limit)s
+    )
+    SELECT
+        (SELECT total FROM month_income) AS total_income,
+        (SELECT COALESCE(SUM(amount), 0) FROM month_expenses) AS total_expenses,
+        (SELECT COALESCE(json_agg(json_build_object('category_id', category_id, 'amount', amount)
+                                  ORDER BY amount DESC), '[]')::text
+         FROM month_expenses
+         WHERE amount > 0) AS category_expenses,
+        (SELECT COALESCE(json_agg(json_build_object('type', type, 'description', description,
+                                                    'amount', amount, 'date', date,
+                                                    'category_id', category_id)
+                                  ORDER BY date DESC), '[]')::text
+         FROM recent) AS recent_transactions
+"""
+
+@dataclass
+class CategorySpend:
+    category: str
+    amount: Decimal
+
+@dataclass
+class RecentTransaction:
+    type: str
+    description: str
+    amount: Decimal
+    date: date
+    category: str
+
+@dataclass
+class DashboardSummary:
+    total_income: Decimal
+    total_expenses: Decimal
+    category_expenses: List[CategorySpend] = field(default_factory=list)
+    recent_transactions: List[RecentTransaction] = field(default_factory=list)
+
+    @property
+    def monthly_savings(self) -> Decimal:
+        return self.total_income - self.total_expenses
+
+@cached('dashboard')
+def get_dashboard_summary(user_id: int, recent_limit: int = 5) -> DashboardSummary:
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(DASHBOARD_SUMMARY_SQL, {'user_id': user_id, 'recent_limit': recent_limit})
+        total_income, total_expenses, category_json, recent_json = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+
+    # Aggregates come back as JSON text so amounts can be parsed straight to Decimal.
+    # Spend is summed per category name, counting expense-type categories only.
+    expense_names = {category_id: name for category_id, name in get_categories(user_id, 'expense')}
+    spend_by_name = {}
+    for row in json.loads(category_json, parse_float=Decimal, parse_int=Decimal):
+        name = expense_names.get(int(row['category_id']))
+        if name is not None:
+            spend_by_name[name] = spend_by_name.get(name, Decimal(0)) + row['amount']
+    category_expenses = [
+        CategorySpend(category=name, amount=amount)
+        for name, amount in sorted(spend_by_name.items(), key=lambda item: -item[1])
+    ]
+    recent_transactions = [
+        RecentTransaction(
+            type=row['type'],
+            description=row['description'],
+            amount=row['amount'],
+            date=date.fromisoformat(row['date']),
+            category=get_category_name(int(row['category_id']), user_id)
+        )
+        for row in json.loads(recent_json, parse_float=Decimal, parse_int=Decimal)
+    ]
+
+    return DashboardSummary(
+        total_income=total_income,
+        total_expenses=total_expenses,
+        category_expenses=category_expenses,
+        recent_transactions=recent_transactions
+    )
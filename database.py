@@ -1,10 +1,27 @@
+import importlib.util
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
 from psycopg2.extras import RealDictCursor
-import bcrypt
 from urllib.parse import urlparse
+from query_log import QUERY_LOG_ENABLED, InstrumentedCursor
 
-def get_db_connection():
+# Pool sizing and timeouts, overridable from the environment
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 10))
+POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))
+POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+
+class PoolTimeout(PoolError):
+    pass
+
+def _connect():
     # Try to get DATABASE_URL first (for Streamlit.io deployment)
     database_url = os.environ.get('DATABASE_URL')
 
@@ -28,96 +45,406 @@ def get_db_connection():
             port=os.environ['PGPORT']
         )
 
-def init_db():
+def _connect_instrumented():
+    # Pooled connections time every statement; see query_log.py
+    conn = _connect()
+    if QUERY_LOG_ENABLED:
+        conn.cursor_factory = InstrumentedCursor
+    return conn
+
+class PooledConnection:
+    """Proxy around a pooled psycopg2 connection; close() returns it to the pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Safety net for code paths that never reach close(), e.g. st.rerun()/st.stop()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    def __init__(self, connect=_connect_instrumented, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 checkout_timeout=POOL_CHECKOUT_TIMEOUT, idle_timeout=POOL_IDLE_TIMEOUT,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        # RLock so a PooledConnection finalizer running mid-checkout can't deadlock
+        self._cond = threading.Condition(threading.RLock())
+        self._idle = []  # (connection, returned_at), most recently used last
+        self._in_use = set()
+        self._opening = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _reap_idle(self):
+        # Close connections idle past idle_timeout while keeping min_size around
+        now = time.monotonic()
+        stale = []
+        while self._idle and self._size() > self.min_size:
+            conn, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            stale.append(self._idle.pop(0)[0])
+        return stale
+
+    def getconn(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._size() >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no database connection available within {timeout:.1f}s "
+                            f"(pool max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use.add(conn)
+                else:
+                    self._opening += 1
+
+            if conn is not None:
+                # Health check outside the lock so a slow server doesn't block other checkouts
+                if self._is_healthy(conn, returned_at):
+                    break
+                with self._cond:
+                    self._in_use.discard(conn)
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use.add(conn)
+            break
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return conn
+
+    def release(self, conn):
+        # Never hand out a connection with an open or aborted transaction
+        healthy = not conn.closed
+        if healthy and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                healthy = False
+
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            stale = self._reap_idle()
+            self._cond.notify()
+
+        for conn in stale:
+            self._discard(conn)
+
+    def connection(self, timeout=None):
+        return PooledConnection(self, self.getconn(timeout))
+
+    def closeall(self):
+        with self._cond:
+            conns = [conn for conn, _ in self._idle]
+            self._idle = []
+        for conn in conns:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size(),
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'avg_checkout_ms': (self._checkout_time_total / self._checkouts * 1000)
+                                   if self._checkouts else 0.0,
+                'max_checkout_ms': self._checkout_time_max * 1000,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def get_pool_stats() -> dict:
+    return get_pool().stats()
+
+def get_db_connection():
+    # Connections come from the process-wide pool; close() hands them back
+    return get_pool().connection()
+
+@contextmanager
+def db_connection():
     conn = get_db_connection()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# Schema migrations live in migrations/ as NNNN_name.sql or NNNN_name.py files
+# (the latter define upgrade(cur)). A .sql file whose first line is
+# "-- migrate: no-transaction" runs statement by statement in autocommit mode,
+# for things like CREATE INDEX CONCURRENTLY; a .py file does the same by
+# setting NO_TRANSACTION = True, e.g. to backfill a large table in batches.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_LOCK_KEY = 7310420  # pg_advisory_lock key shared by every replica
+MIGRATION_LOCK_POLL_INTERVAL = 0.5  # seconds between pg_try_advisory_lock attempts
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+    re.IGNORECASE
+)
+
+_db_initialized = False
+_init_lock = threading.Lock()
+
+def load_migrations(directory=MIGRATIONS_DIR) -> list:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        prefix = name.split('_', 1)[0]
+        if ext not in ('.sql', '.py') or not prefix.isdigit():
+            continue
+        migrations.append((int(prefix), name, os.path.join(directory, filename)))
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration version in {directory}")
+    return migrations
+
+def _applied_migrations(cur) -> set:
+    cur.execute("SELECT to_regclass('schema_migrations')")
+    if cur.fetchone()[0] is None:
+        return set()
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def _split_sql(sql: str) -> list:
+    # Only used for no-transaction files, which must not contain $$ bodies
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+def _index_is_valid(cur, index: str):
+    """True/False for an existing index, None if there is no such index"""
+    cur.execute(
+        "SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s)",
+        (index,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def _create_index_concurrently(cur, index: str, statement: str):
+    # A cancelled or failed CONCURRENTLY build leaves an INVALID index behind,
+    # which IF NOT EXISTS would then skip; drop it and build again
+    if _index_is_valid(cur, index) is False:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+    cur.execute(statement)
+    if _index_is_valid(cur, index) is False:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+        cur.execute(statement)
+        if not _index_is_valid(cur, index):
+            raise RuntimeError(f"Index {index} is still invalid after rebuilding it")
+
+def _apply_migration(conn, version, name, path):
+    if path.endswith('.sql'):
+        with open(path) as f:
+            sql = f.read()
+        no_transaction = sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+    else:
+        sql = None
+        spec = importlib.util.spec_from_file_location(f"migration_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        no_transaction = getattr(module, 'NO_TRANSACTION', False)
+
+    conn.autocommit = no_transaction
     cur = conn.cursor()
+    try:
+        if sql is None:
+            module.upgrade(cur)
+        elif no_transaction:
+            for statement in _split_sql(sql):
+                index = CONCURRENT_INDEX_RE.match(statement)
+                if index:
+                    _create_index_concurrently(cur, index.group(1), statement)
+                else:
+                    cur.execute(statement)
+        else:
+            cur.execute(sql)
+
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (version, name)
+        )
+        if not no_transaction:
+            conn.commit()
+    except Exception:
+        if not no_transaction:
+            conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.autocommit = True
+
+def _acquire_migration_lock(cur):
+    # Poll rather than block in pg_advisory_lock: a session waiting on the lock
+    # holds a snapshot, and CREATE INDEX CONCURRENTLY in the session holding it
+    # waits for every such snapshot, so two starting replicas would deadlock
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        if cur.fetchone()[0]:
+            return
+        time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
 
+def run_migrations(directory=MIGRATIONS_DIR) -> list:
+    """Apply pending migrations in version order and return the versions applied"""
+    migrations = load_migrations(directory)
+
+    # Dedicated connection: the advisory lock is session-scoped and the
+    # autocommit toggling above shouldn't leak into pooled connections
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
     try:
-        # Add users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                is_admin BOOLEAN DEFAULT false,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Add user_id foreign key to existing tables
-        cur.execute("""
-            ALTER TABLE categories
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE payment_sources
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE income
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE expenses
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE budgets
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE debts
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        cur.execute("""
-            ALTER TABLE financial_goals
-            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id)
-        """)
-
-        # Check if admin user exists
-        cur.execute("SELECT COUNT(*) FROM users WHERE is_admin = true")
-        count = cur.fetchone()
-        if count is not None and count[0] == 0:
-            # Create default admin user
-            admin_password = "admin123"  # This should be changed after first login
-            password_hash = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
-            cur.execute(
-                "INSERT INTO users (username, password_hash, is_admin) VALUES (%s, %s, true)",
-                ("admin", password_hash.decode('utf-8'))
-            )
-
-        # Add default categories if none exist
-        cur.execute("SELECT COUNT(*) FROM categories")
-        count = cur.fetchone()
-        if count is not None and count[0] == 0:
-            default_categories = [
-                ('Salary', 'income', False),
-                ('Bonus', 'income', False),
-                ('Freelance', 'income', False),
-                ('Housing', 'expense', False),
-                ('Transportation', 'expense', False),
-                ('Groceries', 'expense', False),
-                ('Healthcare', 'expense', False),
-                ('Entertainment', 'expense', False),
-                ('Education', 'expense', False)
-            ]
-
-            cur.executemany(
-                "INSERT INTO categories (name, type, is_custom) VALUES (%s, %s, %s)",
-                default_categories
-            )
+        # Fast path: nothing to do, no lock taken
+        applied = _applied_migrations(cur)
+        if all(version in applied for version, _, _ in migrations):
+            return []
 
-        conn.commit()
+        _acquire_migration_lock(cur)
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Another replica may have finished while we waited for the lock
+            applied = _applied_migrations(cur)
 
-    except Exception as e:
-        conn.rollback()
-        raise e
+            newly_applied = []
+            for version, name, path in migrations:
+                if version in applied:
+                    continue
+                _apply_migration(conn, version, name, path)
+                newly_applied.append(version)
+            return newly_applied
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def init_db():
+    # Streamlit re-executes main.py on every interaction; migrate once per process
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _init_lock:
+        if not _db_initialized:
+            run_migrations()
+            _db_initialized = True
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+from cache import cached
+from database import db_connection
+
+# Duplicate detection for income and expenses. Exact duplicates are
+# rejected by the (user_id, fingerprint) unique index (migrations 0005/0006)
+# unless kept on purpose; near duplicates, same amount within a few days,
+# are looked up through the (user_id, amount, date) index.
+
+NEAR_DUPLICATE_DAYS = 2
+
+NEAR_DUPLICATES_SQL = {
+    'income': """
+        SELECT id, date, description, amount
+        FROM income
+        WHERE user_id = %(user_id)s
+        AND amount = %(amount)s
+        AND date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY date, id
+    """,
+    'expenses': """
+        SELECT id, date, description, amount
+        FROM expenses
+        WHERE user_id = %(user_id)s
+        AND amount = %(amount)s
+        AND date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY date, id
+    """,
+}
+
+# Walks each (user, amount) run in date order via the amount/date index and
+# pairs every row with the one before it. The unique index leaves no two
+# rows with the same stored fingerprint, so an identical pair always has a
+# kept row (is_duplicate): saved on purpose, repeated within one import, or
+# already duplicated before migration 0005. Those are flagged, never picked
+# for deletion.
+DUPLICATE_REPORT_SQL = """
+    WITH ordered AS (
+        SELECT id, date, description, amount, is_duplicate,
+               LAG(id) OVER w AS previous_id,
+               LAG(date) OVER w AS previous_date,
+               LAG(description) OVER w AS previous_description
+        FROM {table}
+        WHERE user_id = %(user_id)s
+        WINDOW w AS (PARTITION BY amount ORDER BY date, id)
+    )
+    SELECT id, date, description, amount, previous_id, previous_date, previous_description,
+           is_duplicate AS kept
+    FROM ordered
+    WHERE previous_id IS NOT NULL
+    AND date - previous_date <= %(window_days)s
+    ORDER BY date DESC, id DESC
+"""
+
+DUPLICATE_REPORT_COLUMNS = ['id', 'date', 'description', 'amount', 'duplicate_of',
+                            'duplicate_of_date', 'duplicate_of_description', 'kept']
+
+def _fetchall(sql: str, params: dict) -> list:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+def find_near_duplicates(user_id: int, table: str, amount, on_date: date,
+                         window_days: int = NEAR_DUPLICATE_DAYS) -> list:
+    """Rows of the same amount within ``window_days`` of ``on_date``"""
+    return _fetchall(NEAR_DUPLICATES_SQL[table], {
+        'user_id': user_id,
+        'amount': amount,
+        'start_date': on_date - timedelta(days=window_days),
+        'end_date': on_date + timedelta(days=window_days),
+    })
+
+def duplicate_report_sql(table: str) -> str:
+    if table not in NEAR_DUPLICATES_SQL:
+        raise ValueError(f"Unknown transaction table: {table}")
+    return DUPLICATE_REPORT_SQL.format(table=table)
+
+@cached('transactions')
+def get_duplicate_report(user_id: int, table: str,
+                         window_days: int = NEAR_DUPLICATE_DAYS) -> list:
+    """Likely duplicates in a user's history, newest first"""
+    return _fetchall(duplicate_report_sql(table),
+                     {'user_id': user_id, 'window_days': window_days})
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date
+from typing import Iterator, List
+from database import get_db_connection
+
+# Streaming transaction export. Rows come off a server-side (named) cursor
+# EXPORT_CHUNK_ROWS at a time and are written out incrementally, so a
+# full-history export holds one chunk in memory rather than the whole table.
+# Streamlit's download button keeps the whole file in memory, though, so
+# exports from the Analytics page are capped at EXPORT_PAGE_MAX_ROWS; larger
+# ones go through this module's command line.
+
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_PAGE_MAX_ROWS = int(os.environ.get('EXPORT_PAGE_MAX_ROWS', 50000))
+EXPORT_FORMATS = ('csv', 'parquet')
+FULL_HISTORY = (date(1, 1, 1), date(9999, 12, 31))
+
+EXPORT_SQL = {
+    'income': """
+        SELECT i.id, i.date, i.description, i.amount, c.name as category,
+               i.frequency, i.is_recurring
+        FROM income i
+        JOIN categories c ON i.category_id = c.id
+        WHERE i.user_id = %(user_id)s
+        AND i.date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY i.date, i.id
+    """,
+    'expenses': """
+        SELECT e.id, e.date, e.description, e.amount, c.name as category,
+               e.necessity_level, ps.name as payment_source, ps.type as source_type,
+               ps.bank_name, e.frequency, e.is_recurring
+        FROM expenses e
+        JOIN categories c ON e.category_id = c.id
+        LEFT JOIN payment_sources ps ON e.payment_source_id = ps.id
+        WHERE e.user_id = %(user_id)s
+        AND e.date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY e.date, e.id
+    """,
+}
+
+# Upper bound on an export's rows (rows without a category aren't exported)
+EXPORT_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM {table}
+    WHERE user_id = %(user_id)s
+    AND date BETWEEN %(start_date)s AND %(end_date)s
+"""
+
+# Column names and Parquet types; pyarrow itself is only loaded for Parquet exports
+EXPORT_COLUMNS = {
+    'income': [
+        ('id', 'int64'),
+        ('date', 'date32'),
+        ('description', 'string'),
+        ('amount', 'decimal'),
+        ('category', 'string'),
+        ('frequency', 'string'),
+        ('is_recurring', 'bool'),
+    ],
+    'expenses': [
+        ('id', 'int64'),
+        ('date', 'date32'),
+        ('description', 'string'),
+        ('amount', 'decimal'),
+        ('category', 'string'),
+        ('necessity_level', 'string'),
+        ('payment_source', 'string'),
+        ('source_type', 'string'),
+        ('bank_name', 'string'),
+        ('frequency', 'string'),
+        ('is_recurring', 'bool'),
+    ],
+}
+
+def export_schema(table: str):
+    """Parquet schema for an export table"""
+    import pyarrow as pa
+    types = {
+        'int64': pa.int64(),
+        'date32': pa.date32(),
+        'string': pa.string(),
+        'decimal': pa.decimal128(12, 2),
+        'bool': pa.bool_(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS[table]])
+
+def _range_params(user_id: int, start_date, end_date) -> dict:
+    return {
+        'user_id': user_id,
+        'start_date': start_date or FULL_HISTORY[0],
+        'end_date': end_date or FULL_HISTORY[1],
+    }
+
+def count_rows(user_id: int, table: str, start_date=None, end_date=None) -> int:
+    """At most how many rows an export of this range would write"""
+    if table not in EXPORT_SQL:
+        raise ValueError(f"Unknown transaction table: {table}")
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(EXPORT_COUNT_SQL.format(table=table),
+                    _range_params(user_id, start_date, end_date))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+def stream_rows(user_id: int, table: str, start_date=None, end_date=None,
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[tuple]]:
+    """Yield lists of up to ``chunk_rows`` rows, oldest first"""
+    if table not in EXPORT_SQL:
+        raise ValueError(f"Unknown transaction table: {table}")
+    params = _range_params(user_id, start_date, end_date)
+    conn = get_db_connection()
+    # Named cursors are server-side: rows stay in Postgres until fetched
+    cur = conn.cursor(name=f"export_{table}")
+    cur.itersize = chunk_rows
+    try:
+        cur.execute(EXPORT_SQL[table], params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+        conn.close()
+
+def write_csv(chunks: Iterator[List[tuple]], columns: List[str], out) -> int:
+    """Write chunks to a binary file object as UTF-8 CSV; returns the row count"""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    # Leave the caller's file object open
+    text.detach()
+    return count
+
+def write_parquet(chunks: Iterator[List[tuple]], schema, out) -> int:
+    """Write each chunk as a zstd-compressed Parquet row group; returns the row count"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    count = 0
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_batch(batch)
+            count += len(rows)
+    return count
+
+def export_transactions(user_id: int, table: str, fmt: str, out,
+                        start_date=None, end_date=None,
+                        chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Stream a user's income or expenses into ``out`` (binary file object or path)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    chunks = stream_rows(user_id, table, start_date, end_date, chunk_rows)
+    if fmt == 'parquet':
+        return write_parquet(chunks, export_schema(table), out)
+    if isinstance(out, str):
+        with open(out, 'wb') as f:
+            return write_csv(chunks, [name for name, _ in EXPORT_COLUMNS[table]], f)
+    return write_csv(chunks, [name for name, _ in EXPORT_COLUMNS[table]], out)
+
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export a user's income or expenses")
+    parser.add_argument('username')
+    parser.add_argument('table', choices=sorted(EXPORT_SQL))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--output', help="file to write (default: stdout)")
+    parser.add_argument('--start-date', type=_parse_date)
+    parser.add_argument('--end-date', type=_parse_date)
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM users WHERE username = %s", (args.username,))
+        user = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+    if not user:
+        print(f"No such user: {args.username}", file=sys.stderr)
+        return 1
+
+    if args.output is None and args.format == 'parquet':
+        print("Parquet output needs --output", file=sys.stderr)
+        return 1
+    out = args.output or sys.stdout.buffer
+    count = export_transactions(user[0], args.table, args.format, out,
+                                args.start_date, args.end_date)
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
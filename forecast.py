@@ -0,0 +1,225 @@
+import numpy as np
+from dataclasses import dataclass
+from datetime import date, timedelta
+from amortization import amortize
+from cache import cached
+from database import get_db_connection
+
+# Forward cash-flow projection. Every recurring rule, debt minimum payment
+# and goal contribution is expanded to its occurrence dates over the
+# horizon with array arithmetic, and np.bincount folds the amounts onto
+# the day axis, so the whole projection is a handful of array operations.
+
+MIN_HORIZON_MONTHS = 12
+MAX_HORIZON_MONTHS = 36
+
+# Balance as of today: whole months from the rollups, the current month
+# from raw rows dated today or earlier
+STARTING_BALANCE_SQL = """
+    SELECT
+        (SELECT COALESCE(SUM(CASE WHEN kind = 'income' THEN total ELSE -total END), 0)
+         FROM monthly_rollups
+         WHERE user_id = %(user_id)s
+         AND month < DATE_TRUNC('month', %(today)s::date)::date)
+      + (SELECT COALESCE(SUM(amount), 0)
+         FROM income
+         WHERE user_id = %(user_id)s
+         AND date >= DATE_TRUNC('month', %(today)s::date)::date
+         AND date <= %(today)s)
+      - (SELECT COALESCE(SUM(amount), 0)
+         FROM expenses
+         WHERE user_id = %(user_id)s
+         AND date >= DATE_TRUNC('month', %(today)s::date)::date
+         AND date <= %(today)s)
+"""
+
+RECURRING_RULES_SQL = """
+    SELECT date, frequency, amount, 1 AS sign
+    FROM income
+    WHERE user_id = %(user_id)s
+    AND is_recurring AND recurrence_parent_id IS NULL
+    AND frequency IN ('Weekly', 'Monthly', 'Annually')
+    UNION ALL
+    SELECT date, frequency, amount, -1
+    FROM expenses
+    WHERE user_id = %(user_id)s
+    AND is_recurring AND recurrence_parent_id IS NULL
+    AND frequency IN ('Weekly', 'Monthly', 'Annually')
+"""
+
+DEBTS_SQL = """
+    SELECT current_balance, interest_rate, minimum_payment, COALESCE(due_date, %(today)s)
+    FROM debts
+    WHERE user_id = %(user_id)s
+    AND current_balance > 0
+"""
+
+GOALS_SQL = """
+    SELECT target_amount - COALESCE(current_amount, 0), deadline
+    FROM financial_goals
+    WHERE user_id = %(user_id)s
+    AND COALESCE(status, 'in_progress') <> 'completed'
+    AND deadline > %(today)s
+    AND target_amount > COALESCE(current_amount, 0)
+"""
+
+FREQUENCY_STEPS = {'Weekly': (7, 0), 'Monthly': (0, 1), 'Annually': (0, 12)}  # (days, months)
+
+@dataclass
+class ForecastInputs:
+    today: date
+    starting_balance: float
+    rule_anchor: np.ndarray        # datetime64[D]
+    rule_step_days: np.ndarray     # 7 for weekly rules, else 0
+    rule_step_months: np.ndarray   # 1 or 12 for monthly/annual rules, else 0
+    rule_amount: np.ndarray        # signed: income positive, expenses negative
+    debt_balance: np.ndarray
+    debt_rate: np.ndarray
+    debt_payment: np.ndarray
+    debt_due: np.ndarray           # datetime64[D]; payments fall on its day of month
+    goal_remaining: np.ndarray
+    goal_deadline: np.ndarray      # datetime64[D]
+
+@dataclass
+class Forecast:
+    dates: np.ndarray      # datetime64[D], one per day from tomorrow
+    inflow: np.ndarray
+    outflow: np.ndarray    # positive amounts
+    balance: np.ndarray    # end-of-day balance
+
+    def monthly(self):
+        """(month starts, net flow per month, end-of-month balance)"""
+        months = self.dates.astype('datetime64[M]')
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        net = np.add.reduceat(self.inflow - self.outflow, starts)
+        ends = np.r_[starts[1:] - 1, len(self.dates) - 1]
+        return months[starts], net, self.balance[ends]
+
+    @property
+    def lowest_balance_index(self) -> int:
+        return int(np.argmin(self.balance))
+
+def _fetch(cur, sql, params):
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+@cached('forecast')
+def get_forecast_inputs(user_id: int, today: date) -> ForecastInputs:
+    params = {'user_id': user_id, 'today': today}
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        starting_balance = float(_fetch(cur, STARTING_BALANCE_SQL, params)[0][0])
+        rules = _fetch(cur, RECURRING_RULES_SQL, params)
+        debts = _fetch(cur, DEBTS_SQL, params)
+        goals = _fetch(cur, GOALS_SQL, params)
+    finally:
+        cur.close()
+        conn.close()
+
+    steps = np.array([FREQUENCY_STEPS[row[1]] for row in rules], dtype=np.int64).reshape(-1, 2)
+    return ForecastInputs(
+        today=today,
+        starting_balance=starting_balance,
+        rule_anchor=np.array([row[0] for row in rules], dtype='datetime64[D]'),
+        rule_step_days=steps[:, 0],
+        rule_step_months=steps[:, 1],
+        rule_amount=np.array([float(row[2]) * row[3] for row in rules], dtype=np.float64),
+        debt_balance=np.array([float(row[0]) for row in debts], dtype=np.float64),
+        debt_rate=np.array([float(row[1]) for row in debts], dtype=np.float64),
+        debt_payment=np.array([float(row[2]) for row in debts], dtype=np.float64),
+        debt_due=np.array([row[3] for row in debts], dtype='datetime64[D]'),
+        goal_remaining=np.array([float(row[0]) for row in goals], dtype=np.float64),
+        goal_deadline=np.array([row[1] for row in goals], dtype='datetime64[D]'),
+    )
+
+def _weekly_days(anchor, first_day, days):
+    """(row, day offset) of every weekly occurrence in [first_day, first_day + days)"""
+    offset = (anchor - first_day).astype(np.int64)
+    # First occurrence on or after first_day; the anchor itself counts when it's in the future
+    start = np.where(offset >= 0, offset, offset % 7)
+    grid = start[:, None] + 7 * np.arange(days // 7 + 1)[None, :]
+    rows, cols = np.nonzero(grid < days)
+    return rows, grid[rows, cols]
+
+def _monthly_days(anchor, step_months, first_day, days, limit=None):
+    """(row, day offset, occurrence rank) of every anchor + n * step_months date.
+
+    Days past the end of a shorter month fall on its last day, like
+    Postgres date + interval. ``limit`` caps the occurrences per row.
+    """
+    anchor_month = anchor.astype('datetime64[M]')
+    anchor_day = (anchor - anchor_month.astype('datetime64[D]')).astype(np.int64)
+    first_month = np.datetime64(first_day, 'M')
+    elapsed = (first_month - anchor_month).astype(np.int64)
+    n0 = np.maximum(elapsed // step_months - 1, 0)
+    columns = days // 28 // step_months.min(initial=12) + 3
+    n = n0[:, None] + np.arange(columns)[None, :]
+
+    month = anchor_month[:, None] + (n * step_months[:, None]).astype('timedelta64[M]')
+    month_start = month.astype('datetime64[D]')
+    month_length = ((month + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    occurs = month_start + np.minimum(anchor_day[:, None], month_length - 1)
+    offset = (occurs - first_day).astype(np.int64)
+
+    valid = (offset >= 0) & (offset < days)
+    rank = np.cumsum(valid, axis=1) - 1
+    if limit is not None:
+        valid &= rank < limit[:, None]
+    rows, cols = np.nonzero(valid)
+    return rows, offset[rows, cols], rank[rows, cols]
+
+def project(inputs: ForecastInputs, months: int, starting_balance=None,
+            include_debts: bool = True, include_goals: bool = True) -> Forecast:
+    """Daily projection from tomorrow through the end of the month ``months`` ahead"""
+    first_day = np.datetime64(inputs.today + timedelta(days=1), 'D')
+    end = (first_day.astype('datetime64[M]') + months + 1).astype('datetime64[D]')
+    days = int((end - first_day).astype(np.int64))
+    inflow = np.zeros(days)
+    outflow = np.zeros(days)
+
+    def add(day_offsets, amounts):
+        amounts = np.broadcast_to(amounts, day_offsets.shape)
+        inflow[:] += np.bincount(day_offsets, np.where(amounts > 0, amounts, 0), minlength=days)
+        outflow[:] += np.bincount(day_offsets, np.where(amounts < 0, -amounts, 0), minlength=days)
+
+    weekly = inputs.rule_step_days > 0
+    if weekly.any():
+        rows, offsets = _weekly_days(inputs.rule_anchor[weekly], first_day, days)
+        add(offsets, inputs.rule_amount[weekly][rows])
+    monthly = inputs.rule_step_months > 0
+    if monthly.any():
+        rows, offsets, _ = _monthly_days(inputs.rule_anchor[monthly],
+                                         inputs.rule_step_months[monthly], first_day, days)
+        add(offsets, inputs.rule_amount[monthly][rows])
+
+    if include_debts and len(inputs.debt_balance):
+        # Month k's payment is that month's interest plus principal, so the
+        # final payment is the remaining balance and payments stop at payoff
+        schedule = amortize(inputs.debt_balance, inputs.debt_rate, inputs.debt_payment,
+                            max_months=months + 1)
+        payments = schedule.interest + schedule.principal_paid
+        limit = np.full(len(inputs.debt_balance), payments.shape[1])
+        rows, offsets, rank = _monthly_days(inputs.debt_due, np.ones_like(limit), first_day,
+                                            days, limit)
+        add(offsets, -payments[rows, rank])
+
+    if include_goals and len(inputs.goal_remaining):
+        # Equal contributions on the 1st of each month through the deadline month
+        next_month = (first_day.astype('datetime64[M]') + 1).astype('datetime64[D]')
+        anchors = np.full(len(inputs.goal_remaining), next_month)
+        remaining_months = np.maximum(
+            (inputs.goal_deadline.astype('datetime64[M]') - next_month.astype('datetime64[M]'))
+            .astype(np.int64) + 1, 1
+        )
+        rows, offsets, _ = _monthly_days(anchors, np.ones_like(remaining_months), first_day,
+                                         days, remaining_months)
+        add(offsets, -(inputs.goal_remaining / remaining_months)[rows])
+
+    start = inputs.starting_balance if starting_balance is None else starting_balance
+    return Forecast(
+        dates=first_day + np.arange(days),
+        inflow=inflow,
+        outflow=outflow,
+        balance=start + np.cumsum(inflow - outflow)
+    )
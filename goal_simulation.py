@@ -0,0 +1,119 @@
+import numpy as np
+from dataclasses import dataclass
+from datetime import date
+from cache import cached
+from database import get_db_connection
+
+# Monte Carlo goal attainment. Each path draws future monthly savings with
+# replacement from the user's own history (a bootstrap, so skew and bad
+# months carry over), paths are simulated in fixed-size batches, and a
+# fixed seed keeps results stable across Streamlit reruns.
+
+HISTORY_MONTHS = 24
+SIMULATION_PATHS = 20000
+SIMULATION_BATCH = 5000
+MAX_SIMULATION_MONTHS = 240
+SIMULATION_SEED = 20240101
+PRIORITY_ORDER = {'High': 0, 'Medium': 1, 'Low': 2}
+
+# Net savings per completed month, from the rollups
+SAVINGS_HISTORY_SQL = """
+    SELECT month, SUM(CASE WHEN kind = 'income' THEN total ELSE -total END)
+    FROM monthly_rollups
+    WHERE user_id = %(user_id)s
+    AND month >= (DATE_TRUNC('month', %(today)s::date) - %(months)s * INTERVAL '1 month')::date
+    AND month < DATE_TRUNC('month', %(today)s::date)::date
+    GROUP BY month
+    ORDER BY month
+"""
+
+@dataclass
+class GoalOutlook:
+    probability: np.ndarray                    # chance each goal is funded by its deadline
+    required_monthly_contribution: np.ndarray  # extra per month to reach the confidence level
+    median_months: np.ndarray                  # median months to fund; inf if not within the horizon
+
+@cached('savings_history')
+def get_savings_history(user_id: int, today: date, months: int = HISTORY_MONTHS) -> np.ndarray:
+    """Net savings for each of the last ``months`` completed months (0 for empty months)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(SAVINGS_HISTORY_SQL, {'user_id': user_id, 'today': today, 'months': months})
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    if not rows:
+        return np.zeros(0)
+    # Months with no activity between the first recorded month and now count as zero
+    current = np.datetime64(today, 'M')
+    first = np.datetime64(rows[0][0], 'M')
+    savings = np.zeros(int((current - first).astype(np.int64)))
+    for month, amount in rows:
+        savings[int((np.datetime64(month, 'M') - first).astype(np.int64))] = float(amount)
+    return savings
+
+def months_until(deadline: date, today: date) -> int:
+    return max((deadline.year - today.year) * 12 + deadline.month - today.month, 0)
+
+def simulate_goals(monthly_savings, remaining, months_left, confidence: float = 0.8,
+                   shared: bool = True, paths: int = SIMULATION_PATHS,
+                   seed: int = SIMULATION_SEED, batch_size: int = SIMULATION_BATCH) -> GoalOutlook:
+    """Simulate funding of goals ordered by priority.
+
+    With ``shared`` each path's savings fill the goals in the order given,
+    so goal k is funded once cumulative savings cover goals 1..k; otherwise
+    every goal gets all of the savings. The required contribution is the
+    fixed extra savings per month that would fund the goal (and, when
+    shared, the goals ahead of it) by its deadline in ``confidence`` of
+    the paths. Deadlines past MAX_SIMULATION_MONTHS are treated as falling
+    at it.
+    """
+    monthly_savings = np.asarray(monthly_savings, dtype=np.float64)
+    remaining = np.maximum(np.asarray(remaining, dtype=np.float64), 0)
+    thresholds = np.cumsum(remaining) if shared else remaining
+    horizon = int(min(max(np.max(months_left, initial=0), 1), MAX_SIMULATION_MONTHS))
+    # Judge every goal within the simulated horizon, for all three outputs alike
+    months_left = np.minimum(np.asarray(months_left, dtype=np.int64), horizon)
+    deadline_index = np.maximum(months_left, 1) - 1
+
+    if not len(monthly_savings):
+        monthly_savings = np.zeros(1)
+
+    rng = np.random.default_rng(seed)
+    on_time = np.zeros(len(remaining))
+    at_deadline = []
+    completion = []
+    for start in range(0, paths, batch_size):
+        size = min(batch_size, paths - start)
+        draws = rng.choice(monthly_savings, size=(size, horizon))
+        cumulative = np.cumsum(draws, axis=1)
+
+        # First month (1-based) in which each path covers each goal's threshold.
+        # The running maximum is monotone, so that's one plus the months below it.
+        peak = np.maximum.accumulate(cumulative, axis=1)
+        first = np.empty((size, len(thresholds)))
+        for k, threshold in enumerate(thresholds):
+            below = (peak < threshold).sum(axis=1)
+            first[:, k] = np.where(below < horizon, below + 1, np.inf)
+        first[:, thresholds <= 0] = 0
+
+        on_time += (first <= months_left[None, :]).sum(axis=0)
+        at_deadline.append(cumulative[:, deadline_index])
+        completion.append(first)
+
+    at_deadline = np.concatenate(at_deadline)
+    # Savings at the deadline that confidence of the paths reach or beat
+    floor = np.quantile(at_deadline, 1 - confidence, axis=0)
+    required = np.where(months_left > 0,
+                        np.maximum(thresholds - floor, 0) / np.maximum(months_left, 1),
+                        thresholds)
+    required = np.where(thresholds <= 0, 0, required)
+
+    return GoalOutlook(
+        probability=on_time / paths,
+        required_monthly_contribution=required,
+        median_months=np.median(np.concatenate(completion), axis=0)
+    )
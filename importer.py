@@ -0,0 +1,381 @@
+import csv
+import io
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Iterable, Iterator, List, Optional, Tuple
+from cache import invalidate_tables
+from database import get_db_connection
+from lookups import find_category_id, find_payment_source_id
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%d.%m.%Y', '%Y%m%d']
+NECESSITY_LEVELS = ('Essential', 'Important', 'Optional')
+MAX_REJECTS_KEPT = 1000
+
+# income.amount and expenses.amount are NUMERIC(12, 2); Postgres rounds
+# half away from zero to the scale and errors past the precision
+AMOUNT_SCALE = Decimal('0.01')
+AMOUNT_LIMIT = Decimal(10) ** 10
+
+# Columns a CSV export can be mapped onto; amount is signed unless a type
+# column or separate debit/credit columns are mapped
+CSV_FIELDS = ('date', 'amount', 'debit', 'credit', 'description', 'category',
+              'payment_source', 'type', 'necessity_level')
+
+STAGING_COLUMNS = ('line_no', 'kind', 'date', 'amount', 'description', 'category_id',
+                   'payment_source_id', 'necessity_level')
+
+# A staged row is skipped if it is already recorded: the Nth occurrence of
+# a fingerprint in the file is inserted only when fewer than N rows with
+# that fingerprint exist (found through the (user_id, amount, date) index).
+# Re-importing an overlapping statement inserts nothing twice, while
+# identical transactions within one statement are all kept, the repeats as
+# is_duplicate rows.
+MERGE_SQL = """
+    WITH staged AS (
+        SELECT s.*,
+               txn_fingerprint(%(user_id)s, s.date, s.amount, s.description,
+                               s.payment_source_id) AS fingerprint
+        FROM import_staging s
+    ),
+    ranked AS (
+        SELECT s.*,
+               ROW_NUMBER() OVER (PARTITION BY s.kind, s.fingerprint ORDER BY s.line_no)
+                   AS occurrence,
+               CASE WHEN s.kind = 'income' THEN (
+                   SELECT COUNT(*)
+                   FROM income i
+                   WHERE i.user_id = %(user_id)s
+                   AND i.amount = s.amount
+                   AND i.date = s.date
+                   AND txn_fingerprint(i.user_id, i.date, i.amount, i.description, NULL)
+                       = s.fingerprint
+               ) ELSE (
+                   SELECT COUNT(*)
+                   FROM expenses e
+                   WHERE e.user_id = %(user_id)s
+                   AND e.amount = s.amount
+                   AND e.date = s.date
+                   AND txn_fingerprint(e.user_id, e.date, e.amount, e.description,
+                                       e.payment_source_id) = s.fingerprint
+               ) END AS recorded
+        FROM staged s
+    ),
+    new_income AS (
+        INSERT INTO income
+        (description, amount, frequency, category_id, date, is_recurring, user_id, is_duplicate)
+        SELECT description, amount, 'One-time', category_id, date, false, %(user_id)s,
+               occurrence > 1
+        FROM ranked
+        WHERE kind = 'income'
+        AND occurrence > recorded
+        ON CONFLICT (user_id, fingerprint) DO NOTHING
+        RETURNING 1
+    ),
+    new_expenses AS (
+        INSERT INTO expenses
+        (description, amount, category_id, payment_source_id, date,
+         necessity_level, is_recurring, frequency, user_id, is_duplicate)
+        SELECT description, amount, category_id, payment_source_id, date,
+               necessity_level, false, 'One-time', %(user_id)s, occurrence > 1
+        FROM ranked
+        WHERE kind = 'expense'
+        AND occurrence > recorded
+        ON CONFLICT (user_id, fingerprint) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM new_income), (SELECT COUNT(*) FROM new_expenses),
+           (SELECT COALESCE((array_agg(line_no ORDER BY line_no))[1:%(max_lines)s], '{}')
+            FROM ranked
+            WHERE occurrence <= recorded)
+"""
+
+class RowError(ValueError):
+    pass
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    income_loaded: int = 0
+    expenses_loaded: int = 0
+    rejected: int = 0
+    rejects: List[Tuple[int, str]] = field(default_factory=list)  # (line, reason), first MAX_REJECTS_KEPT
+    duplicate_lines: List[int] = field(default_factory=list)  # already recorded, first MAX_REJECTS_KEPT
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_loaded(self) -> int:
+        return self.income_loaded + self.expenses_loaded
+
+    @property
+    def duplicates(self) -> int:
+        # Valid rows skipped as already recorded
+        return self.rows_read - self.rejected - self.rows_loaded
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def reject(self, line_no: int, reason: str):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REJECTS_KEPT:
+            self.rejects.append((line_no, reason))
+
+def parse_date(value: Optional[str], date_format: Optional[str] = None) -> date:
+    # csv.DictReader fills the fields missing from a short row with None
+    if value is None:
+        raise RowError("missing date")
+    value = value.strip()
+    formats = [date_format] if date_format else DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"unrecognized date {value!r}")
+
+def parse_amount(value: Optional[str]) -> Decimal:
+    if value is None:
+        raise RowError("missing amount")
+    value = value.strip().replace(',', '').replace('$', '')
+    negative = value.startswith('(') and value.endswith(')')
+    if negative:
+        value = value[1:-1]
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"unrecognized amount {value!r}")
+    if not amount.is_finite():
+        raise RowError(f"unrecognized amount {value!r}")
+    # Check the magnitude before quantizing, which fails past 28 digits
+    if abs(amount) < AMOUNT_LIMIT:
+        amount = amount.quantize(AMOUNT_SCALE, ROUND_HALF_UP)
+    if abs(amount) >= AMOUNT_LIMIT:
+        raise RowError(f"amount {value!r} out of range")
+    return -amount if negative else amount
+
+def parse_csv(stream, mapping: dict, date_format: Optional[str] = None) -> Iterator[Tuple[int, dict]]:
+    """Yield (line_no, record) from a CSV export; ``mapping`` maps CSV_FIELDS to header names"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        line_no = reader.line_num
+        try:
+            record = {'description': (row.get(mapping.get('description')) or '').strip()}
+            if mapping.get('amount'):
+                record['amount'] = parse_amount(row[mapping['amount']])
+            else:
+                debit = (row.get(mapping.get('debit')) or '').strip()
+                credit = (row.get(mapping.get('credit')) or '').strip()
+                record['amount'] = parse_amount(credit) if credit else -parse_amount(debit or '0')
+            record['date'] = parse_date(row[mapping['date']], date_format)
+            for name in ('category', 'payment_source', 'type', 'necessity_level'):
+                if mapping.get(name):
+                    record[name] = (row.get(mapping[name]) or '').strip()
+        except (KeyError, RowError) as e:
+            yield line_no, RowError(str(e))
+            continue
+        yield line_no, record
+
+_OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+def parse_ofx(stream) -> Iterator[Tuple[int, dict]]:
+    """Yield (line_no, record) for each <STMTTRN> in an OFX/QFX export (SGML or XML)"""
+    fields = None
+    start_line = 0
+    for line_no, line in enumerate(stream, start=1):
+        upper = line.upper()
+        if '<STMTTRN>' in upper:
+            fields = {}
+            start_line = line_no
+        if fields is not None:
+            for tag, value in _OFX_TAG.findall(line):
+                fields[tag.upper()] = value.strip()
+        if '</STMTTRN>' in upper and fields is not None:
+            try:
+                record = {
+                    'date': parse_date(fields.get('DTPOSTED', '')[:8], '%Y%m%d'),
+                    'amount': parse_amount(fields.get('TRNAMT', '')),
+                    'description': fields.get('NAME') or fields.get('MEMO') or '',
+                }
+            except RowError as e:
+                yield start_line, e
+            else:
+                yield start_line, record
+            fields = None
+
+def parse_qif(stream) -> Iterator[Tuple[int, dict]]:
+    """Yield (line_no, record) for each ^-terminated QIF transaction"""
+    fields = {}
+    start_line = None
+    for line_no, line in enumerate(stream, start=1):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        if start_line is None:
+            start_line = line_no
+        code, value = line[0], line[1:].strip()
+        if code != '^':
+            fields.setdefault(code, value)
+            continue
+        try:
+            # QIF writes dates like 1/15'24 or 01/15/2024
+            raw_date = fields.get('D', '').replace("'", '/').replace(' ', '')
+            record = {
+                'date': parse_date(raw_date, None),
+                'amount': parse_amount(fields.get('T') or fields.get('U', '')),
+                'description': fields.get('P') or fields.get('M') or '',
+            }
+            if fields.get('L'):
+                record['category'] = fields['L'].split(':')[0]
+        except RowError as e:
+            yield start_line, e
+        else:
+            yield start_line, record
+        fields = {}
+        start_line = None
+
+class _CopyStream(io.RawIOBase):
+    """File-like view over an iterator of text chunks, for COPY ... FROM STDIN"""
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks).encode('utf-8')
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+class _Lookups:
+    """Resolve category and payment-source names through the shared lookup cache"""
+
+    def __init__(self, user_id: int, default_income_category: int, default_expense_category: int,
+                 default_payment_source: Optional[int]):
+        self.user_id = user_id
+        self.default_category = {'income': default_income_category,
+                                 'expense': default_expense_category}
+        self.default_payment_source = default_payment_source
+
+    def category(self, kind: str, name: Optional[str]) -> int:
+        if name:
+            category_id = find_category_id(self.user_id, kind, name)
+            if category_id is not None:
+                return category_id
+        if self.default_category[kind] is None:
+            raise RowError(f"unknown {kind} category {name!r}")
+        return self.default_category[kind]
+
+    def payment_source(self, name: Optional[str]) -> int:
+        if name:
+            source_id = find_payment_source_id(self.user_id, name)
+            if source_id is not None:
+                return source_id
+        if self.default_payment_source is None:
+            raise RowError(f"unknown payment source {name!r}")
+        return self.default_payment_source
+
+def _staging_rows(records, lookups: _Lookups, default_necessity: str, report: ImportReport):
+    """Validate and resolve records into staging tuples, counting rejects"""
+    for line_no, record in records:
+        report.rows_read += 1
+        if isinstance(record, Exception):
+            report.reject(line_no, str(record))
+            continue
+        try:
+            amount = record['amount']
+            kind = (record.get('type') or '').lower()
+            if kind not in ('income', 'expense'):
+                kind = 'income' if amount > 0 else 'expense'
+            amount = abs(amount)
+            if amount == 0:
+                raise RowError("zero amount")
+
+            category_id = lookups.category(kind, record.get('category'))
+            payment_source_id = None
+            necessity_level = None
+            if kind == 'expense':
+                payment_source_id = lookups.payment_source(record.get('payment_source'))
+                necessity_level = (record.get('necessity_level') or default_necessity).title()
+                if necessity_level not in NECESSITY_LEVELS:
+                    raise RowError(f"unknown necessity level {necessity_level!r}")
+        except RowError as e:
+            report.reject(line_no, str(e))
+            continue
+
+        yield (line_no, kind, record['date'].isoformat(), str(amount),
+               record['description'][:255], category_id, payment_source_id, necessity_level)
+
+def _csv_chunks(rows, rows_per_chunk: int = 1000) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+        pending += 1
+        if pending == rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+def import_transactions(user_id: int, records: Iterable[Tuple[int, dict]],
+                        default_income_category: Optional[int] = None,
+                        default_expense_category: Optional[int] = None,
+                        default_payment_source: Optional[int] = None,
+                        default_necessity: str = 'Essential') -> ImportReport:
+    """Stream parsed records into income/expenses via COPY and one set-based merge.
+
+    ``records`` comes from parse_csv/parse_ofx/parse_qif and is consumed
+    lazily, so memory use doesn't grow with the size of the statement.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    lookups = _Lookups(user_id, default_income_category, default_expense_category,
+                       default_payment_source)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TEMP TABLE import_staging (
+                line_no INTEGER,
+                kind VARCHAR(10),
+                date DATE,
+                amount NUMERIC(12, 2),
+                description VARCHAR(255),
+                category_id INTEGER,
+                payment_source_id INTEGER,
+                necessity_level VARCHAR(20)
+            ) ON COMMIT DROP
+        """)
+        rows = _staging_rows(records, lookups, default_necessity, report)
+        cur.copy_expert(
+            f"COPY import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            _CopyStream(_csv_chunks(rows))
+        )
+        cur.execute(MERGE_SQL, {'user_id': user_id, 'max_lines': MAX_REJECTS_KEPT})
+        report.income_loaded, report.expenses_loaded, report.duplicate_lines = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    invalidate_tables(user_id, 'income', 'expenses')
+    report.elapsed_seconds = time.perf_counter() - started
+    return report
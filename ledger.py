@@ -0,0 +1,186 @@
+import threading
+import time
+import weakref
+import numpy as np
+from dataclasses import dataclass, fields, replace
+from typing import Optional, Tuple
+from cache import cached
+from database import get_db_connection
+
+# Columnar copy of a user's income and expenses: int64 cents, datetime64
+# dates sorted ascending, and categorical codes for category, payment
+# source and necessity level. It is loaded once per user and cached, and
+# the Analytics page, which needs per-row dates over arbitrary ranges,
+# aggregates it with np.bincount / np.add.reduceat rather than grouping
+# object columns. Month totals elsewhere come from monthly_rollups.
+
+# Missing ids and levels come back as 0 and '', as in monthly_rollups
+LEDGER_SQL = """
+    SELECT false, date - DATE '1970-01-01', (amount * 100)::bigint,
+           COALESCE(category_id, 0), 0, ''
+    FROM income
+    WHERE user_id = %(user_id)s
+    UNION ALL
+    SELECT true, date - DATE '1970-01-01', (amount * 100)::bigint,
+           COALESCE(category_id, 0), COALESCE(payment_source_id, 0),
+           COALESCE(necessity_level, '')
+    FROM expenses
+    WHERE user_id = %(user_id)s
+"""
+
+CATEGORY_NAMES_SQL = """
+    SELECT id, name
+    FROM categories
+    WHERE id = ANY(%(ids)s)
+"""
+
+PAYMENT_SOURCE_NAMES_SQL = """
+    SELECT id, name, bank_name, type
+    FROM payment_sources
+    WHERE id = ANY(%(ids)s)
+"""
+
+@dataclass(eq=False)
+class Ledger:
+    is_expense: np.ndarray         # bool
+    dates: np.ndarray              # datetime64[D], ascending
+    cents: np.ndarray              # int64, always positive
+    category: np.ndarray           # codes into category_ids
+    payment_source: np.ndarray     # codes into payment_source_ids
+    necessity: np.ndarray          # codes into necessity_levels
+    category_ids: np.ndarray       # 0 for rows without a category
+    category_names: tuple          # None where the category doesn't exist
+    payment_source_ids: np.ndarray # 0 for rows without a source
+    payment_sources: tuple         # (name, bank_name, type), or None where there's no source
+    necessity_levels: tuple        # '' for rows without a level
+
+    def __len__(self) -> int:
+        return len(self.cents)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays"""
+        return sum(getattr(self, f.name).nbytes for f in fields(self)
+                   if isinstance(getattr(self, f.name), np.ndarray))
+
+    def between(self, start, end) -> 'Ledger':
+        """Rows dated start..end inclusive, as views of this ledger's arrays"""
+        lo, hi = np.searchsorted(self.dates, [np.datetime64(start, 'D'),
+                                              np.datetime64(end, 'D') + 1])
+        return replace(self, **{name: getattr(self, name)[lo:hi] for name in ROW_COLUMNS})
+
+    def known_category(self) -> np.ndarray:
+        """Rows whose category exists, i.e. the rows a join on categories keeps"""
+        known = np.array([name is not None for name in self.category_names], dtype=bool)
+        return known[self.category]
+
+    def total(self, mask: np.ndarray) -> int:
+        return int(self.cents[mask].sum())
+
+    def sum_by(self, column: str, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(cents, row count) per code of ``column`` over the masked rows"""
+        codes = getattr(self, column)[mask]
+        size = len(getattr(self, CODE_LABELS[column]))
+        # Float weights are exact for totals below 2**53 cents
+        sums = np.bincount(codes, weights=self.cents[mask], minlength=size)
+        return np.rint(sums).astype(np.int64), np.bincount(codes, minlength=size)
+
+    def sum_by_day(self, mask: Optional[np.ndarray] = None):
+        """(days with rows, cents per day); the ledger is sorted, so runs are contiguous"""
+        rows = slice(None) if mask is None else mask
+        return self._sum_runs(self.dates[rows], self.cents[rows])
+
+    @staticmethod
+    def _sum_runs(keys: np.ndarray, cents: np.ndarray):
+        if not len(keys):
+            return keys, np.zeros(0, dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return keys[starts], np.add.reduceat(cents, starts)
+
+# Per-row arrays, sliced together by Ledger.between()
+ROW_COLUMNS = ('is_expense', 'dates', 'cents', 'category', 'payment_source', 'necessity')
+
+# Code column -> the labels its codes index
+CODE_LABELS = {
+    'category': 'category_ids',
+    'payment_source': 'payment_source_ids',
+    'necessity': 'necessity_levels',
+}
+
+def _encode(values: np.ndarray):
+    """(sorted labels, codes) using the narrowest signed code type, as pandas does"""
+    labels, codes = np.unique(values, return_inverse=True)
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(labels) <= np.iinfo(dtype).max:
+            return labels, codes.astype(dtype)
+    return labels, codes
+
+class LedgerStats:
+    """Build counts and the footprint of the ledgers currently alive"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = weakref.WeakSet()
+        self._builds = 0
+        self._build_time = 0.0
+
+    def record(self, ledger: Ledger, seconds: float):
+        with self._lock:
+            self._live.add(ledger)
+            self._builds += 1
+            self._build_time += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = list(self._live)
+            return {
+                'ledgers': len(live),
+                'rows': sum(len(ledger) for ledger in live),
+                'bytes': sum(ledger.nbytes for ledger in live),
+                'builds': self._builds,
+                'avg_build_ms': self._build_time / self._builds * 1000 if self._builds else 0.0,
+            }
+
+_stats = LedgerStats()
+
+def get_ledger_stats() -> dict:
+    return _stats.stats()
+
+@cached('ledger')
+def get_ledger(user_id: int) -> Ledger:
+    """Every income and expense row of a user; shared by all of that user's sessions"""
+    started = time.perf_counter()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(LEDGER_SQL, {'user_id': user_id})
+        rows = cur.fetchall()
+        columns = list(zip(*rows)) or [()] * 6
+        category_ids, category = _encode(np.array(columns[3], dtype=np.int64))
+        source_ids, source = _encode(np.array(columns[4], dtype=np.int64))
+        cur.execute(CATEGORY_NAMES_SQL, {'ids': category_ids.tolist()})
+        category_names = dict(cur.fetchall())
+        cur.execute(PAYMENT_SOURCE_NAMES_SQL, {'ids': source_ids.tolist()})
+        sources = {row[0]: row[1:] for row in cur.fetchall()}
+    finally:
+        cur.close()
+        conn.close()
+
+    necessity_levels, necessity = _encode(np.array(columns[5], dtype=str))
+    days = np.array(columns[1], dtype=np.int64)
+    order = np.argsort(days, kind='stable')
+    ledger = Ledger(
+        is_expense=np.array(columns[0], dtype=bool)[order],
+        dates=days.astype('datetime64[D]')[order],
+        cents=np.array(columns[2], dtype=np.int64)[order],
+        category=category[order],
+        payment_source=source[order],
+        necessity=necessity[order],
+        category_ids=category_ids,
+        category_names=tuple(category_names.get(int(i)) for i in category_ids),
+        payment_source_ids=source_ids,
+        payment_sources=tuple(sources.get(int(i)) for i in source_ids),
+        necessity_levels=tuple(necessity_levels.tolist()),
+    )
+    _stats.record(ledger, time.perf_counter() - started)
+    return ledger
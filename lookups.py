@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from cache import CACHE_TTL, add_invalidation_listener
+from database import get_db_connection
+
+# Categories and payment sources change rarely but are read on almost every
+# render. Default categories (user_id IS NULL) are loaded once per process and
+# shared by every session; each user's own categories and payment sources are
+# an overlay kept in a small LRU. Writes go through cache.invalidate_tables(),
+# which drops the affected overlay.
+LOOKUP_MAX_USERS = int(os.environ.get('LOOKUP_MAX_USERS', 1024))
+
+GLOBAL_CATEGORIES_SQL = """
+    SELECT id, name, type
+    FROM categories
+    WHERE user_id IS NULL
+    ORDER BY id
+"""
+
+USER_CATEGORIES_SQL = """
+    SELECT id, name, type
+    FROM categories
+    WHERE user_id = %s
+    ORDER BY id
+"""
+
+CATEGORY_OWNER_SQL = """
+    SELECT user_id
+    FROM categories
+    WHERE id = %s AND user_id IS NOT NULL
+"""
+
+USER_PAYMENT_SOURCES_SQL = """
+    SELECT id, name, type, bank_name, last_four, is_active
+    FROM payment_sources
+    WHERE user_id = %s
+    ORDER BY name
+"""
+
+@dataclass
+class CategoryTable:
+    """id -> name and (type, lowercase name) -> id maps for a set of categories"""
+    names: Dict[int, str] = field(default_factory=dict)
+    ids: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    by_type: Dict[str, List[Tuple[int, str]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_rows(cls, rows) -> 'CategoryTable':
+        table = cls()
+        for category_id, name, category_type in rows:
+            table.names[category_id] = name
+            table.ids[(category_type, name.lower())] = category_id
+            table.by_type.setdefault(category_type, []).append((category_id, name))
+        return table
+
+@dataclass
+class UserLookups:
+    categories: CategoryTable
+    # (id, name, type, bank_name, last_four) for active sources, ordered by name
+    active_payment_sources: List[tuple]
+    payment_source_names: Dict[int, str]
+    active_payment_source_ids: Dict[str, int]
+
+class LookupCache:
+    """Process-wide category and payment-source maps with a per-user LRU overlay"""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_users: int = LOOKUP_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._global = None
+        self._global_expires_at = 0.0
+        self._global_generation = 0
+        self._users = OrderedDict()  # user_id -> (UserLookups, expires_at)
+        self._user_category_names = {}  # id -> name across every loaded overlay
+        self._generations = {}  # user_id -> bumped on every invalidation
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _drop_user(self, user_id: int):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            for category_id in entry[0].categories.names:
+                self._user_category_names.pop(category_id, None)
+
+    def _fetch(self, statements) -> list:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            results = []
+            for sql, params in statements:
+                cur.execute(sql, params)
+                results.append(cur.fetchall())
+            return results
+        finally:
+            cur.close()
+            conn.close()
+
+    def global_categories(self) -> CategoryTable:
+        with self._lock:
+            if self._global is not None and self._global_expires_at > time.monotonic():
+                self._hits += 1
+                return self._global
+            self._misses += 1
+            generation = self._global_generation
+
+        rows, = self._fetch([(GLOBAL_CATEGORIES_SQL, None)])
+        table = CategoryTable.from_rows(rows)
+        with self._lock:
+            # An invalidation that raced with the load wins; serve but don't keep
+            if generation == self._global_generation:
+                self._global = table
+                self._global_expires_at = time.monotonic() + self.ttl
+        return table
+
+    def user(self, user_id: int) -> UserLookups:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._users.move_to_end(user_id)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+            generation = self._generations.get(user_id, 0)
+
+        category_rows, source_rows = self._fetch([
+            (USER_CATEGORIES_SQL, (user_id,)),
+            (USER_PAYMENT_SOURCES_SQL, (user_id,)),
+        ])
+        active = [row[:5] for row in source_rows if row[5]]
+        lookups = UserLookups(
+            categories=CategoryTable.from_rows(category_rows),
+            active_payment_sources=active,
+            payment_source_names={row[0]: row[1] for row in source_rows},
+            active_payment_source_ids={row[1].lower(): row[0] for row in active},
+        )
+        with self._lock:
+            if generation == self._generations.get(user_id, 0):
+                self._drop_user(user_id)
+                self._users[user_id] = (lookups, time.monotonic() + self.ttl)
+                self._user_category_names.update(lookups.categories.names)
+                while len(self._users) > self.max_users:
+                    self._drop_user(next(iter(self._users)))
+                    self._evictions += 1
+        return lookups
+
+    def cached_category_name(self, category_id: int) -> Optional[str]:
+        """Name from whatever is already loaded, without touching the database"""
+        with self._lock:
+            if self._global is not None and category_id in self._global.names:
+                return self._global.names[category_id]
+            return self._user_category_names.get(category_id)
+
+    def invalidate(self, user_id: Optional[int] = None, categories: bool = False):
+        """Drop a user's overlay, or everything when ``user_id`` is None.
+
+        ``categories`` also reloads the shared default categories.
+        """
+        with self._lock:
+            user_ids = list(self._users) if user_id is None else [user_id]
+            for uid in user_ids:
+                self._drop_user(uid)
+                self._generations[uid] = self._generations.get(uid, 0) + 1
+            if categories or user_id is None:
+                self._global = None
+                self._global_generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'global_categories': len(self._global.names) if self._global else 0,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+_lookups = LookupCache()
+
+def get_lookup_cache() -> LookupCache:
+    return _lookups
+
+def get_lookup_stats() -> dict:
+    return _lookups.stats()
+
+def get_categories(user_id: int, category_type: str) -> List[Tuple[int, str]]:
+    """(id, name) for the default categories plus the user's own, of one type"""
+    return (_lookups.global_categories().by_type.get(category_type, [])
+            + _lookups.user(user_id).categories.by_type.get(category_type, []))
+
+def get_category_name(category_id: int, user_id: Optional[int] = None) -> Optional[str]:
+    """Category name by id; a hit never opens a connection"""
+    name = _lookups.cached_category_name(category_id)
+    if name is not None:
+        return name
+    name = _lookups.global_categories().names.get(category_id)
+    if name is None:
+        if user_id is None:
+            # Unknown owner: find it, then load that user's overlay
+            rows, = _lookups._fetch([(CATEGORY_OWNER_SQL, (category_id,))])
+            user_id = rows[0][0] if rows else None
+        if user_id is not None:
+            name = _lookups.user(user_id).categories.names.get(category_id)
+    return name
+
+def find_category_id(user_id: int, category_type: str, name: str) -> Optional[int]:
+    """Case-insensitive name -> id; the user's own categories shadow the defaults"""
+    key = (category_type, name.lower())
+    category_id = _lookups.user(user_id).categories.ids.get(key)
+    if category_id is None:
+        category_id = _lookups.global_categories().ids.get(key)
+    return category_id
+
+def get_active_payment_sources(user_id: int) -> List[tuple]:
+    """(id, name, type, bank_name, last_four) of the user's active sources, by name"""
+    return _lookups.user(user_id).active_payment_sources
+
+def get_payment_source_name(user_id: int, payment_source_id: int) -> Optional[str]:
+    return _lookups.user(user_id).payment_source_names.get(payment_source_id)
+
+def find_payment_source_id(user_id: int, name: str) -> Optional[int]:
+    """Case-insensitive name -> id among the user's active sources"""
+    return _lookups.user(user_id).active_payment_source_ids.get(name.lower())
+
+def _on_invalidate(user_id, tables):
+    if tables is None or 'categories' in tables or 'payment_sources' in tables:
+        _lookups.invalidate(user_id, categories=tables is not None and 'categories' in tables)
+
+add_invalidation_listener(_on_invalidate)
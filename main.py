@@ -1,10 +1,14 @@
 import streamlit as st
-from database import init_db, get_db_connection
-import pandas as pd
+from database import init_db
+from recurrence import start_daily_sweep
+from dashboard import get_dashboard_summary
+from dataclasses import asdict
 from datetime import datetime, date
 from utils import calculate_monthly_savings, generate_spending_chart
-from psycopg2.extras import RealDictCursor
-from auth import init_auth, login_user, register_user, logout_user, require_auth
+from auth import (AuthBusy, LoginThrottled, init_auth, login_user, register_user,
+                  logout_user, require_auth)
+from query_log import track_page
+from profiling import phase, profile_page
 
 # Page configuration - MUST be first Streamlit command
 st.set_page_config(
@@ -16,6 +20,7 @@ st.set_page_config(
 
 # Initialize the database and authentication
 init_db()
+start_daily_sweep()
 init_auth()
 
 # Hide all pages when user is not logged in
@@ -44,11 +49,18 @@ def show_login_page():
             submitted = st.form_submit_button("Login")
 
             if submitted:
-                if login_user(username, password):
-                    st.success("Logged in successfully!")
-                    st.rerun()
+                try:
+                    logged_in = login_user(username, password)
+                except LoginThrottled as e:
+                    st.error(f"Too many login attempts. Please try again in {e.retry_after:.0f} seconds.")
+                except AuthBusy:
+                    st.error("The server is busy. Please try again in a moment.")
                 else:
-                    st.error("Invalid username or password")
+                    if logged_in:
+                        st.success("Logged in successfully!")
+                        st.rerun()
+                    else:
+                        st.error("Invalid username or password")
 
     with tab2:
         with st.form("register_form"):
@@ -60,13 +72,23 @@ def show_login_page():
             if submitted:
                 if new_password != confirm_password:
                     st.error("Passwords do not match")
-                elif register_user(new_username, new_password):
-                    st.success("Registration successful! Please log in.")
                 else:
-                    st.error("Username already exists or registration failed")
+                    try:
+                        registered = register_user(new_username, new_password)
+                    except LoginThrottled as e:
+                        st.error(f"Too many attempts. Please try again in {e.retry_after:.0f} seconds.")
+                    except AuthBusy:
+                        st.error("The server is busy. Please try again in a moment.")
+                    else:
+                        if registered:
+                            st.success("Registration successful! Please log in.")
+                        else:
+                            st.error("Username already exists or registration failed")
 
 def show_dashboard():
     user = require_auth()
+    # Loaded here rather than at module level so the login page stays light
+    import pandas as pd
 
     # Add navigation menu
     st.sidebar.title("Navigation")
@@ -93,35 +115,17 @@ def show_dashboard():
     st.title("💰 Financial Dashboard")
     st.write(f"Welcome back, {user.username}!")
 
+    # One flat-cost statement (month rollups plus recent rows) for the first paint
+    summary = get_dashboard_summary(user.id)
+
     # Create columns for layout
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Quick Summary")
 
-        # Get current month's data
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Calculate total income
-        cur.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total_income 
-            FROM income 
-            WHERE DATE_TRUNC('month', date) = DATE_TRUNC('month', CURRENT_DATE)
-            AND user_id = %s
-        """, (user.id,))
-        result = cur.fetchone()
-        total_income = float(result['total_income'])
-
-        # Calculate total expenses
-        cur.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total_expenses 
-            FROM expenses 
-            WHERE DATE_TRUNC('month', date) = DATE_TRUNC('month', CURRENT_DATE)
-            AND user_id = %s
-        """, (user.id,))
-        result = cur.fetchone()
-        total_expenses = float(result['total_expenses'])
+        total_income = float(summary.total_income)
+        total_expenses = float(summary.total_expenses)
 
         # Display metrics
         st.metric("Monthly Income", f"${total_income:,.2f}")
@@ -133,20 +137,12 @@ def show_dashboard():
     with col2:
         st.subheader("Expense Breakdown")
 
-        # Get expense categories
-        cur.execute("""
-            SELECT c.name as category, COALESCE(SUM(e.amount), 0) as amount
-            FROM categories c
-            LEFT JOIN expenses e ON c.id = e.category_id AND e.user_id = %s
-            WHERE c.type = 'expense'
-            AND (e.date IS NULL OR DATE_TRUNC('month', e.date) = DATE_TRUNC('month', CURRENT_DATE))
-            GROUP BY c.name
-            HAVING COALESCE(SUM(e.amount), 0) > 0
-        """, (user.id,))
-        category_expenses = pd.DataFrame(cur.fetchall())
+        with phase("transform"):
+            category_expenses = pd.DataFrame([asdict(row) for row in summary.category_expenses])
 
         if not category_expenses.empty:
-            fig = generate_spending_chart(category_expenses)
+            with phase("chart"):
+                fig = generate_spending_chart(category_expenses)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No expenses recorded this month")
@@ -154,21 +150,8 @@ def show_dashboard():
     # Recent Transactions
     st.subheader("Recent Transactions")
 
-    cur.execute("""
-        SELECT 'Expense' as type, e.description, e.amount, e.date, c.name as category
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = %s
-        UNION ALL
-        SELECT 'Income' as type, i.description, i.amount, i.date, c.name as category
-        FROM income i
-        JOIN categories c ON i.category_id = c.id
-        WHERE i.user_id = %s
-        ORDER BY date DESC
-        LIMIT 5
-    """, (user.id, user.id))
-
-    recent_transactions = pd.DataFrame(cur.fetchall())
+    with phase("transform"):
+        recent_transactions = pd.DataFrame([asdict(row) for row in summary.recent_transactions])
 
     if not recent_transactions.empty:
         st.dataframe(
@@ -188,8 +171,59 @@ def show_dashboard():
     else:
         st.info("No recent transactions")
 
-    cur.close()
-    conn.close()
+    show_cash_flow_forecast(user)
+
+def show_cash_flow_forecast(user):
+    import pandas as pd
+    import plotly.express as px
+    from forecast import MAX_HORIZON_MONTHS, MIN_HORIZON_MONTHS, get_forecast_inputs, project
+
+    st.subheader("Cash-Flow Forecast")
+
+    # Inputs are cached per user; the sliders below only re-run the projection
+    inputs = get_forecast_inputs(user.id, date.today())
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        months = st.slider("Horizon (months)", MIN_HORIZON_MONTHS, MAX_HORIZON_MONTHS, 24)
+    with col2:
+        starting_balance = st.number_input(
+            "Starting balance", value=round(inputs.starting_balance, 2), step=100.0,
+            help="Defaults to all income minus all expenses recorded up to today"
+        )
+    with col3:
+        granularity = st.radio("View", ["Monthly", "Daily"], horizontal=True)
+        include_debts = st.checkbox("Debt minimum payments", value=True)
+        include_goals = st.checkbox("Goal contributions", value=True)
+
+    with phase("transform"):
+        forecast = project(inputs, months, starting_balance, include_debts, include_goals)
+
+    lowest = forecast.lowest_balance_index
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Projected Balance", f"${forecast.balance[-1]:,.2f}",
+                          delta=f"${forecast.balance[-1] - starting_balance:,.2f}")
+    metric_cols[1].metric("Lowest Balance", f"${forecast.balance[lowest]:,.2f}")
+    metric_cols[2].metric("Lowest On", str(forecast.dates[lowest]))
+
+    with phase("transform"):
+        if granularity == "Monthly":
+            month_starts, net, balance = forecast.monthly()
+            chart_df = pd.DataFrame({"date": month_starts.astype('datetime64[D]'),
+                                     "balance": balance, "net": net})
+        else:
+            chart_df = pd.DataFrame({"date": forecast.dates, "balance": forecast.balance,
+                                     "net": forecast.inflow - forecast.outflow})
+
+    with phase("chart"):
+        fig = px.line(chart_df, x="date", y="balance", title="Projected Balance",
+                      hover_data={"net": ":$,.2f"})
+        fig.add_hline(y=0, line_dash="dot", line_color="red")
+    st.plotly_chart(fig, use_container_width=True)
+
+    if not len(inputs.rule_amount):
+        st.caption("Mark income and expenses as recurring (weekly, monthly or annually) "
+                   "to include them in the forecast.")
 
 def main():
     if not st.session_state.user:
@@ -198,4 +232,5 @@ def main():
         show_dashboard()
 
 if __name__ == "__main__":
-    main()
+    with track_page("main"), profile_page("main"):
+        main()
@@ -0,0 +1,103 @@
+-- Base schema. Every statement is idempotent so databases created before
+-- schema_migrations existed can replay it safely.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    is_admin BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    is_custom BOOLEAN DEFAULT false
+);
+
+CREATE TABLE IF NOT EXISTS payment_sources (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    last_four VARCHAR(4),
+    bank_name VARCHAR(100),
+    is_active BOOLEAN DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS income (
+    id SERIAL PRIMARY KEY,
+    description VARCHAR(255),
+    amount NUMERIC(12, 2) NOT NULL,
+    frequency VARCHAR(20),
+    category_id INTEGER REFERENCES categories(id),
+    date DATE NOT NULL,
+    is_recurring BOOLEAN DEFAULT false
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id SERIAL PRIMARY KEY,
+    description VARCHAR(255),
+    amount NUMERIC(12, 2) NOT NULL,
+    category_id INTEGER REFERENCES categories(id),
+    payment_source_id INTEGER REFERENCES payment_sources(id),
+    date DATE NOT NULL,
+    payment_method VARCHAR(50),
+    necessity_level VARCHAR(20),
+    is_recurring BOOLEAN DEFAULT false,
+    frequency VARCHAR(20)
+);
+
+CREATE TABLE IF NOT EXISTS budgets (
+    id SERIAL PRIMARY KEY,
+    category_id INTEGER REFERENCES categories(id),
+    amount NUMERIC(12, 2) NOT NULL,
+    period VARCHAR(20) NOT NULL,
+    start_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS debts (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    total_amount NUMERIC(12, 2) NOT NULL,
+    current_balance NUMERIC(12, 2) NOT NULL,
+    interest_rate NUMERIC(5, 2) NOT NULL,
+    minimum_payment NUMERIC(12, 2) NOT NULL,
+    due_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS financial_goals (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    target_amount NUMERIC(12, 2) NOT NULL,
+    current_amount NUMERIC(12, 2) DEFAULT 0,
+    deadline DATE,
+    category_id INTEGER REFERENCES categories(id),
+    priority VARCHAR(20),
+    status VARCHAR(20),
+    created_at DATE DEFAULT CURRENT_DATE
+);
+
+-- Add user_id foreign key to existing tables
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE payment_sources ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE income ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE budgets ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE debts ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+ALTER TABLE financial_goals ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);
+
+-- budget_page upserts on (category_id, period, user_id)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        WHERE c.relname = 'budgets' AND i.indisunique AND i.indnatts = 3
+    ) THEN
+        ALTER TABLE budgets ADD CONSTRAINT budgets_category_period_user_key
+            UNIQUE (category_id, period, user_id);
+    END IF;
+END
+$$;
@@ -0,0 +1,35 @@
+import bcrypt
+
+def upgrade(cur):
+    # Check if admin user exists
+    cur.execute("SELECT COUNT(*) FROM users WHERE is_admin = true")
+    count = cur.fetchone()
+    if count is not None and count[0] == 0:
+        # Create default admin user
+        admin_password = "admin123"  # This should be changed after first login
+        password_hash = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
+        cur.execute(
+            "INSERT INTO users (username, password_hash, is_admin) VALUES (%s, %s, true)",
+            ("admin", password_hash.decode('utf-8'))
+        )
+
+    # Add default categories if none exist
+    cur.execute("SELECT COUNT(*) FROM categories")
+    count = cur.fetchone()
+    if count is not None and count[0] == 0:
+        default_categories = [
+            ('Salary', 'income', False),
+            ('Bonus', 'income', False),
+            ('Freelance', 'income', False),
+            ('Housing', 'expense', False),
+            ('Transportation', 'expense', False),
+            ('Groceries', 'expense', False),
+            ('Healthcare', 'expense', False),
+            ('Entertainment', 'expense', False),
+            ('Education', 'expense', False)
+        ]
+
+        cur.executemany(
+            "INSERT INTO categories (name, type, is_custom) VALUES (%s, %s, %s)",
+            default_categories
+        )
@@ -0,0 +1,15 @@
+-- migrate: no-transaction
+-- Composite indexes for the per-user date-range and category lookups.
+-- Built CONCURRENTLY so writes to income/expenses aren't blocked.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS income_user_date_idx
+    ON income (user_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_date_idx
+    ON expenses (user_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_category_date_idx
+    ON expenses (user_id, category_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_payment_source_idx
+    ON expenses (payment_source_id);
@@ -0,0 +1,14 @@
+-- migrate: no-transaction
+-- The transaction list pages on (date, id) newest first. Extending the
+-- (user_id, date) indexes with id makes every page a bounded index range;
+-- the wider indexes serve the plain date-range queries too.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS income_user_date_id_idx
+    ON income (user_id, date, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_date_id_idx
+    ON expenses (user_id, date, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS income_user_date_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS expenses_user_date_idx;
@@ -0,0 +1,121 @@
+# Duplicate detection for income and expenses. Each row carries a
+# fingerprint of (user, date, amount, normalized description, payment
+# source) kept up to date by a trigger; 0006 adds the unique index on it.
+#
+# A row saved as a deliberate duplicate has is_duplicate set, and its
+# fingerprint is suffixed with the row id so it stays distinct from the
+# original through later edits.
+
+NO_TRANSACTION = True
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Sent as one multi-statement query, which Postgres runs as a single
+# implicit transaction. Adding nullable or constant-default columns only
+# touches the catalog, so the ACCESS EXCLUSIVE locks are brief.
+SCHEMA_SQL = """
+    CREATE OR REPLACE FUNCTION txn_fingerprint(
+        p_user_id INTEGER,
+        p_date DATE,
+        p_amount NUMERIC,
+        p_description TEXT,
+        p_payment_source_id INTEGER
+    ) RETURNS TEXT
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT md5(
+            p_user_id::text || '|' ||
+            (p_date - DATE '2000-01-01')::text || '|' ||
+            round(p_amount, 2)::text || '|' ||
+            lower(regexp_replace(btrim(coalesce(p_description, '')), '\\s+', ' ', 'g')) || '|' ||
+            coalesce(p_payment_source_id, 0)::text
+        )
+    $$;
+
+    CREATE OR REPLACE FUNCTION income_set_fingerprint() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.fingerprint := txn_fingerprint(NEW.user_id, NEW.date, NEW.amount, NEW.description, NULL);
+        IF NEW.is_duplicate THEN
+            NEW.fingerprint := md5(NEW.fingerprint || '#' || NEW.id);
+        END IF;
+        RETURN NEW;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION expenses_set_fingerprint() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.fingerprint := txn_fingerprint(NEW.user_id, NEW.date, NEW.amount, NEW.description,
+                                           NEW.payment_source_id);
+        IF NEW.is_duplicate THEN
+            NEW.fingerprint := md5(NEW.fingerprint || '#' || NEW.id);
+        END IF;
+        RETURN NEW;
+    END
+    $$;
+
+    ALTER TABLE income ADD COLUMN IF NOT EXISTS fingerprint CHAR(32);
+    ALTER TABLE income ADD COLUMN IF NOT EXISTS is_duplicate BOOLEAN NOT NULL DEFAULT false;
+    ALTER TABLE expenses ADD COLUMN IF NOT EXISTS fingerprint CHAR(32);
+    ALTER TABLE expenses ADD COLUMN IF NOT EXISTS is_duplicate BOOLEAN NOT NULL DEFAULT false;
+
+    DROP TRIGGER IF EXISTS income_fingerprint ON income;
+    CREATE TRIGGER income_fingerprint
+        BEFORE INSERT OR UPDATE OF user_id, date, amount, description, is_duplicate ON income
+        FOR EACH ROW EXECUTE FUNCTION income_set_fingerprint();
+
+    DROP TRIGGER IF EXISTS expenses_fingerprint ON expenses;
+    CREATE TRIGGER expenses_fingerprint
+        BEFORE INSERT OR UPDATE OF user_id, date, amount, description, payment_source_id,
+                                  is_duplicate ON expenses
+        FOR EACH ROW EXECUTE FUNCTION expenses_set_fingerprint();
+"""
+
+# Fingerprints one id range. Setting is_duplicate fires the trigger, which
+# computes the fingerprint. A row is a duplicate if an earlier row of the
+# batch, or any row that already has a fingerprint (earlier batches, rows
+# written since the trigger went in), has the same one; the existing rows
+# are found through the (user_id, date, id) index since equal fingerprints
+# imply equal user, date and amount.
+BACKFILL_SQL = """
+    WITH batch AS (
+        SELECT id, user_id, date, amount,
+               txn_fingerprint(user_id, date, amount, description, {payment_source}) AS fingerprint
+        FROM {table}
+        WHERE id >= %(first_id)s AND id < %(end_id)s
+        AND fingerprint IS NULL
+    ),
+    ranked AS (
+        SELECT b.id,
+               ROW_NUMBER() OVER (PARTITION BY b.fingerprint ORDER BY b.id) > 1
+               OR EXISTS (
+                   SELECT 1
+                   FROM {table} t
+                   WHERE t.user_id = b.user_id
+                   AND t.date = b.date
+                   AND t.amount = b.amount
+                   AND t.fingerprint = b.fingerprint
+               ) AS duplicate
+        FROM batch b
+    )
+    UPDATE {table} t
+    SET is_duplicate = r.duplicate
+    FROM ranked r
+    WHERE t.id = r.id
+"""
+
+def _backfill(cur, table: str, payment_source: str):
+    cur.execute(f"SELECT min(id), max(id) FROM {table} WHERE fingerprint IS NULL")
+    first_id, last_id = cur.fetchone()
+    if first_id is None:
+        return
+    sql = BACKFILL_SQL.format(table=table, payment_source=payment_source)
+    # Ascending ranges, each committed on its own, so no lock is held for
+    # the whole table and an interrupted run resumes where it stopped
+    for start in range(first_id, last_id + 1, BACKFILL_BATCH_SIZE):
+        cur.execute(sql, {'first_id': start, 'end_id': start + BACKFILL_BATCH_SIZE})
+
+def upgrade(cur):
+    cur.execute(SCHEMA_SQL)
+    _backfill(cur, 'income', 'NULL')
+    _backfill(cur, 'expenses', 'payment_source_id')
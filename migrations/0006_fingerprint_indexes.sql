@@ -0,0 +1,16 @@
+-- migrate: no-transaction
+-- The unique fingerprint index makes duplicate inserts a single index
+-- probe (INSERT ... ON CONFLICT DO NOTHING). The (user_id, amount, date)
+-- indexes serve the ±N day near-duplicate lookups and the batch report.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS income_user_fingerprint_key
+    ON income (user_id, fingerprint);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_fingerprint_key
+    ON expenses (user_id, fingerprint);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS income_user_amount_date_idx
+    ON income (user_id, amount, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_amount_date_idx
+    ON expenses (user_id, amount, date);
@@ -0,0 +1,172 @@
+-- Per-user monthly sums of income and expenses by category, payment source
+-- and necessity level. Statement-level triggers apply each write's net
+-- change through transition tables, so bulk inserts and deletes cost one
+-- grouped upsert rather than one per row. Missing categories and payment
+-- sources are stored as 0 and a missing necessity level (always the case
+-- for income) as '', so the key stays NOT NULL.
+
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    user_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    category_id INTEGER NOT NULL,
+    payment_source_id INTEGER NOT NULL DEFAULT 0,
+    necessity_level VARCHAR(20) NOT NULL DEFAULT '',
+    total NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, kind, category_id, payment_source_id, necessity_level)
+);
+
+CREATE OR REPLACE FUNCTION income_rollup_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'income', COALESCE(category_id, 0),
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'income', COALESCE(category_id, 0),
+               -SUM(amount), -COUNT(*)
+        FROM old_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+        DELETE FROM monthly_rollups
+        WHERE row_count = 0
+        AND user_id IN (SELECT user_id FROM old_rows);
+    ELSE
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'income', COALESCE(category_id, 0),
+               SUM(amount * sign), SUM(sign)
+        FROM (
+            SELECT user_id, date, category_id, amount, 1 AS sign FROM new_rows
+            UNION ALL
+            SELECT user_id, date, category_id, amount, -1 AS sign FROM old_rows
+        ) changed
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4
+        HAVING SUM(sign) <> 0 OR SUM(amount * sign) <> 0
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+        DELETE FROM monthly_rollups
+        WHERE row_count = 0
+        AND user_id IN (SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows);
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION expenses_rollup_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, payment_source_id, necessity_level, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'expense', COALESCE(category_id, 0),
+               COALESCE(payment_source_id, 0), COALESCE(necessity_level, ''),
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4, 5, 6
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, payment_source_id, necessity_level, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'expense', COALESCE(category_id, 0),
+               COALESCE(payment_source_id, 0), COALESCE(necessity_level, ''),
+               -SUM(amount), -COUNT(*)
+        FROM old_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4, 5, 6
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+        DELETE FROM monthly_rollups
+        WHERE row_count = 0
+        AND user_id IN (SELECT user_id FROM old_rows);
+    ELSE
+        INSERT INTO monthly_rollups AS r
+            (user_id, month, kind, category_id, payment_source_id, necessity_level, total, row_count)
+        SELECT user_id, DATE_TRUNC('month', date)::date, 'expense', COALESCE(category_id, 0),
+               COALESCE(payment_source_id, 0), COALESCE(necessity_level, ''),
+               SUM(amount * sign), SUM(sign)
+        FROM (
+            SELECT user_id, date, category_id, payment_source_id, necessity_level, amount, 1 AS sign
+            FROM new_rows
+            UNION ALL
+            SELECT user_id, date, category_id, payment_source_id, necessity_level, amount, -1 AS sign
+            FROM old_rows
+        ) changed
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 4, 5, 6
+        HAVING SUM(sign) <> 0 OR SUM(amount * sign) <> 0
+        ON CONFLICT (user_id, month, kind, category_id, payment_source_id, necessity_level)
+        DO UPDATE SET total = r.total + EXCLUDED.total, row_count = r.row_count + EXCLUDED.row_count;
+        DELETE FROM monthly_rollups
+        WHERE row_count = 0
+        AND user_id IN (SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows);
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS income_rollup_insert ON income;
+CREATE TRIGGER income_rollup_insert AFTER INSERT ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION income_rollup_delta();
+
+DROP TRIGGER IF EXISTS income_rollup_update ON income;
+CREATE TRIGGER income_rollup_update AFTER UPDATE ON income
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION income_rollup_delta();
+
+DROP TRIGGER IF EXISTS income_rollup_delete ON income;
+CREATE TRIGGER income_rollup_delete AFTER DELETE ON income
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION income_rollup_delta();
+
+DROP TRIGGER IF EXISTS expenses_rollup_insert ON expenses;
+CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expenses_rollup_delta();
+
+DROP TRIGGER IF EXISTS expenses_rollup_update ON expenses;
+CREATE TRIGGER expenses_rollup_update AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expenses_rollup_delta();
+
+DROP TRIGGER IF EXISTS expenses_rollup_delete ON expenses;
+CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expenses_rollup_delta();
+
+-- Writes are blocked by the trigger DDL above until this transaction
+-- commits, so the backfill can't miss or double-count a concurrent write
+DELETE FROM monthly_rollups;
+
+INSERT INTO monthly_rollups
+    (user_id, month, kind, category_id, payment_source_id, necessity_level, total, row_count)
+SELECT user_id, DATE_TRUNC('month', date)::date, 'income', COALESCE(category_id, 0), 0, '',
+       SUM(amount), COUNT(*)
+FROM income
+WHERE user_id IS NOT NULL
+GROUP BY 1, 2, 4
+UNION ALL
+SELECT user_id, DATE_TRUNC('month', date)::date, 'expense', COALESCE(category_id, 0),
+       COALESCE(payment_source_id, 0), COALESCE(necessity_level, ''),
+       SUM(amount), COUNT(*)
+FROM expenses
+WHERE user_id IS NOT NULL
+GROUP BY 1, 2, 4, 5, 6;
@@ -0,0 +1,13 @@
+-- Recurring income and expenses. A rule is a row with is_recurring set and
+-- a Weekly/Monthly/Annually frequency; recurrence.py materializes each of
+-- its occurrences as a row pointing back at it through recurrence_parent_id.
+-- recurrence_generated_through is the rule's watermark: every occurrence up
+-- to that date has been inserted.
+
+ALTER TABLE income ADD COLUMN IF NOT EXISTS recurrence_parent_id INTEGER
+    REFERENCES income(id) ON DELETE SET NULL;
+ALTER TABLE income ADD COLUMN IF NOT EXISTS recurrence_generated_through DATE;
+
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS recurrence_parent_id INTEGER
+    REFERENCES expenses(id) ON DELETE SET NULL;
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS recurrence_generated_through DATE;
@@ -0,0 +1,19 @@
+-- migrate: no-transaction
+-- One occurrence per rule and date, so re-running a sweep inserts nothing
+-- twice; and a small partial index for finding the rules themselves.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS income_recurrence_occurrence_key
+    ON income (recurrence_parent_id, date)
+    WHERE recurrence_parent_id IS NOT NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS expenses_recurrence_occurrence_key
+    ON expenses (recurrence_parent_id, date)
+    WHERE recurrence_parent_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS income_recurrence_rules_idx
+    ON income (recurrence_generated_through)
+    WHERE is_recurring AND recurrence_parent_id IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_recurrence_rules_idx
+    ON expenses (recurrence_generated_through)
+    WHERE is_recurring AND recurrence_parent_id IS NULL;
@@ -29,6 +29,7 @@ class Income:
     is_recurring: bool
     user_id: Optional[int] = None
     id: Optional[int] = None
+    recurrence_parent_id: Optional[int] = None
 
 @dataclass
 class Expense:
@@ -42,6 +43,7 @@ class Expense:
     frequency: Optional[str]
     user_id: Optional[int] = None
     id: Optional[int] = None
+    recurrence_parent_id: Optional[int] = None
 
 @dataclass
 class Budget:
@@ -1,12 +1,12 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-from database import get_db_connection
-from utils import export_to_csv
+from analytics_engine import get_analytics_aggregates
+from exporter import EXPORT_PAGE_MAX_ROWS, count_rows, export_transactions
+import tempfile
 from datetime import datetime, timedelta
 from auth import require_auth
 from components import add_auth_controls
+from query_log import track_page
+from profiling import phase, profile_page
 
 def analytics_page():
     # Ensure user is logged in
@@ -14,6 +14,9 @@ def analytics_page():
     if not user:
         st.stop()  # Stop execution if user is not logged in
 
+    import pandas as pd
+    import plotly.express as px
+
     st.title("Financial Analytics")
 
     # Date range selection
@@ -23,49 +26,14 @@ def analytics_page():
     with col2:
         end_date = st.date_input("End Date", value=datetime.now())
 
-    # Get data from database
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Income data
-    cur.execute(
-        """
-        SELECT i.date, i.amount, c.name as category
-        FROM income i
-        JOIN categories c ON i.category_id = c.id
-        WHERE i.date BETWEEN %s AND %s
-        AND i.user_id = %s
-        """,
-        (start_date, end_date, user.id)
-    )
-    income_data = cur.fetchall()
-
-    # Expense data with payment sources
-    cur.execute(
-        """
-        SELECT e.date, e.amount, c.name as category, 
-               e.necessity_level, ps.name as payment_source,
-               ps.type as source_type, ps.bank_name
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        LEFT JOIN payment_sources ps ON e.payment_source_id = ps.id
-        WHERE e.date BETWEEN %s AND %s
-        AND e.user_id = %s
-        """,
-        (start_date, end_date, user.id)
-    )
-    expense_data = cur.fetchall()
-
-    # Convert to DataFrames
-    income_df = pd.DataFrame(income_data, columns=['date', 'amount', 'category'])
-    expense_df = pd.DataFrame(expense_data, columns=['date', 'amount', 'category', 
-                                                   'necessity_level', 'payment_source',
-                                                   'source_type', 'bank_name'])
+    # Grouped from the user's cached ledger; a new date range slices it rather than querying
+    with phase("transform"):
+        aggregates = get_analytics_aggregates(user.id, start_date, end_date)
 
     # Summary metrics
-    total_income = income_df['amount'].sum() if not income_df.empty else 0
-    total_expenses = expense_df['amount'].sum() if not expense_df.empty else 0
-    savings_rate = ((total_income - total_expenses) / total_income * 100) if total_income > 0 else 0
+    total_income = aggregates.total_income
+    total_expenses = aggregates.total_expenses
+    savings_rate = aggregates.savings_rate
 
     # Display metrics
     col1, col2, col3 = st.columns(3)
@@ -80,99 +48,105 @@ def analytics_page():
     tab1, tab2, tab3, tab4 = st.tabs(["Income Analysis", "Expense Analysis", "Payment Sources", "Trends"])
 
     with tab1:
-        if not income_df.empty:
+        if not aggregates.income_by_category.empty:
             # Income by category
-            income_by_category = income_df.groupby('category')['amount'].sum().reset_index()
-            fig = px.pie(
-                income_by_category,
-                values='amount',
-                names='category',
-                title="Income Distribution by Category"
-            )
+            income_by_category = aggregates.income_by_category
+            with phase("chart"):
+                fig = px.pie(
+                    income_by_category,
+                    values='amount',
+                    names='category',
+                    title="Income Distribution by Category"
+                )
             st.plotly_chart(fig)
 
             # Income over time
-            income_by_date = income_df.groupby('date')['amount'].sum().reset_index()
-            fig = px.line(
-                income_by_date,
-                x='date',
-                y='amount',
-                title="Income Trend"
-            )
+            income_by_date = aggregates.income_by_date
+            with phase("chart"):
+                fig = px.line(
+                    income_by_date,
+                    x='date',
+                    y='amount',
+                    title="Income Trend"
+                )
             st.plotly_chart(fig)
         else:
             st.info("No income data available for the selected period")
 
     with tab2:
-        if not expense_df.empty:
+        if not aggregates.expense_by_category.empty:
             # Expenses by category
-            expense_by_category = expense_df.groupby('category')['amount'].sum().reset_index()
-            fig = px.pie(
-                expense_by_category,
-                values='amount',
-                names='category',
-                title="Expense Distribution by Category"
-            )
+            expense_by_category = aggregates.expense_by_category
+            with phase("chart"):
+                fig = px.pie(
+                    expense_by_category,
+                    values='amount',
+                    names='category',
+                    title="Expense Distribution by Category"
+                )
             st.plotly_chart(fig)
 
             # Expenses by necessity level
-            expense_by_necessity = expense_df.groupby('necessity_level')['amount'].sum().reset_index()
-            fig = px.bar(
-                expense_by_necessity,
-                x='necessity_level',
-                y='amount',
-                title="Expenses by Necessity Level"
-            )
+            expense_by_necessity = aggregates.expense_by_necessity
+            with phase("chart"):
+                fig = px.bar(
+                    expense_by_necessity,
+                    x='necessity_level',
+                    y='amount',
+                    title="Expenses by Necessity Level"
+                )
             st.plotly_chart(fig)
         else:
             st.info("No expense data available for the selected period")
 
     with tab3:
-        if not expense_df.empty:
+        if not aggregates.expense_by_category.empty:
             # Expenses by payment source
             st.subheader("Payment Source Analysis")
 
             # By payment source
-            expense_by_source = expense_df.groupby(['payment_source', 'bank_name'])['amount'].sum().reset_index()
-            fig = px.bar(
-                expense_by_source,
-                x='payment_source',
-                y='amount',
-                color='bank_name',
-                title="Expenses by Payment Source"
-            )
+            expense_by_source = aggregates.expense_by_source
+            with phase("chart"):
+                fig = px.bar(
+                    expense_by_source,
+                    x='payment_source',
+                    y='amount',
+                    color='bank_name',
+                    title="Expenses by Payment Source"
+                )
             st.plotly_chart(fig)
 
             # By source type
-            expense_by_source_type = expense_df.groupby('source_type')['amount'].sum().reset_index()
-            fig = px.pie(
-                expense_by_source_type,
-                values='amount',
-                names='source_type',
-                title="Payment Method Distribution"
-            )
+            expense_by_source_type = aggregates.expense_by_source_type
+            with phase("chart"):
+                fig = px.pie(
+                    expense_by_source_type,
+                    values='amount',
+                    names='source_type',
+                    title="Payment Method Distribution"
+                )
             st.plotly_chart(fig)
         else:
             st.info("No expense data available for the selected period")
 
     with tab4:
-        if not income_df.empty or not expense_df.empty:
+        if not aggregates.income_by_date.empty or not aggregates.expense_by_date.empty:
             # Combined income vs expenses trend
-            income_trend = income_df.groupby('date')['amount'].sum().reset_index() if not income_df.empty else pd.DataFrame({'date': [], 'amount': []})
-            income_trend['type'] = 'Income'
-            expense_trend = expense_df.groupby('date')['amount'].sum().reset_index() if not expense_df.empty else pd.DataFrame({'date': [], 'amount': []})
-            expense_trend['type'] = 'Expense'
+            income_trend = aggregates.income_by_date.assign(type='Income')
+            expense_trend = aggregates.expense_by_date.assign(type='Expense')
 
-            combined_trend = pd.concat([income_trend, expense_trend])
+            with phase("transform"):
+                combined_trend = pd.concat([income_trend, expense_trend])
 
             if not combined_trend.empty:
-                fig = px.line(
-                    combined_trend,
-                    x='date',
-                    y='amount',
-                    color='type',
-                    title="Income vs Expenses Over Time"
-                )
+                with phase("chart"):
+                    fig = px.line(
+                        combined_trend,
+                        x='date',
+                        y='amount',
+                        color='type',
+                        title="Income vs Expenses Over Time"
+                    )
                 st.plotly_chart(fig)
         else:
             st.info("No data available for the selected period")
@@ -180,30 +154,46 @@ def analytics_page():
     # Export options
     st.subheader("Export Data")
 
-    col1, col2 = st.columns(2)
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True)
+    with export_col2:
+        full_history = st.checkbox("Full history", help="Ignore the date range above")
+    extension = export_format.lower()
+    export_range = (None, None) if full_history else (start_date, end_date)
 
-    with col1:
-        if not income_df.empty and st.button("Export Income Data"):
-            csv = export_to_csv(income_df, "income_data.csv")
-            st.download_button(
-                label="Download Income CSV",
-                data=csv,
-                file_name="income_data.csv",
-                mime="text/csv"
-            )
+    st.caption(f"Exports from this page are limited to {EXPORT_PAGE_MAX_ROWS:,} rows, since "
+               f"the download is held in memory. Larger exports, such as a long full history, "
+               f"stream to a file from the command line: "
+               f"`python exporter.py {user.username} expenses --format {extension} --output "
+               f"expenses.{extension}`")
 
-    with col2:
-        if not expense_df.empty and st.button("Export Expense Data"):
-            csv = export_to_csv(expense_df, "expense_data.csv")
-            st.download_button(
-                label="Download Expense CSV",
-                data=csv,
-                file_name="expense_data.csv",
-                mime="text/csv"
-            )
-
-    cur.close()
-    conn.close()
+    col1, col2 = st.columns(2)
+
+    # Rows are streamed from a server-side cursor into a temporary file
+    # only when an export is requested, and only up to the page's row cap
+    for column, table, label in ((col1, "income", "Income"), (col2, "expenses", "Expense")):
+        with column:
+            if st.button(f"Export {label} Data"):
+                if count_rows(user.id, table, *export_range) > EXPORT_PAGE_MAX_ROWS:
+                    st.warning(f"This export is over {EXPORT_PAGE_MAX_ROWS:,} rows. Narrow the "
+                               f"date range or use `python exporter.py {user.username} {table}`.")
+                    continue
+                export_file = tempfile.TemporaryFile()
+                try:
+                    rows = export_transactions(user.id, table, extension, export_file, *export_range)
+                    export_file.seek(0)
+                    st.download_button(
+                        label=f"Download {label} {export_format} ({rows} rows)",
+                        data=export_file.read(),
+                        file_name=f"{label.lower()}_data.{extension}",
+                        mime="text/csv" if extension == "csv" else "application/vnd.apache.parquet"
+                    )
+                except Exception as e:
+                    st.error(f"Error exporting data: {str(e)}")
+                finally:
+                    export_file.close()
 
 if __name__ == "__main__":
-    analytics_page()
\ No newline at end of file
+    with track_page("analytics"), profile_page("analytics"):
+        analytics_page()
\ No newline at end of file
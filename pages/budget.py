@@ -1,10 +1,14 @@
 import streamlit as st
-import plotly.express as px
 from database import get_db_connection
-from utils import calculate_budget_progress
+from cache import invalidate_tables
+from lookups import get_categories
+from queries import get_budgets
+from utils import calculate_all_budget_progress
 from datetime import datetime
 from auth import require_auth
 from components import add_auth_controls
+from query_log import track_page
+from profiling import phase, profile_page
 
 def budget_page():
     # Ensure user is logged in
@@ -22,18 +26,7 @@ def budget_page():
     with tab1:
         with st.form("budget_setup_form"):
             # Get expense categories
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT id, name 
-                FROM categories 
-                WHERE type = 'expense'
-                AND (user_id IS NULL OR user_id = %s)
-                """,
-                (user.id,)
-            )
-            categories = cur.fetchall()
+            categories = get_categories(user.id, 'expense')
             category_options = {cat[1]: cat[0] for cat in categories}
 
             category = st.selectbox(
@@ -51,6 +44,8 @@ def budget_page():
             submitted = st.form_submit_button("Set Budget")
 
             if submitted:
+                conn = get_db_connection()
+                cur = conn.cursor()
                 try:
                     cur.execute(
                         """
@@ -63,6 +58,7 @@ def budget_page():
                          amount, start_date)
                     )
                     conn.commit()
+                    invalidate_tables(user.id, 'budgets')
                     st.success("Budget set successfully!")
                 except Exception as e:
                     st.error(f"Error setting budget: {str(e)}")
@@ -74,24 +70,17 @@ def budget_page():
         # Budget progress overview
         st.subheader("Budget Progress")
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-
         # Get all budgets for the current user
-        cur.execute(
-            """
-            SELECT b.*, c.name as category_name
-            FROM budgets b
-            JOIN categories c ON b.category_id = c.id
-            WHERE b.user_id = %s
-            """,
-            (user.id,)
-        )
-        budgets = cur.fetchall()
+        budgets = get_budgets(user.id)
 
         if budgets:
+            # One grouped query for every budget instead of one per row
+            with phase("transform"):
+                all_progress = calculate_all_budget_progress(user.id)
             for budget in budgets:
-                progress = calculate_budget_progress(budget[1], budget[3], user.id)
+                progress = all_progress.get(
+                    (budget[1], budget[3]), {'progress': 0, 'remaining': float(budget[2])}
+                )
 
                 col1, col2 = st.columns(2)
 
@@ -115,8 +104,6 @@ def budget_page():
         else:
             st.info("No budgets set yet")
 
-        cur.close()
-        conn.close()
-
 if __name__ == "__main__":
-    budget_page()
\ No newline at end of file
+    with track_page("budget"), profile_page("budget"):
+        budget_page()
\ No newline at end of file
@@ -1,10 +1,16 @@
 import streamlit as st
-import plotly.express as px
+import numpy as np
 from database import get_db_connection
+from cache import invalidate_tables
+from queries import get_debts
 from utils import calculate_debt_payoff
+from amortization import amortize, payoff_sweep
+from payoff_strategies import simulate_strategies
 from datetime import datetime
 from auth import require_auth
 from components import add_auth_controls
+from query_log import track_page
+from profiling import phase, profile_page
 
 def debt_page():
     # Ensure user is logged in
@@ -12,12 +18,15 @@ def debt_page():
     if not user:
         st.stop()  # Stop execution if user is not logged in
 
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.title("Debt Management")
 
     # Add authentication controls
     add_auth_controls()
 
-    tab1, tab2, tab3 = st.tabs(["Add Debt", "Debt Overview", "Payoff Calculator"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Add Debt", "Debt Overview", "Payoff Calculator", "Payoff Strategies"])
 
     with tab1:
         with st.form("add_debt_form"):
@@ -46,6 +55,7 @@ def debt_page():
                          minimum_payment, due_date, user.id)
                     )
                     conn.commit()
+                    invalidate_tables(user.id, 'debts')
                     st.success("Debt added successfully!")
                 except Exception as e:
                     st.error(f"Error adding debt: {str(e)}")
@@ -54,18 +64,7 @@ def debt_page():
                     conn.close()
 
     with tab2:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute(
-            """
-            SELECT * FROM debts 
-            WHERE user_id = %s
-            ORDER BY due_date
-            """, 
-            (user.id,)
-        )
-        debts = cur.fetchall()
+        debts = get_debts(user.id)
 
         if debts:
             total_debt = sum(debt[3] for debt in debts)  # Sum of current balances
@@ -76,11 +75,12 @@ def debt_page():
                 'names': [debt[1] for debt in debts],
                 'values': [float(debt[3]) for debt in debts]
             }
-            fig = px.pie(
-                values=debt_data['values'],
-                names=debt_data['names'],
-                title="Debt Distribution"
-            )
+            with phase("chart"):
+                fig = px.pie(
+                    values=debt_data['values'],
+                    names=debt_data['names'],
+                    title="Debt Distribution"
+                )
             st.plotly_chart(fig)
 
             # List all debts with edit and delete options
@@ -117,6 +117,8 @@ def debt_page():
                             col1, col2 = st.columns(2)
                             with col1:
                                 if st.form_submit_button("Save Changes"):
+                                    conn = get_db_connection()
+                                    cur = conn.cursor()
                                     try:
                                         cur.execute("""
                                             UPDATE debts 
@@ -126,11 +128,15 @@ def debt_page():
                                         """, (new_name, new_total, new_balance, new_rate, 
                                               new_payment, new_due_date, debt_id, user.id))
                                         conn.commit()
+                                        invalidate_tables(user.id, 'debts')
                                         st.success("Debt updated successfully!")
                                         st.session_state[f'editing_debt_{debt_id}'] = False
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"Error updating debt: {str(e)}")
+                                    finally:
+                                        cur.close()
+                                        conn.close()
                             with col2:
                                 if st.form_submit_button("Cancel"):
                                     st.session_state[f'editing_debt_{debt_id}'] = False
@@ -142,17 +148,23 @@ def debt_page():
                         col1, col2 = st.columns(2)
                         with col1:
                             if st.button("✓ Yes", key=f"confirm_yes_{debt_id}"):
+                                conn = get_db_connection()
+                                cur = conn.cursor()
                                 try:
                                     cur.execute(
                                         "DELETE FROM debts WHERE id = %s AND user_id = %s",
                                         (debt_id, user.id)
                                     )
                                     conn.commit()
+                                    invalidate_tables(user.id, 'debts')
                                     st.success("Debt deleted successfully!")
                                     st.session_state[f'confirm_delete_debt_{debt_id}'] = False
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"Error deleting debt: {str(e)}")
+                                finally:
+                                    cur.close()
+                                    conn.close()
                         with col2:
                             if st.button("✗ No", key=f"confirm_no_{debt_id}"):
                                 st.session_state[f'confirm_delete_debt_{debt_id}'] = False
@@ -160,9 +172,6 @@ def debt_page():
         else:
             st.info("No debts recorded")
 
-        cur.close()
-        conn.close()
-
     with tab3:
         st.subheader("Debt Payoff Calculator")
 
@@ -170,21 +179,11 @@ def debt_page():
         use_existing = st.checkbox("Use existing debt")
 
         if use_existing:
-            # Get existing debts for selection
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT id, name, current_balance, interest_rate, minimum_payment
-                FROM debts
-                WHERE user_id = %s
-                ORDER BY name
-                """,
-                (user.id,)
+            # Get existing debts for selection: (id, name, current_balance, interest_rate, minimum_payment)
+            existing_debts = sorted(
+                ((debt[0], debt[1], debt[3], debt[4], debt[5]) for debt in get_debts(user.id)),
+                key=lambda debt: debt[1]
             )
-            existing_debts = cur.fetchall()
-            cur.close()
-            conn.close()
 
             if existing_debts:
                 debt_options = {f"{debt[1]} (${float(debt[2]):,.2f})": debt for debt in existing_debts}
@@ -222,14 +221,136 @@ def debt_page():
         if st.button("Calculate Payoff Plan"):
             payoff_results = calculate_debt_payoff(principal, interest_rate, monthly_payment)
 
-            col1, col2, col3 = st.columns(3)
+            if payoff_results['negative_amortization']:
+                monthly_interest = principal * interest_rate / 12 / 100
+                st.error(
+                    f"A ${monthly_payment:,.2f} payment doesn't cover the ${monthly_interest:,.2f} "
+                    "of monthly interest, so this debt will never be paid off"
+                )
+            else:
+                col1, col2, col3 = st.columns(3)
+
+                with col1:
+                    st.metric("Time to Pay Off", f"{payoff_results['months']} months")
+                with col2:
+                    st.metric("Total Interest", f"${payoff_results['total_interest']:,.2f}")
+                with col3:
+                    st.metric("Total Payment", f"${payoff_results['total_payment']:,.2f}")
+
+                # Balance over the life of the loan
+                with phase("transform"):
+                    schedule = amortize(principal, interest_rate, monthly_payment)
+                    months = np.arange(1, schedule.balance.shape[-1] + 1)
+                with phase("chart"):
+                    fig = px.area(
+                        x=months,
+                        y=schedule.balance,
+                        labels={'x': 'Month', 'y': 'Remaining Balance'},
+                        title="Payoff Schedule"
+                    )
+                st.plotly_chart(fig)
+
+                # How the payment amount changes total interest and payoff time
+                with phase("transform"):
+                    payments = np.linspace(monthly_payment * 0.5, monthly_payment * 3, 60)
+                    sweep = payoff_sweep(principal, interest_rate, payments)
+                    pays_off = ~sweep['negative_amortization']
+                with phase("chart"):
+                    fig = px.line(
+                        x=sweep['payment'][pays_off],
+                        y=sweep['total_interest'][pays_off],
+                        hover_data={'Months': sweep['months'][pays_off]},
+                        labels={'x': 'Monthly Payment', 'y': 'Total Interest'},
+                        title="Total Interest by Monthly Payment"
+                    )
+                st.plotly_chart(fig)
+
+    with tab4:
+        st.subheader("Compare Payoff Strategies")
 
-            with col1:
-                st.metric("Time to Pay Off", f"{payoff_results['months']} months")
-            with col2:
-                st.metric("Total Interest", f"${payoff_results['total_interest']:,.2f}")
-            with col3:
-                st.metric("Total Payment", f"${payoff_results['total_payment']:,.2f}")
+        debts = [debt for debt in get_debts(user.id) if float(debt[3]) > 0]
+
+        if debts:
+            # Debts may share a name, so options are indexes and repeated names are numbered
+            names = [debt[1] for debt in debts]
+            labels = [
+                f"{name} ({names[:index + 1].count(name)})" if names.count(name) > 1 else name
+                for index, name in enumerate(names)
+            ]
+            balances = np.array([float(debt[3]) for debt in debts])
+            rates = np.array([float(debt[4]) for debt in debts])
+            minimums = np.array([float(debt[5]) for debt in debts])
+            total_minimum = float(minimums.sum())
+
+            monthly_budget = st.slider(
+                "Total Monthly Payment Budget",
+                min_value=total_minimum,
+                max_value=max(total_minimum * 3, total_minimum + 100.0),
+                value=total_minimum,
+                step=10.0
+            )
+            custom_order = st.multiselect(
+                "Custom Payoff Order",
+                options=list(range(len(debts))),
+                default=list(range(len(debts))),
+                format_func=labels.__getitem__,
+                help="Debts you leave out are paid after the ones you list"
+            )
+            custom_order += [index for index in range(len(debts)) if index not in custom_order]
+
+            with phase("transform"):
+                results = simulate_strategies(balances, rates, minimums, monthly_budget,
+                                              custom_order=custom_order)
+
+            summary_rows = []
+            for strategy, result in results.items():
+                summary_rows.append({
+                    'Strategy': strategy.title(),
+                    'Months': result.months if result.months >= 0 else None,
+                    'Debt Free': str(result.payoff_date.max()) if result.months >= 0 else "Not within 40 years",
+                    'Total Interest': result.total_interest
+                })
+            st.dataframe(
+                summary_rows,
+                column_config={
+                    'Total Interest': st.column_config.NumberColumn(format="$%.2f")
+                },
+                hide_index=True
+            )
+
+            with phase("chart"):
+                fig = go.Figure()
+                for strategy, result in results.items():
+                    fig.add_trace(go.Scatter(
+                        x=np.arange(1, len(result.balance) + 1),
+                        y=result.balance.sum(axis=1),
+                        mode='lines',
+                        name=strategy.title()
+                    ))
+                fig.update_layout(
+                    title="Total Balance Over Time",
+                    xaxis_title="Month",
+                    yaxis_title="Remaining Balance"
+                )
+            st.plotly_chart(fig)
+
+            st.write("Payoff date by debt")
+            st.dataframe(
+                {
+                    'Debt': labels,
+                    **{
+                        strategy.title(): [
+                            str(payoff) if month >= 0 else "—"
+                            for payoff, month in zip(result.payoff_date, result.payoff_month)
+                        ]
+                        for strategy, result in results.items()
+                    }
+                },
+                hide_index=True
+            )
+        else:
+            st.info("No debts recorded")
 
 if __name__ == "__main__":
-    debt_page()
\ No newline at end of file
+    with track_page("debt"), profile_page("debt"):
+        debt_page()
\ No newline at end of file
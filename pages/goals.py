@@ -1,11 +1,16 @@
 import streamlit as st
-import plotly.express as px
 from database import get_db_connection
+from cache import invalidate_tables
+from lookups import get_categories
+from queries import get_goals
 from datetime import datetime, date
 from decimal import Decimal
 from auth import require_auth
 from components import add_auth_controls
 from utils import calculate_goal_progress
+from goal_simulation import PRIORITY_ORDER, get_savings_history, months_until, simulate_goals
+from query_log import track_page
+from profiling import phase, profile_page
 
 def goals_page():
     # Ensure user is logged in
@@ -27,15 +32,7 @@ def goals_page():
             deadline = st.date_input("Target Date", min_value=date.today())
 
             # Get expense categories for optional categorization
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT id, name 
-                FROM categories 
-                WHERE type = 'expense'
-                AND (user_id IS NULL OR user_id = %s)
-            """, (user.id,))
-            categories = cur.fetchall()
+            categories = get_categories(user.id, 'expense')
             category_options = {cat[1]: cat[0] for cat in categories}
             category_options["None"] = None
 
@@ -52,6 +49,8 @@ def goals_page():
             submitted = st.form_submit_button("Set Goal")
 
             if submitted:
+                conn = get_db_connection()
+                cur = conn.cursor()
                 try:
                     cur.execute(
                         """
@@ -64,6 +63,7 @@ def goals_page():
                          priority, user.id)
                     )
                     conn.commit()
+                    invalidate_tables(user.id, 'financial_goals')
                     st.success("Goal set successfully!")
                 except Exception as e:
                     st.error(f"Error setting goal: {str(e)}")
@@ -72,17 +72,7 @@ def goals_page():
                     conn.close()
 
     with tab2:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT g.*, c.name as category_name
-            FROM financial_goals g
-            LEFT JOIN categories c ON g.category_id = c.id
-            WHERE g.user_id = %s
-            ORDER BY g.deadline
-        """, (user.id,))
-        goals = cur.fetchall()
+        goals = get_goals(user.id)
 
         if goals:
             # Summary metrics
@@ -96,6 +86,66 @@ def goals_page():
                 f"{overall_progress:.1f}%"
             )
 
+            # Monte Carlo outlook from the user's monthly savings history
+            st.subheader("Goal Outlook")
+            history = get_savings_history(user.id, date.today())
+            open_goals = sorted(
+                (goal for goal in goals if goal[7] != 'completed' and goal[2] > goal[3]),
+                key=lambda goal: (PRIORITY_ORDER.get(goal[6], len(PRIORITY_ORDER)), goal[4])
+            )
+            outlook_by_goal = {}
+
+            if open_goals:
+                col1, col2 = st.columns(2)
+                with col1:
+                    confidence = st.slider("Confidence", 50, 99, 80, format="%d%%") / 100
+                with col2:
+                    shared = st.checkbox(
+                        "Goals share my savings (by priority)", value=True,
+                        help="Savings fund higher-priority goals first, then the next, and so on"
+                    )
+
+                with phase("transform"):
+                    outlook = simulate_goals(
+                        history,
+                        [float(goal[2]) - float(goal[3]) for goal in open_goals],
+                        [months_until(goal[4], date.today()) for goal in open_goals],
+                        confidence=confidence,
+                        shared=shared
+                    )
+                outlook_by_goal = {
+                    goal[0]: (outlook.probability[i], outlook.required_monthly_contribution[i])
+                    for i, goal in enumerate(open_goals)
+                }
+
+                if len(history):
+                    st.caption(f"Based on {len(history)} months of savings history "
+                               f"(average ${history.mean():,.2f}/month)")
+                else:
+                    st.caption("No savings history yet; assuming no monthly savings")
+
+                st.dataframe(
+                    {
+                        "Goal": [goal[1] for goal in open_goals],
+                        "Priority": [goal[6] for goal in open_goals],
+                        "Remaining": [float(goal[2]) - float(goal[3]) for goal in open_goals],
+                        "Deadline": [goal[4] for goal in open_goals],
+                        "Chance On Time": outlook.probability * 100,
+                        "Extra Needed / Month": outlook.required_monthly_contribution,
+                    },
+                    column_config={
+                        "Remaining": st.column_config.NumberColumn(format="$%.2f"),
+                        "Chance On Time": st.column_config.ProgressColumn(
+                            format="%.0f%%", min_value=0, max_value=100
+                        ),
+                        "Extra Needed / Month": st.column_config.NumberColumn(
+                            help=f"Extra monthly savings to hit the goal with {confidence:.0%} confidence",
+                            format="$%.2f"
+                        ),
+                    },
+                    hide_index=True
+                )
+
             # Individual goals
             for goal in goals:
                 progress = calculate_goal_progress(goal[3], goal[2])  # current_amount / target_amount
@@ -129,6 +179,12 @@ def goals_page():
 
                     st.progress(min(float(progress) / 100, 1.0), text=f"{float(progress):.1f}%")
 
+                    if goal[0] in outlook_by_goal:
+                        probability, required = outlook_by_goal[goal[0]]
+                        st.write(f"Chance of reaching this goal on time: **{probability:.0%}**"
+                                 + (f" (save ${required:,.2f} more per month to reach "
+                                    f"{confidence:.0%})" if required > 0 else ""))
+
                     # Update current amount
                     new_amount = st.number_input(
                         "Update Current Amount",
@@ -138,6 +194,8 @@ def goals_page():
                     )
 
                     if st.button("Update Progress", key=f"update_goal_{goal[0]}"):
+                        conn = get_db_connection()
+                        cur = conn.cursor()
                         try:
                             cur.execute(
                                 """
@@ -152,15 +210,17 @@ def goals_page():
                                 (new_amount, new_amount, goal[0], user.id)
                             )
                             conn.commit()
+                            invalidate_tables(user.id, 'financial_goals')
                             st.success("Progress updated!")
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error updating progress: {str(e)}")
+                        finally:
+                            cur.close()
+                            conn.close()
         else:
             st.info("No financial goals set yet")
 
-        cur.close()
-        conn.close()
-
 if __name__ == "__main__":
-    goals_page()
+    with track_page("goals"), profile_page("goals"):
+        goals_page()
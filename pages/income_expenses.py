@@ -1,10 +1,19 @@
 import streamlit as st
 from database import get_db_connection
+from cache import invalidate_tables
+from lookups import get_active_payment_sources, get_categories
+from queries import get_transactions_page
+from dedupe import find_near_duplicates, get_duplicate_report
+from recurrence import delete_transactions, sweep as sweep_recurrences
+from importer import CSV_FIELDS, import_transactions, parse_csv, parse_ofx, parse_qif
 from datetime import datetime
 from decimal import Decimal
-import pandas as pd
+import csv
+import io
 from auth import require_auth
 from components import add_auth_controls
+from query_log import track_page
+from profiling import phase, profile_page
 
 def income_expenses_page():
     # Ensure user is logged in
@@ -12,12 +21,14 @@ def income_expenses_page():
     if not user:
         st.stop()  # Stop execution if user is not logged in
 
+    import pandas as pd
+
     st.title("Income & Expenses Management")
 
     # Add authentication controls
     add_auth_controls()
 
-    tab1, tab2 = st.tabs(["Add Transaction", "View Transactions"])
+    tab1, tab2, tab3 = st.tabs(["Add Transaction", "View Transactions", "Import"])
 
     with tab1:
         # Transaction type selection
@@ -33,18 +44,7 @@ def income_expenses_page():
             date = st.date_input("Date")
 
             # Get categories based on transaction type and user
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT id, name 
-                FROM categories 
-                WHERE type = %s 
-                AND (user_id IS NULL OR user_id = %s)
-                """,
-                (transaction_type.lower(), user.id)
-            )
-            categories = cur.fetchall()
+            categories = get_categories(user.id, transaction_type.lower())
             category_options = {cat[1]: cat[0] for cat in categories}
 
             category = st.selectbox(
@@ -64,14 +64,7 @@ def income_expenses_page():
                 )
 
                 # Get payment sources for expenses
-                cur.execute("""
-                    SELECT id, name, type, bank_name, last_four 
-                    FROM payment_sources 
-                    WHERE is_active = true
-                    AND user_id = %s
-                    ORDER BY name
-                """, (user.id,))
-                payment_sources = cur.fetchall()
+                payment_sources = get_active_payment_sources(user.id)
                 payment_source_options = {
                     f"{src[1]} ({src[2].replace('_', ' ').title()} - {src[3]} *{src[4]})": src[0] 
                     for src in payment_sources
@@ -92,37 +85,68 @@ def income_expenses_page():
                 )
 
             is_recurring = st.checkbox("Is this a recurring transaction?")
+            allow_duplicate = st.checkbox(
+                "Save even if a similar transaction exists",
+                help="Same amount within a couple of days of this date"
+            )
 
             submitted = st.form_submit_button("Add Transaction")
 
             if submitted:
+                table = 'income' if transaction_type == "Income" else 'expenses'
+                similar = [] if allow_duplicate else find_near_duplicates(user.id, table, Decimal(str(amount)), date)
+                if similar:
+                    st.warning("Possible duplicate of: " + "; ".join(
+                        f"{row[1]} {row[2]} ${row[3]:,.2f}" for row in similar
+                    ) + ". Tick the box above to save it anyway.")
+                    st.stop()
+
+                conn = get_db_connection()
+                cur = conn.cursor()
                 try:
                     if transaction_type == "Income":
-                        cur.execute(
-                            """
+                        insert_sql = """
                             INSERT INTO income 
                             (description, amount, frequency, category_id, date, 
-                             is_recurring, user_id)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            (description, amount, frequency, category_options[category],
-                             date, is_recurring, user.id)
-                        )
+                             is_recurring, user_id, is_duplicate)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (user_id, fingerprint) DO NOTHING
+                            RETURNING id
+                        """
+                        params = (description, amount, frequency, category_options[category],
+                                  date, is_recurring, user.id)
                     else:
-                        cur.execute(
-                            """
+                        insert_sql = """
                             INSERT INTO expenses 
                             (description, amount, category_id, payment_source_id, date,
-                             necessity_level, is_recurring, frequency, user_id)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            (description, amount, category_options[category],
-                             payment_source_options[payment_source], date,
-                             necessity_level, is_recurring, frequency, user.id)
-                        )
+                             necessity_level, is_recurring, frequency, user_id, is_duplicate)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (user_id, fingerprint) DO NOTHING
+                            RETURNING id
+                        """
+                        params = (description, amount, category_options[category],
+                                  payment_source_options[payment_source], date,
+                                  necessity_level, is_recurring, frequency, user.id)
+                    cur.execute(insert_sql, params + (False,))
+                    inserted = cur.fetchone()
+                    if not inserted and allow_duplicate:
+                        # An exact match exists; keep this one as a deliberate duplicate,
+                        # whose fingerprint the trigger makes distinct
+                        cur.execute(insert_sql, params + (True,))
+                        inserted = cur.fetchone()
 
                     conn.commit()
-                    st.success("Transaction added successfully!")
+                    if inserted:
+                        invalidate_tables(user.id, table)
+                        st.success("Transaction added successfully!")
+                        if is_recurring and frequency != "One-time":
+                            # Materialize the new rule's occurrences right away
+                            generated = sweep_recurrences(user_id=user.id).total
+                            if generated:
+                                st.info(f"Added {generated} {frequency.lower()} occurrences")
+                    else:
+                        st.warning("This transaction has already been recorded. "
+                                   "Tick the box above to save it anyway.")
                 except Exception as e:
                     st.error(f"Error adding transaction: {str(e)}")
                 finally:
@@ -135,104 +159,243 @@ def income_expenses_page():
             ["Income", "Expenses"],
             horizontal=True
         )
+        table = "income" if view_type == "Income" else "expenses"
+
+        # Server-side filters
+        categories = get_categories(user.id, "income" if view_type == "Income" else "expense")
+        filter_categories = {"All Categories": None, **{cat[1]: cat[0] for cat in categories}}
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            filter_category = st.selectbox("Category", options=list(filter_categories.keys()))
+        with col2:
+            date_range = st.date_input("Date Range", value=())
+        with col3:
+            min_amount = st.number_input("Min Amount", min_value=0.0, value=0.0, step=10.0)
+        with col4:
+            max_amount = st.number_input("Max Amount", min_value=0.0, value=0.0, step=10.0,
+                                         help="Leave at 0 for no upper limit")
 
-        conn = get_db_connection()
-        cur = conn.cursor()
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+
+        filters = {
+            'category_id': filter_categories[filter_category],
+            'start_date': date_range[0] if len(date_range) > 0 else None,
+            'end_date': date_range[1] if len(date_range) > 1 else None,
+            'min_amount': min_amount or None,
+            'max_amount': max_amount or None,
+        }
+
+        # Start again from the first page whenever the view or filters change
+        paging_key = (table, page_size, tuple(filters.items()))
+        if st.session_state.get('transactions_paging_key') != paging_key:
+            st.session_state.transactions_paging_key = paging_key
+            st.session_state.transactions_cursors = [None]
+            st.session_state.pending_delete = None
+        cursors = st.session_state.transactions_cursors
+
+        page = get_transactions_page(user.id, table, page_size=page_size,
+                                     after=cursors[-1], **filters)
+        transactions = page['rows']
 
         if view_type == "Income":
-            cur.execute(
-                """
-                SELECT i.id, i.description, i.amount, c.name as category,
-                       i.date, i.frequency, i.is_recurring
-                FROM income i
-                JOIN categories c ON i.category_id = c.id
-                WHERE i.user_id = %s
-                ORDER BY date DESC
-                """,
-                (user.id,)
-            )
             columns = ['ID', 'Description', 'Amount', 'Category', 'Date', 
                       'Frequency', 'Is Recurring']
         else:
-            cur.execute(
-                """
-                SELECT e.id, e.description, e.amount, c.name as category,
-                       ps.name, ps.bank_name, ps.last_four,
-                       e.date, e.necessity_level, e.is_recurring, e.frequency
-                FROM expenses e
-                JOIN categories c ON e.category_id = c.id
-                LEFT JOIN payment_sources ps ON e.payment_source_id = ps.id
-                WHERE e.user_id = %s
-                ORDER BY date DESC
-                """,
-                (user.id,)
-            )
             columns = ['ID', 'Description', 'Amount', 'Category', 
                       'Source Name', 'Bank Name', 'Last Four',
                       'Date', 'Necessity Level', 'Is Recurring', 'Frequency']
 
-        transactions = cur.fetchall()
-
         if transactions:
             # Create DataFrame with named columns immediately
-            df = pd.DataFrame(transactions, columns=columns)
-
-            if view_type == "Expenses":
-                # Format payment source display using proper column names
-                df['Payment Source'] = df.apply(
-                    lambda x: f"{x['Source Name']} ({x['Bank Name']} *{x['Last Four']})"
-                    if pd.notna(x['Source Name']) else "N/A",
-                    axis=1
-                )
+            with phase("transform"):
+                df = pd.DataFrame(transactions, columns=columns)
 
-                # Select and reorder columns for display
-                display_columns = ['ID', 'Description', 'Amount', 'Category', 
-                                 'Payment Source', 'Date', 'Necessity Level', 
-                                 'Is Recurring', 'Frequency']
-                display_df = df[display_columns]
-            else:
-                display_df = df
-
-            # Initialize deletion state in session state
-            if 'delete_id' not in st.session_state:
-                st.session_state.delete_id = None
-
-            # Add delete buttons
-            for idx, row in display_df.iterrows():
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.write(f"{row['Description']} - ${float(row['Amount']):,.2f}")
-                    if st.session_state.delete_id == row['ID']:
-                        confirm_col1, confirm_col2 = st.columns(2)
-                        with confirm_col1:
-                            if st.button("✓ Confirm", key=f"confirm_{row['ID']}"):
-                                try:
-                                    table = "income" if view_type == "Income" else "expenses"
-                                    cur.execute(
-                                        f"DELETE FROM {table} WHERE id = %s AND user_id = %s", 
-                                        (row['ID'], user.id)
-                                    )
-                                    conn.commit()
-                                    st.success(f"{view_type} entry deleted!")
-                                    st.session_state.delete_id = None
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Error deleting entry: {str(e)}")
-                        with confirm_col2:
-                            if st.button("✗ Cancel", key=f"cancel_{row['ID']}"):
-                                st.session_state.delete_id = None
-                                st.rerun()
-                with col2:
-                    if st.button("🗑️ Delete", key=f"delete_{row['ID']}"):
-                        st.session_state.delete_id = row['ID']
+                if view_type == "Expenses":
+                    # Format payment source display using proper column names
+                    df['Payment Source'] = (
+                        df['Source Name'] + " (" + df['Bank Name'] + " *" + df['Last Four'] + ")"
+                    ).where(df['Source Name'].notna(), "N/A")
+
+                    # Select and reorder columns for display
+                    display_columns = ['ID', 'Description', 'Amount', 'Category', 
+                                     'Payment Source', 'Date', 'Necessity Level', 
+                                     'Is Recurring', 'Frequency']
+                    display_df = df[display_columns]
+                else:
+                    display_df = df
+
+            # One table widget; selected rows can be deleted together
+            event = st.dataframe(
+                display_df,
+                column_config={
+                    "ID": None,
+                    "Amount": st.column_config.NumberColumn("Amount", format="$%.2f")
+                },
+                hide_index=True,
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=f"transactions_table_{table}_{len(cursors)}"
+            )
+            selected_ids = [int(i) for i in display_df.iloc[event.selection.rows]['ID']]
+
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if len(cursors) > 1 and st.button("← Previous"):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                if page['next'] and st.button("Next →"):
+                    cursors.append(page['next'])
+                    st.rerun()
+            with col3:
+                st.caption(f"Page {len(cursors)}")
+
+            # Pending deletion as (table, ids), so ids picked from one table are
+            # never confirmed against the other
+            if 'pending_delete' not in st.session_state:
+                st.session_state.pending_delete = None
+
+            if selected_ids and st.button(f"🗑️ Delete {len(selected_ids)} selected"):
+                st.session_state.pending_delete = (table, selected_ids)
+                st.rerun()
+
+            pending = st.session_state.pending_delete
+            delete_ids = pending[1] if pending and pending[0] == table else None
+            if delete_ids:
+                st.warning(f"Delete {len(delete_ids)} {view_type.lower()} entries?")
+                confirm_col1, confirm_col2 = st.columns(2)
+                with confirm_col1:
+                    if st.button("✓ Confirm"):
+                        conn = get_db_connection()
+                        cur = conn.cursor()
+                        try:
+                            delete_transactions(cur, table, delete_ids, user.id)
+                            conn.commit()
+                            invalidate_tables(user.id, table)
+                            st.success(f"{view_type} entries deleted!")
+                            st.session_state.pending_delete = None
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error deleting entries: {str(e)}")
+                        finally:
+                            cur.close()
+                            conn.close()
+                with confirm_col2:
+                    if st.button("✗ Cancel"):
+                        st.session_state.pending_delete = None
                         st.rerun()
-                st.write("---")
 
         else:
             st.info(f"No {view_type.lower()} transactions found")
 
-        cur.close()
-        conn.close()
+        with st.expander("Possible Duplicates"):
+            report = get_duplicate_report(user.id, table)
+            if report:
+                report_df = pd.DataFrame(report, columns=[
+                    "ID", "Date", "Description", "Amount", "Duplicate Of",
+                    "Duplicate Of Date", "Duplicate Of Description", "Kept"
+                ])
+                report_df["Amount"] = report_df["Amount"].apply(lambda x: f"${float(x):,.2f}")
+                st.dataframe(report_df, hide_index=True)
+
+                kept = sum(1 for row in report if row[-1])
+                st.caption(f"{len(report)} possible duplicates (same amount within a couple of days). "
+                           f"{kept} are kept duplicates: saved anyway, repeated within one import, "
+                           f"or recorded before duplicate detection. Delete any that are mistakes "
+                           f"from the list above.")
+            else:
+                st.info("No likely duplicates found")
+
+    with tab3:
+        st.write("Import a bank or card statement export (CSV, OFX/QFX or QIF). "
+                 "Positive amounts are imported as income and negative amounts as expenses.")
+        uploaded = st.file_uploader("Statement file", type=["csv", "ofx", "qfx", "qif"])
+
+        if uploaded is not None:
+            extension = uploaded.name.rsplit('.', 1)[-1].lower()
+            mapping = {}
+            date_format = None
+            if extension == "csv":
+                header = next(csv.reader(io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")), [])
+                uploaded.seek(0)
+                st.subheader("Column Mapping")
+                columns = ["(none)"] + header
+                map_cols = st.columns(3)
+                for i, name in enumerate(CSV_FIELDS):
+                    guess = next((c for c in header if c.strip().lower().replace(' ', '_') == name), "(none)")
+                    with map_cols[i % 3]:
+                        choice = st.selectbox(name.replace('_', ' ').title(), columns,
+                                              index=columns.index(guess), key=f"import_map_{name}")
+                    if choice != "(none)":
+                        mapping[name] = choice
+                date_format = st.text_input("Date format (blank to detect)", placeholder="%m/%d/%Y") or None
+
+            st.subheader("Defaults")
+            st.caption("Used when a row has no category or payment source, or one that doesn't match by name.")
+            income_categories = {cat[1]: cat[0] for cat in get_categories(user.id, 'income')}
+            expense_categories = {cat[1]: cat[0] for cat in get_categories(user.id, 'expense')}
+            payment_sources = {src[1]: src[0] for src in get_active_payment_sources(user.id)}
+            def_cols = st.columns(2)
+            with def_cols[0]:
+                default_income = st.selectbox("Income Category", list(income_categories.keys()))
+                default_expense = st.selectbox("Expense Category", list(expense_categories.keys()))
+            with def_cols[1]:
+                default_source = st.selectbox("Payment Source", list(payment_sources.keys()))
+                default_necessity = st.selectbox("Necessity Level", ["Essential", "Important", "Optional"])
+
+            if not payment_sources:
+                st.warning("Please add a payment source before importing expenses")
+
+            if st.button("Import Transactions"):
+                if extension == "csv" and "date" not in mapping:
+                    st.error("Please map the date column")
+                elif extension == "csv" and not ({"amount", "debit", "credit"} & mapping.keys()):
+                    st.error("Please map an amount column (or debit/credit columns)")
+                else:
+                    stream = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+                    if extension == "csv":
+                        records = parse_csv(stream, mapping, date_format)
+                    elif extension == "qif":
+                        records = parse_qif(stream)
+                    else:
+                        records = parse_ofx(stream)
+                    try:
+                        report = import_transactions(
+                            user.id, records,
+                            default_income_category=income_categories.get(default_income),
+                            default_expense_category=expense_categories.get(default_expense),
+                            default_payment_source=payment_sources.get(default_source),
+                            default_necessity=default_necessity
+                        )
+                    except Exception as e:
+                        st.error(f"Error importing transactions: {str(e)}")
+                    else:
+                        st.success(f"Imported {report.rows_loaded} of {report.rows_read} rows")
+                        stat_cols = st.columns(5)
+                        stat_cols[0].metric("Income Rows", report.income_loaded)
+                        stat_cols[1].metric("Expense Rows", report.expenses_loaded)
+                        stat_cols[2].metric("Duplicates Skipped", report.duplicates)
+                        stat_cols[3].metric("Rejected", report.rejected)
+                        stat_cols[4].metric("Rows/sec", f"{report.rows_per_second:,.0f}")
+                        if report.rejects:
+                            st.subheader("Rejected Rows")
+                            if report.rejected > len(report.rejects):
+                                st.caption(f"Showing the first {len(report.rejects)} of {report.rejected}")
+                            st.dataframe(
+                                pd.DataFrame(report.rejects, columns=["Line", "Reason"]),
+                                hide_index=True
+                            )
+                        if report.duplicate_lines:
+                            st.subheader("Skipped as Already Recorded")
+                            st.caption("Identical rows within this file are all imported; a row "
+                                       "is skipped only when a matching transaction already exists.")
+                            if report.duplicates > len(report.duplicate_lines):
+                                st.caption(f"Showing the first {len(report.duplicate_lines)} "
+                                           f"of {report.duplicates}")
+                            st.dataframe(pd.DataFrame({"Line": report.duplicate_lines}),
+                                         hide_index=True)
 
 if __name__ == "__main__":
-    income_expenses_page()
\ No newline at end of file
+    with track_page("income_expenses"), profile_page("income_expenses"):
+        income_expenses_page()
\ No newline at end of file
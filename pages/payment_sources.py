@@ -1,7 +1,11 @@
 import streamlit as st
 from database import get_db_connection
+from cache import invalidate_tables
+from queries import get_payment_sources
 from auth import require_auth
 from components import add_auth_controls
+from query_log import track_page
+from profiling import profile_page
 
 def payment_sources_page():
     # Ensure user is logged in
@@ -52,6 +56,7 @@ def payment_sources_page():
                             (name, source_type, last_four, bank_name, user.id)
                         )
                         conn.commit()
+                        invalidate_tables(user.id, 'payment_sources')
                         st.success("Payment source added successfully!")
                     except Exception as e:
                         st.error(f"Error adding payment source: {str(e)}")
@@ -60,18 +65,7 @@ def payment_sources_page():
                         conn.close()
 
     with tab2:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT id, name, type, last_four, bank_name, is_active, created_at,
-                   (SELECT COUNT(*) FROM expenses WHERE payment_source_id = payment_sources.id) as usage_count
-            FROM payment_sources
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        """, (user.id,))
-
-        sources = cur.fetchall()
+        sources = get_payment_sources(user.id)
 
         if sources:
             for source in sources:
@@ -88,6 +82,8 @@ def payment_sources_page():
                     with col3:
                         if is_active:
                             if st.button(f"Deactivate", key=f"deactivate_{source_id}"):
+                                conn = get_db_connection()
+                                cur = conn.cursor()
                                 try:
                                     cur.execute(
                                         """
@@ -98,14 +94,20 @@ def payment_sources_page():
                                         (source_id, user.id)
                                     )
                                     conn.commit()
+                                    invalidate_tables(user.id, 'payment_sources')
                                     st.success("Payment source deactivated!")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"Error deactivating payment source: {str(e)}")
+                                finally:
+                                    cur.close()
+                                    conn.close()
                         else:
                             col3a, col3b = st.columns(2)
                             with col3a:
                                 if st.button(f"Reactivate", key=f"reactivate_{source_id}"):
+                                    conn = get_db_connection()
+                                    cur = conn.cursor()
                                     try:
                                         cur.execute(
                                             """
@@ -116,13 +118,19 @@ def payment_sources_page():
                                             (source_id, user.id)
                                         )
                                         conn.commit()
+                                        invalidate_tables(user.id, 'payment_sources')
                                         st.success("Payment source reactivated!")
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"Error reactivating payment source: {str(e)}")
+                                    finally:
+                                        cur.close()
+                                        conn.close()
                             with col3b:
                                 if usage_count == 0:
                                     if st.button("Delete", key=f"delete_{source_id}"):
+                                        conn = get_db_connection()
+                                        cur = conn.cursor()
                                         try:
                                             cur.execute(
                                                 """
@@ -137,18 +145,20 @@ def payment_sources_page():
                                                 (source_id, user.id, source_id)
                                             )
                                             conn.commit()
+                                            invalidate_tables(user.id, 'payment_sources')
                                             st.success("Payment source deleted!")
                                             st.rerun()
                                         except Exception as e:
                                             st.error(f"Error deleting payment source: {str(e)}")
+                                        finally:
+                                            cur.close()
+                                            conn.close()
 
                     st.write(f"Added: {created_at.strftime('%Y-%m-%d')}")
                     st.write(f"Times used: {usage_count}")
         else:
             st.info("No payment sources found")
 
-        cur.close()
-        conn.close()
-
 if __name__ == "__main__":
-    payment_sources_page()
\ No newline at end of file
+    with track_page("payment_sources"), profile_page("payment_sources"):
+        payment_sources_page()
\ No newline at end of file
@@ -1,8 +1,29 @@
+import json
 import streamlit as st
-from database import get_db_connection
+from database import get_db_connection, get_pool_stats
+from cache import get_cache_stats, invalidate_user
+from ledger import get_ledger_stats
+from lookups import get_lookup_stats
 from auth import require_admin
-from models import User
+from auth_service import AuthBusy, get_auth_service, get_auth_stats
 from components import add_auth_controls
+from query_log import get_query_log, track_page
+from profiling import STACK_MODES, get_profiler, profile_page
+
+def _run_statements(statements):
+    """Execute (sql, params) pairs in one short-lived transaction."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for sql, params in statements:
+            cur.execute(sql, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
 
 def user_management_page():
     # Ensure only admin can access this page
@@ -12,16 +33,19 @@ def user_management_page():
 
     st.title("User Management")
 
-    # Get all users
+    # Get all users; the connection goes back to the pool before rendering
     conn = get_db_connection()
     cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, username, is_admin, created_at 
-        FROM users 
-        ORDER BY created_at DESC
-    """)
-    users = cur.fetchall()
+    try:
+        cur.execute("""
+            SELECT id, username, is_admin, created_at 
+            FROM users 
+            ORDER BY created_at DESC
+        """)
+        users = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
 
     if users:
         for user_data in users:
@@ -44,13 +68,14 @@ def user_management_page():
                             st.error("Passwords do not match")
                         else:
                             try:
-                                password_hash = User.hash_password(new_password)
-                                cur.execute(
+                                password_hash = get_auth_service().hash_password(new_password)
+                                _run_statements([(
                                     "UPDATE users SET password_hash = %s WHERE id = %s",
                                     (password_hash, user_id)
-                                )
-                                conn.commit()
+                                )])
                                 st.success("Password updated successfully!")
+                            except AuthBusy:
+                                st.error("The server is busy. Please try again in a moment.")
                             except Exception as e:
                                 st.error(f"Error updating password: {str(e)}")
 
@@ -61,13 +86,13 @@ def user_management_page():
                                 # First, delete all user's data
                                 tables = ['income', 'expenses', 'budgets', 'debts', 
                                         'payment_sources', 'financial_goals']
-                                for table in tables:
-                                    cur.execute(f"DELETE FROM {table} WHERE user_id = %s", 
-                                            (user_id,))
+                                statements = [(f"DELETE FROM {table} WHERE user_id = %s", (user_id,))
+                                              for table in tables]
 
                                 # Then delete the user
-                                cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
-                                conn.commit()
+                                statements.append(("DELETE FROM users WHERE id = %s", (user_id,)))
+                                _run_statements(statements)
+                                invalidate_user(user_id)
                                 st.success(f"User {username} deleted successfully!")
                                 st.rerun()
                             except Exception as e:
@@ -78,11 +103,10 @@ def user_management_page():
                             key=f"admin_{user_id}"
                         ):
                             try:
-                                cur.execute(
+                                _run_statements([(
                                     "UPDATE users SET is_admin = NOT is_admin WHERE id = %s",
                                     (user_id,)
-                                )
-                                conn.commit()
+                                )])
                                 st.success(f"Updated admin status for {username}")
                                 st.rerun()
                             except Exception as e:
@@ -92,8 +116,169 @@ def user_management_page():
     else:
         st.info("No users found")
 
-    cur.close()
-    conn.close()
+    show_database_activity()
+    show_page_profiler()
+
+def show_database_activity():
+    """Per-page query totals, heaviest statements and the slow-query log"""
+    st.header("Database Activity")
+    query_log = get_query_log()
+    st.caption(f"Since this server process started or the log was last reset. "
+               f"Statements slower than {query_log.slow_ms:.0f} ms are logged; "
+               f"parameter values are never recorded, only their types.")
+
+    pages_tab, statements_tab, slow_tab, resources_tab = st.tabs(
+        ["Per Page", "Statements", "Slow Queries", "Pool & Caches"]
+    )
+
+    with pages_tab:
+        page_totals = query_log.page_totals()
+        if page_totals:
+            st.dataframe(
+                page_totals,
+                column_config={
+                    "queries_per_render": st.column_config.NumberColumn("Queries / Render", format="%.1f"),
+                    "db_ms_per_render": st.column_config.NumberColumn("DB ms / Render", format="%.1f"),
+                    "max_db_ms": st.column_config.NumberColumn("Max DB ms", format="%.1f"),
+                    "render_ms": st.column_config.NumberColumn("Render ms", format="%.1f"),
+                    "rows_per_render": st.column_config.NumberColumn("Rows / Render", format="%.0f"),
+                    "kb_per_render": st.column_config.NumberColumn("KB / Render", format="%.1f"),
+                },
+                hide_index=True
+            )
+        else:
+            st.info("No page renders recorded yet")
+
+    with statements_tab:
+        statements = query_log.statement_totals()
+        if statements:
+            st.dataframe(
+                [{**row, 'callers': ', '.join(row['callers']), 'pages': ', '.join(row['pages'])}
+                 for row in statements],
+                column_config={
+                    "total_ms": st.column_config.NumberColumn("Total ms", format="%.1f"),
+                    "mean_ms": st.column_config.NumberColumn("Mean ms", format="%.2f"),
+                    "max_ms": st.column_config.NumberColumn("Max ms", format="%.1f"),
+                },
+                hide_index=True
+            )
+        else:
+            st.info("No statements recorded yet")
+
+    with slow_tab:
+        slow_queries = query_log.slow_queries()
+        if slow_queries:
+            st.dataframe(
+                [{**row, 'params': json.dumps(row['params'])} for row in slow_queries],
+                hide_index=True
+            )
+        else:
+            st.info("No slow queries recorded")
+
+    with resources_tab:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Connection Pool")
+            st.json(get_pool_stats())
+            st.subheader("Auth Workers")
+            st.json(get_auth_stats())
+        with col2:
+            st.subheader("Result Cache")
+            st.json(get_cache_stats())
+            st.subheader("Lookup Cache")
+            st.json(get_lookup_stats())
+            st.subheader("Ledgers")
+            st.json(get_ledger_stats())
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        report = {
+            **query_log.snapshot(),
+            'pool': get_pool_stats(),
+            'cache': get_cache_stats(),
+            'lookups': get_lookup_stats(),
+            'ledgers': get_ledger_stats(),
+            'auth': get_auth_stats(),
+        }
+        st.download_button(
+            "Download as JSON",
+            json.dumps(report, indent=2, default=str),
+            file_name="database_activity.json",
+            mime="application/json"
+        )
+    with col2:
+        if st.button("Reset Statistics"):
+            query_log.reset()
+            st.rerun()
+
+def show_page_profiler():
+    """Per-render phase timings, render-time histograms and stack downloads"""
+    st.header("Page Profiler")
+    profiler = get_profiler()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        enabled = st.toggle("Profile page renders", value=profiler.enabled,
+                            help="Applies to every session in this server process")
+    with col2:
+        stacks = st.selectbox(
+            "Stack capture", STACK_MODES, index=STACK_MODES.index(profiler.stacks),
+            help="'sample' keeps folded stacks for flamegraphs; 'cprofile' adds noticeable overhead"
+        )
+    if enabled != profiler.enabled or stacks != profiler.stacks:
+        profiler.configure(enabled=enabled, stacks=stacks)
+
+    summary = profiler.summary()
+    if not summary:
+        st.info("No profiled renders yet" if enabled else "Profiling is off")
+        return
+
+    st.caption("Mean milliseconds per render over the last renders of each page. "
+               "Render is whatever is not a query, transform or chart, mostly widget output.")
+    st.dataframe(
+        summary,
+        column_config={
+            name: st.column_config.NumberColumn(format="%.1f")
+            for name in summary[0] if name.endswith('_ms')
+        },
+        hide_index=True
+    )
+
+    import plotly.express as px
+
+    page = st.selectbox("Page", [row['page'] for row in summary])
+    histogram = profiler.histogram(page)
+    fig = px.bar(x=list(histogram), y=list(histogram.values()),
+                 labels={'x': 'Render time', 'y': 'Renders'},
+                 title=f"Render Time Distribution: {page}")
+    st.plotly_chart(fig)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "Download Folded Stacks",
+            profiler.folded_stacks(),
+            file_name="page_stacks.folded",
+            help="Input for flamegraph.pl or speedscope",
+            disabled=profiler.stacks != 'sample' and not profiler.folded_stacks()
+        )
+    with col2:
+        st.download_button(
+            "Download Timings as JSON",
+            json.dumps(profiler.snapshot(), indent=2),
+            file_name="page_profile.json",
+            mime="application/json"
+        )
+    with col3:
+        if st.button("Reset Profiles"):
+            profiler.reset()
+            st.rerun()
+
+    report = profiler.top_functions(page)
+    if report:
+        with st.expander(f"cProfile: {page}"):
+            st.code(report)
 
 if __name__ == "__main__":
-    user_management_page()
\ No newline at end of file
+    with track_page("user_management"), profile_page("user_management"):
+        user_management_page()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import numpy as np
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Optional, Sequence
+
+STRATEGIES = ('avalanche', 'snowball', 'custom')
+MAX_HORIZON_MONTHS = 480  # 40 years
+
+# Balances below half a cent count as paid off
+PAID_OFF_EPSILON = 0.005
+
+@dataclass
+class StrategyResult:
+    strategy: str
+    order: np.ndarray         # debt indices, highest priority first
+    balance: np.ndarray       # (months, debts) balance after each month's payments
+    payment: np.ndarray       # (months, debts)
+    interest: np.ndarray      # (months, debts)
+    payoff_month: np.ndarray  # (debts,) 1-based month each debt is cleared, -1 if not within the horizon
+    payoff_date: np.ndarray   # (debts,) datetime64[M], NaT if not within the horizon
+    months: int               # months until every debt is cleared, -1 if not within the horizon
+    total_interest: float
+
+def strategy_orders(balances, annual_rates, custom_order: Optional[Sequence[int]] = None) -> np.ndarray:
+    """(strategies, debts) priority orders for avalanche, snowball and custom"""
+    balances = np.asarray(balances, dtype=np.float64)
+    annual_rates = np.asarray(annual_rates, dtype=np.float64)
+    # lexsort sorts by the last key first
+    avalanche = np.lexsort((balances, -annual_rates))
+    snowball = np.lexsort((-annual_rates, balances))
+    custom = np.arange(len(balances)) if custom_order is None else np.asarray(custom_order)
+    if sorted(custom.tolist()) != list(range(len(balances))):
+        raise ValueError("custom_order must be a permutation of the debt indices")
+    return np.stack([avalanche, snowball, custom])
+
+def simulate_strategies(balances, annual_rates, minimum_payments, monthly_budget: float,
+                        custom_order: Optional[Sequence[int]] = None,
+                        horizon_months: int = MAX_HORIZON_MONTHS,
+                        start: Optional[date] = None) -> Dict[str, StrategyResult]:
+    """Simulate every strategy side by side under one total monthly budget.
+
+    Each month every open debt accrues interest and gets its minimum payment;
+    whatever is left of the budget, including minimums freed up by debts
+    already cleared, goes to open debts in the strategy's priority order.
+    """
+    balances = np.asarray(balances, dtype=np.float64)
+    rates = np.asarray(annual_rates, dtype=np.float64) / 12 / 100
+    minimums = np.asarray(minimum_payments, dtype=np.float64)
+    if not (balances.shape == rates.shape == minimums.shape) or balances.ndim != 1:
+        raise ValueError("balances, annual_rates and minimum_payments must be 1-D and the same length")
+    if monthly_budget < minimums[balances > 0].sum():
+        raise ValueError("monthly_budget must cover the minimum payments")
+
+    orders = strategy_orders(balances, annual_rates, custom_order)
+    n_strategies, n_debts = orders.shape
+
+    balance = np.broadcast_to(balances, (n_strategies, n_debts)).copy()
+    balance_log = np.zeros((horizon_months, n_strategies, n_debts))
+    payment_log = np.zeros_like(balance_log)
+    interest_log = np.zeros_like(balance_log)
+
+    months = horizon_months
+    for month in range(horizon_months):
+        interest = balance * rates
+        balance += interest
+
+        minimum = np.minimum(minimums, balance)
+        extra = monthly_budget - minimum.sum(axis=1)
+
+        # Pour the extra into debts in priority order, capped at each balance
+        owed = np.take_along_axis(balance - minimum, orders, axis=1)
+        owed_before = np.cumsum(owed, axis=1) - owed
+        allocated = np.clip(extra[:, None] - owed_before, 0, owed)
+        extra_payment = np.empty_like(allocated)
+        np.put_along_axis(extra_payment, orders, allocated, axis=1)
+
+        payment = minimum + extra_payment
+        balance -= payment
+        balance[balance < PAID_OFF_EPSILON] = 0.0
+
+        balance_log[month] = balance
+        payment_log[month] = payment
+        interest_log[month] = interest
+
+        if not balance.any():
+            months = month + 1
+            break
+
+    balance_log = balance_log[:months]
+    payment_log = payment_log[:months]
+    interest_log = interest_log[:months]
+
+    # First month each debt's balance reaches zero and stays there
+    cleared = balance_log == 0
+    still_open = ~cleared[::-1].cumprod(axis=0).astype(bool)[::-1]
+    payoff_month = np.where(cleared[-1], still_open.sum(axis=0) + 1, -1)
+    payoff_month = np.where(balances > 0, payoff_month, 0)
+
+    start_month = np.datetime64(start or date.today(), 'M')
+    results = {}
+    for index, strategy in enumerate(STRATEGIES):
+        debt_payoff = payoff_month[index]
+        results[strategy] = StrategyResult(
+            strategy=strategy,
+            order=orders[index],
+            balance=balance_log[:, index],
+            payment=payment_log[:, index],
+            interest=interest_log[:, index],
+            payoff_month=debt_payoff,
+            payoff_date=np.where(
+                debt_payoff >= 0,
+                start_month + np.maximum(debt_payoff, 0).astype('timedelta64[M]'),
+                np.datetime64('NaT', 'M')
+            ),
+            months=int(debt_payoff.max()) if (debt_payoff >= 0).all() else -1,
+            total_interest=float(interest_log[:, index].sum())
+        )
+    return results
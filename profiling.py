@@ -0,0 +1,268 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from query_log import get_query_log
+
+# Per-render page profiler. Each page's __main__ block runs inside
+# profile_page(); code inside a page marks its DataFrame work with
+# phase("transform") and figure construction with phase("chart"). Database
+# time comes from the query log, so a render splits into query, transform,
+# chart and render, where render is everything else (mostly widget emission).
+#
+# Stacks are optional: "sample" polls the page thread's stack every
+# PROFILE_SAMPLE_MS and keeps folded stacks (flamegraph.pl / speedscope
+# format), "cprofile" runs cProfile and accumulates pstats per page.
+PROFILE_PAGES = os.environ.get('PROFILE_PAGES', '0') == '1'
+PROFILE_STACKS = os.environ.get('PROFILE_STACKS', 'off')
+PROFILE_SAMPLE_MS = float(os.environ.get('PROFILE_SAMPLE_MS', 5))
+PROFILE_HISTORY = int(os.environ.get('PROFILE_HISTORY', 500))
+PROFILE_MAX_STACKS = int(os.environ.get('PROFILE_MAX_STACKS', 20000))
+
+PHASES = ('query', 'transform', 'chart', 'render')
+STACK_MODES = ('off', 'sample', 'cprofile')
+# Upper bounds in ms of the render-time histogram buckets; the last one is open
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class _RenderProfile:
+    __slots__ = ('page', 'started', 'phases', '_open', 'total')
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._open = None
+        self.total = 0.0
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name='profile-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                names.append(f"{module}.{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+class PageProfiler:
+    """Rolling per-page phase timings plus optional stack profiles"""
+
+    def __init__(self, enabled=PROFILE_PAGES, stacks=PROFILE_STACKS,
+                 sample_ms=PROFILE_SAMPLE_MS, history=PROFILE_HISTORY,
+                 max_stacks=PROFILE_MAX_STACKS):
+        if stacks not in STACK_MODES:
+            raise ValueError(f"PROFILE_STACKS must be one of {STACK_MODES}")
+        self.enabled = enabled
+        self.stacks = stacks
+        self.sample_ms = sample_ms
+        self.history = history
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._renders = {}  # page -> deque of phase dicts (ms), newest last
+        self._folded = {}  # page -> Counter of folded stacks
+        self._pstats = {}  # page -> pstats.Stats
+
+    def configure(self, enabled=None, stacks=None):
+        """Runtime toggle used by the admin panel"""
+        if stacks is not None and stacks not in STACK_MODES:
+            raise ValueError(f"stacks must be one of {STACK_MODES}")
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if stacks is not None:
+                self.stacks = stacks
+
+    @contextmanager
+    def profile_page(self, page: str):
+        if not self.enabled or getattr(self._local, 'render', None) is not None:
+            yield
+            return
+
+        render = _RenderProfile(page)
+        query_render = get_query_log().current_render
+        db_time_before = query_render.db_time if query_render else 0.0
+        stacks = self.stacks
+        sampler = profiler = None
+        if stacks == 'sample':
+            sampler = _StackSampler(threading.get_ident(), self.sample_ms / 1000)
+            sampler.start()
+        elif stacks == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active on this thread
+                profiler = None
+
+        self._local.render = render
+        try:
+            yield
+        finally:
+            self._local.render = None
+            if profiler is not None:
+                profiler.disable()
+            folded = sampler.stop() if sampler is not None else None
+
+            render.total = time.perf_counter() - render.started
+            render.phases['query'] = ((query_render.db_time if query_render else 0.0)
+                                      - db_time_before)
+            render.phases['render'] = max(
+                render.total - sum(render.phases[name] for name in PHASES if name != 'render'),
+                0.0
+            )
+            self._record(page, render, folded, profiler)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Charge the enclosed time, minus any database time inside it, to ``name``"""
+        render = getattr(self._local, 'render', None)
+        if render is None or render._open is not None:
+            # Not profiling, or nested inside another phase, which keeps the time
+            yield
+            return
+
+        query_render = get_query_log().current_render
+        db_before = query_render.db_time if query_render else 0.0
+        render._open = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            db_inside = (query_render.db_time if query_render else 0.0) - db_before
+            render.phases[name] += max(elapsed - db_inside, 0.0)
+            render._open = None
+
+    def _record(self, page, render, folded, profiler):
+        timings = {name: seconds * 1000 for name, seconds in render.phases.items()}
+        timings['total'] = render.total * 1000
+        with self._lock:
+            self._renders.setdefault(page, deque(maxlen=self.history)).append(timings)
+            if folded:
+                counts = self._folded.setdefault(page, Counter())
+                counts.update(folded)
+                if len(counts) > self.max_stacks:
+                    # Keep the heaviest stacks; the long tail adds little to a flamegraph
+                    self._folded[page] = Counter(dict(counts.most_common(self.max_stacks)))
+            if profiler is not None:
+                if page in self._pstats:
+                    self._pstats[page].add(profiler)
+                else:
+                    self._pstats[page] = pstats.Stats(profiler)
+
+    def summary(self) -> list:
+        """Per page: renders in the window, p50/p95 total and mean ms per phase"""
+        with self._lock:
+            renders = {page: list(timings) for page, timings in self._renders.items()}
+        rows = []
+        for page, timings in sorted(renders.items()):
+            totals = sorted(t['total'] for t in timings)
+            row = {
+                'page': page,
+                'renders': len(timings),
+                'p50_ms': _percentile(totals, 50),
+                'p95_ms': _percentile(totals, 95),
+                'max_ms': totals[-1],
+            }
+            for name in PHASES:
+                row[f'{name}_ms'] = sum(t[name] for t in timings) / len(timings)
+            rows.append(row)
+        return rows
+
+    def histogram(self, page: str) -> dict:
+        """Render-time counts per bucket over the rolling window, e.g. {'<=50ms': 3}"""
+        with self._lock:
+            totals = [t['total'] for t in self._renders.get(page, ())]
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS]
+        labels.append(f">{HISTOGRAM_BUCKETS_MS[-1]}ms")
+        counts = dict.fromkeys(labels, 0)
+        for total in totals:
+            for bound, label in zip(HISTOGRAM_BUCKETS_MS, labels):
+                if total <= bound:
+                    counts[label] += 1
+                    break
+            else:
+                counts[labels[-1]] += 1
+        return counts
+
+    def folded_stacks(self, page=None) -> str:
+        """Folded stacks ("frame;frame;frame count" per line) for flamegraph.pl or speedscope"""
+        with self._lock:
+            pages = [page] if page else sorted(self._folded)
+            lines = []
+            for name in pages:
+                for stack, count in self._folded.get(name, Counter()).most_common():
+                    # Prefix with the page so several pages can share one flamegraph
+                    lines.append(f"{name};{stack} {count}" if page is None else f"{stack} {count}")
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def top_functions(self, page: str, limit: int = 25) -> str:
+        """cProfile report for a page, sorted by cumulative time"""
+        with self._lock:
+            stats = self._pstats.get(page)
+            if stats is None:
+                return ''
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def dump_pstats(self, page: str, path: str):
+        """Write a page's accumulated cProfile data for snakeviz or pstats"""
+        with self._lock:
+            stats = self._pstats.get(page)
+            if stats is None:
+                raise KeyError(f"no cProfile data for {page}")
+            stats.dump_stats(path)
+
+    def snapshot(self) -> dict:
+        pages = self.summary()
+        return {
+            'enabled': self.enabled,
+            'stacks': self.stacks,
+            'pages': pages,
+            'histograms': {row['page']: self.histogram(row['page']) for row in pages},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._renders.clear()
+            self._folded.clear()
+            self._pstats.clear()
+
+def _percentile(sorted_values, pct) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+_profiler = PageProfiler()
+
+def get_profiler() -> PageProfiler:
+    return _profiler
+
+def profile_page(page: str):
+    return _profiler.profile_page(page)
+
+def phase(name: str):
+    return _profiler.phase(name)
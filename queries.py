@@ -0,0 +1,136 @@
+from cache import cached
+from database import get_db_connection
+
+# Read paths shared by main.py and pages/*.py. Results are cached per user;
+# pages call cache.invalidate_tables() after every write. Category and active
+# payment-source lists live in lookups.py.
+
+def _fetchall(sql: str, params) -> list:
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+@cached('payment_sources')
+def get_payment_sources(user_id: int) -> list:
+    return _fetchall(
+        """
+        SELECT id, name, type, last_four, bank_name, is_active, created_at,
+               (SELECT COUNT(*) FROM expenses WHERE payment_source_id = payment_sources.id) as usage_count
+        FROM payment_sources
+        WHERE user_id = %s
+        ORDER BY created_at DESC
+        """,
+        (user_id,)
+    )
+
+@cached('budgets')
+def get_budgets(user_id: int) -> list:
+    return _fetchall(
+        """
+        SELECT b.*, c.name as category_name
+        FROM budgets b
+        JOIN categories c ON b.category_id = c.id
+        WHERE b.user_id = %s
+        """,
+        (user_id,)
+    )
+
+@cached('debts')
+def get_debts(user_id: int) -> list:
+    return _fetchall(
+        """
+        SELECT * FROM debts 
+        WHERE user_id = %s
+        ORDER BY due_date
+        """,
+        (user_id,)
+    )
+
+@cached('goals')
+def get_goals(user_id: int) -> list:
+    return _fetchall(
+        """
+        SELECT g.*, c.name as category_name
+        FROM financial_goals g
+        LEFT JOIN categories c ON g.category_id = c.id
+        WHERE g.user_id = %s
+        ORDER BY g.deadline
+        """,
+        (user_id,)
+    )
+
+TRANSACTIONS_PAGE_SIZE = 50
+
+TRANSACTION_SELECTS = {
+    'income': ('i', """
+        SELECT i.id, i.description, i.amount, c.name as category,
+               i.date, i.frequency, i.is_recurring
+        FROM income i
+        JOIN categories c ON i.category_id = c.id
+    """),
+    'expenses': ('e', """
+        SELECT e.id, e.description, e.amount, c.name as category,
+               ps.name, ps.bank_name, ps.last_four,
+               e.date, e.necessity_level, e.is_recurring, e.frequency
+        FROM expenses e
+        JOIN categories c ON e.category_id = c.id
+        LEFT JOIN payment_sources ps ON e.payment_source_id = ps.id
+    """),
+}
+
+def build_transactions_query(table: str, category_id=None, start_date=None, end_date=None,
+                             min_amount=None, max_amount=None, after=None) -> str:
+    """Keyset-paginated transaction list, newest first, ordered by (date, id)"""
+    alias, select = TRANSACTION_SELECTS[table]
+    conditions = [f"{alias}.user_id = %(user_id)s"]
+    if category_id is not None:
+        conditions.append(f"{alias}.category_id = %(category_id)s")
+    if start_date is not None:
+        conditions.append(f"{alias}.date >= %(start_date)s")
+    if end_date is not None:
+        conditions.append(f"{alias}.date <= %(end_date)s")
+    if min_amount is not None:
+        conditions.append(f"{alias}.amount >= %(min_amount)s")
+    if max_amount is not None:
+        conditions.append(f"{alias}.amount <= %(max_amount)s")
+    if after is not None:
+        conditions.append(f"({alias}.date, {alias}.id) < (%(after_date)s, %(after_id)s)")
+
+    return (
+        select
+        + "WHERE " + "\n        AND ".join(conditions)
+        + f"\n        ORDER BY {alias}.date DESC, {alias}.id DESC\n        LIMIT %(limit)s"
+    )
+
+@cached('transactions')
+def get_transactions_page(user_id: int, table: str, page_size: int = TRANSACTIONS_PAGE_SIZE,
+                          after=None, category_id=None, start_date=None, end_date=None,
+                          min_amount=None, max_amount=None) -> dict:
+    """One page of income or expense rows plus the (date, id) cursor for the next page"""
+    sql = build_transactions_query(table, category_id, start_date, end_date,
+                                   min_amount, max_amount, after)
+    params = {
+        'user_id': user_id,
+        'category_id': category_id,
+        'start_date': start_date,
+        'end_date': end_date,
+        'min_amount': min_amount,
+        'max_amount': max_amount,
+        'after_date': after[0] if after else None,
+        'after_id': after[1] if after else None,
+        # One extra row tells us whether there is a next page
+        'limit': page_size + 1,
+    }
+    rows = _fetchall(sql, params)
+
+    date_index = 4 if table == 'income' else 7
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][date_index], rows[-1][0])
+    return {'rows': rows, 'next': next_cursor}
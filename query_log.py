@@ -0,0 +1,350 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from psycopg2 import extensions
+
+# Every pooled connection hands out InstrumentedCursor, which times each
+# statement, counts the rows and (approximate) bytes it returns and records
+# which function issued it. Pages wrap their render in track_page() so the
+# statements can be totalled per render. Parameters are never stored, only
+# their types.
+QUERY_LOG_ENABLED = os.environ.get('QUERY_LOG', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 200))
+QUERY_STATS_MAX_STATEMENTS = int(os.environ.get('QUERY_STATS_MAX_STATEMENTS', 500))
+RENDER_HISTORY_SIZE = int(os.environ.get('RENDER_HISTORY_SIZE', 1000))
+
+# Rows measured per statement before the byte count is extrapolated
+_BYTE_SAMPLE_ROWS = 100
+# Modules whose frames are skipped when looking for the caller
+_INFRASTRUCTURE = ('query_log', 'database', 'psycopg2', 'contextlib')
+
+logger = logging.getLogger(__name__)
+
+def normalize_sql(sql) -> str:
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):  # psycopg2.sql.Composed
+        sql = repr(sql)
+    return ' '.join(sql.split())
+
+def redact_params(params):
+    """Parameter shape without values, e.g. {'user_id': 'int'}"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+def _row_bytes(row) -> int:
+    size = 0
+    for value in row.values() if isinstance(row, dict) else row:
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+def _caller() -> str:
+    """First function outside the database plumbing, skipping private helpers like _fetchall"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.split('.')[0] not in _INFRASTRUCTURE:
+            name = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+            caller = f"{name}.{frame.f_code.co_name}"
+            if not frame.f_code.co_name.startswith('_'):
+                return caller
+            fallback = fallback or caller
+        frame = frame.f_back
+    return fallback or '?'
+
+class Statement:
+    __slots__ = ('sql', 'params', 'caller', 'page', 'started_at', 'duration',
+                 'rows', 'bytes', '_sampled_rows', '_sampled_bytes')
+
+    def __init__(self, sql, params, caller, page):
+        self.sql = sql
+        self.params = params
+        self.caller = caller
+        self.page = page
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self._sampled_rows = 0
+        self._sampled_bytes = 0
+
+    def add_rows(self, rows):
+        # Size the first rows exactly, then assume the rest are similar
+        for row in rows[:max(_BYTE_SAMPLE_ROWS - self._sampled_rows, 0)]:
+            self._sampled_rows += 1
+            self._sampled_bytes += _row_bytes(row)
+        self.rows += len(rows)
+        if self._sampled_rows:
+            self.bytes = self._sampled_bytes * self.rows // self._sampled_rows
+
+class Render:
+    __slots__ = ('page', 'started_at', 'duration', 'queries', 'db_time', 'rows', 'bytes')
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+class QueryLog:
+    """Per-statement, per-page and slow-query statistics for one process"""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log_size=SLOW_QUERY_LOG_SIZE,
+                 max_statements=QUERY_STATS_MAX_STATEMENTS, render_history=RENDER_HISTORY_SIZE):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._statements = OrderedDict()  # normalized sql -> totals, least recently used first
+        self._slow = deque(maxlen=slow_log_size)
+        self._renders = deque(maxlen=render_history)
+        self._dropped_statements = 0
+
+    @property
+    def current_render(self):
+        return getattr(self._local, 'render', None)
+
+    @contextmanager
+    def track_page(self, page: str):
+        """Attribute every statement issued inside the block to one render of ``page``"""
+        render = Render(page)
+        previous = self.current_render
+        self._local.render = render
+        started = time.perf_counter()
+        try:
+            yield render
+        finally:
+            render.duration = time.perf_counter() - started
+            self._local.render = previous
+            with self._lock:
+                self._renders.append(render)
+
+    def start(self, sql, params) -> Statement:
+        render = self.current_render
+        return Statement(normalize_sql(sql), redact_params(params), _caller(),
+                         render.page if render else None)
+
+    def finish(self, statement: Statement):
+        render = self.current_render
+        if render is not None:
+            render.queries += 1
+            render.db_time += statement.duration
+            render.rows += statement.rows
+            render.bytes += statement.bytes
+
+        duration_ms = statement.duration * 1000
+        with self._lock:
+            totals = self._statements.get(statement.sql)
+            if totals is None:
+                if len(self._statements) >= self.max_statements:
+                    self._statements.popitem(last=False)
+                    self._dropped_statements += 1
+                totals = self._statements[statement.sql] = {
+                    'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'bytes': 0,
+                    'callers': set(), 'pages': set(),
+                }
+            else:
+                self._statements.move_to_end(statement.sql)
+            totals['calls'] += 1
+            totals['total_ms'] += duration_ms
+            totals['max_ms'] = max(totals['max_ms'], duration_ms)
+            totals['rows'] += statement.rows
+            totals['bytes'] += statement.bytes
+            totals['callers'].add(statement.caller)
+            if statement.page:
+                totals['pages'].add(statement.page)
+
+            slow = duration_ms >= self.slow_ms
+            if slow:
+                self._slow.append({
+                    'at': datetime.fromtimestamp(statement.started_at).isoformat(timespec='seconds'),
+                    'ms': round(duration_ms, 1),
+                    'rows': statement.rows,
+                    'bytes': statement.bytes,
+                    'caller': statement.caller,
+                    'page': statement.page,
+                    'sql': statement.sql,
+                    'params': statement.params,
+                })
+        if slow:
+            logger.warning("slow query %.0f ms in %s (page %s, %d rows): %s params=%s",
+                           duration_ms, statement.caller, statement.page, statement.rows,
+                           statement.sql[:500], statement.params)
+
+    def page_totals(self) -> list:
+        """Per page: renders, mean and max queries and DB time per render"""
+        with self._lock:
+            renders = list(self._renders)
+        pages = {}
+        for render in renders:
+            pages.setdefault(render.page, []).append(render)
+        totals = []
+        for page, page_renders in sorted(pages.items()):
+            count = len(page_renders)
+            totals.append({
+                'page': page,
+                'renders': count,
+                'queries_per_render': sum(r.queries for r in page_renders) / count,
+                'max_queries': max(r.queries for r in page_renders),
+                'db_ms_per_render': sum(r.db_time for r in page_renders) * 1000 / count,
+                'max_db_ms': max(r.db_time for r in page_renders) * 1000,
+                'render_ms': sum(r.duration for r in page_renders) * 1000 / count,
+                'rows_per_render': sum(r.rows for r in page_renders) / count,
+                'kb_per_render': sum(r.bytes for r in page_renders) / 1024 / count,
+            })
+        return totals
+
+    def statement_totals(self, limit: int = 50) -> list:
+        """Statements by total time spent, heaviest first"""
+        with self._lock:
+            items = [(sql, {**totals, 'callers': set(totals['callers']),
+                            'pages': set(totals['pages'])})
+                     for sql, totals in self._statements.items()]
+        rows = []
+        for sql, totals in items:
+            rows.append({
+                'sql': sql,
+                'calls': totals['calls'],
+                'total_ms': totals['total_ms'],
+                'mean_ms': totals['total_ms'] / totals['calls'],
+                'max_ms': totals['max_ms'],
+                'rows': totals['rows'],
+                'bytes': totals['bytes'],
+                'callers': sorted(totals['callers']),
+                'pages': sorted(totals['pages']),
+            })
+        rows.sort(key=lambda row: -row['total_ms'])
+        return rows[:limit]
+
+    def slow_queries(self) -> list:
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def snapshot(self) -> dict:
+        return {
+            'slow_query_ms': self.slow_ms,
+            'pages': self.page_totals(),
+            'statements': self.statement_totals(limit=self.max_statements),
+            'slow_queries': self.slow_queries(),
+            'dropped_statements': self._dropped_statements,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+            self._renders.clear()
+            self._dropped_statements = 0
+
+_log = QueryLog()
+
+def get_query_log() -> QueryLog:
+    return _log
+
+def track_page(page: str):
+    return _log.track_page(page)
+
+class InstrumentedCursor(extensions.cursor):
+    """psycopg2 cursor that reports every statement to the process QueryLog"""
+
+    _statement = None
+
+    def _begin(self, sql, params):
+        self._end()
+        self._statement = _log.start(sql, params)
+        return time.perf_counter()
+
+    def _end(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            _log.finish(statement)
+
+    def _timed(self, started):
+        self._statement.duration += time.perf_counter() - started
+
+    def execute(self, query, vars=None):
+        started = self._begin(query, vars)
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._timed(started)
+            # No result set: count affected rows. Named (server-side) cursors only
+            # DECLARE here and have no description until the first fetch; their
+            # statement ends when fetches run dry or the cursor closes.
+            if self.name is None and self.description is None:
+                self._statement.rows = max(self.rowcount, 0)
+                self._end()
+
+    def executemany(self, query, vars_list):
+        started = self._begin(query, None)
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._timed(started)
+            self._statement.rows = max(self.rowcount, 0)
+            self._end()
+
+    def copy_expert(self, sql, file, size=8192):
+        started = self._begin(sql, None)
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._timed(started)
+            self._statement.rows = max(self.rowcount, 0)
+            self._end()
+
+    def _fetched(self, started, rows, exhausted):
+        if self._statement is not None:
+            self._timed(started)
+            self._statement.add_rows(rows)
+            # Record the statement as soon as its results are used up, since
+            # plenty of callers never close their cursors. Client-side cursors
+            # know their row count up front; server-side ones run dry.
+            if exhausted or (self.name is None and self.rownumber >= self.rowcount):
+                self._end()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, [row] if row is not None else [], row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, rows, len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, rows, True)
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._end()
+        super().close()
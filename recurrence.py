@@ -0,0 +1,188 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+from cache import invalidate_tables
+from database import get_db_connection
+
+# Materializes recurring income and expenses. A rule is a row with
+# is_recurring set and a Weekly/Monthly/Annually frequency; its occurrences
+# are the rows anchor + n * interval (computed from the anchor, so a rule
+# on the 31st lands on the last day of shorter months rather than drifting).
+# Each rule's recurrence_generated_through is its watermark, and the unique
+# (recurrence_parent_id, date) index makes a repeated sweep a no-op.
+
+RECURRENCE_LOOKAHEAD_DAYS = int(os.environ.get('RECURRENCE_LOOKAHEAD_DAYS', 31))
+RECURRENCE_SWEEP_RETRY_SECONDS = float(os.environ.get('RECURRENCE_SWEEP_RETRY_SECONDS', 300))
+RECURRENCE_LOCK_KEY = 7310421
+
+logger = logging.getLogger(__name__)
+
+RULE_COLUMNS = {
+    'income': ('description', 'amount', 'category_id'),
+    'expenses': ('description', 'amount', 'category_id', 'payment_source_id', 'necessity_level'),
+}
+
+SWEEP_SQL = """
+    WITH rules AS (
+        SELECT id, user_id, {columns}, frequency, date AS anchor,
+               COALESCE(recurrence_generated_through, date) AS watermark,
+               CASE frequency
+                   WHEN 'Weekly' THEN INTERVAL '7 days'
+                   WHEN 'Monthly' THEN INTERVAL '1 month'
+                   ELSE INTERVAL '1 year'
+               END AS step,
+               CASE frequency
+                   WHEN 'Weekly' THEN (%(through)s::date - date) / 7
+                   WHEN 'Monthly' THEN (EXTRACT(YEAR FROM AGE(%(through)s::date, date)) * 12
+                                        + EXTRACT(MONTH FROM AGE(%(through)s::date, date)))::int
+                   ELSE EXTRACT(YEAR FROM AGE(%(through)s::date, date))::int
+               END + 1 AS steps
+        FROM {table}
+        WHERE is_recurring
+        AND recurrence_parent_id IS NULL
+        AND frequency IN ('Weekly', 'Monthly', 'Annually')
+        AND user_id IS NOT NULL
+        AND date < %(through)s
+        AND (recurrence_generated_through IS NULL
+             OR recurrence_generated_through < %(through)s)
+        {user_filter}
+    ),
+    occurrences AS (
+        SELECT r.*, (r.anchor + n * r.step)::date AS occurs_on
+        FROM rules r, generate_series(1, r.steps) n
+    ),
+    inserted AS (
+        INSERT INTO {table}
+        (user_id, {columns}, frequency, is_recurring, date, recurrence_parent_id)
+        SELECT user_id, {columns}, frequency, false, occurs_on, id
+        FROM occurrences
+        WHERE occurs_on > watermark
+        AND occurs_on <= %(through)s
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    ),
+    advanced AS (
+        UPDATE {table} t
+        SET recurrence_generated_through = %(through)s
+        FROM rules r
+        WHERE t.id = r.id
+        RETURNING t.id
+    )
+    SELECT user_id, COUNT(*) FROM inserted GROUP BY user_id
+"""
+
+@dataclass
+class SweepResult:
+    through: date
+    inserted: Dict[str, Dict[int, int]] = field(default_factory=dict)  # table -> user_id -> rows
+
+    @property
+    def total(self) -> int:
+        return sum(sum(per_user.values()) for per_user in self.inserted.values())
+
+    @property
+    def users(self) -> set:
+        return {user_id for per_user in self.inserted.values() for user_id in per_user}
+
+def sweep_sql(table: str, user_id: Optional[int] = None) -> str:
+    columns = ', '.join(RULE_COLUMNS[table])
+    user_filter = "AND user_id = %(user_id)s" if user_id is not None else ""
+    return SWEEP_SQL.format(table=table, columns=columns, user_filter=user_filter)
+
+def sweep(through: Optional[date] = None, user_id: Optional[int] = None) -> SweepResult:
+    """Insert every occurrence due up to ``through`` for all users (or one)"""
+    through = through or date.today() + timedelta(days=RECURRENCE_LOOKAHEAD_DAYS)
+    result = SweepResult(through)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Concurrent sweeps would only trip over each other's unique keys
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (RECURRENCE_LOCK_KEY,))
+        for table in RULE_COLUMNS:
+            cur.execute(sweep_sql(table, user_id), {'through': through, 'user_id': user_id})
+            result.inserted[table] = dict(cur.fetchall())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    for table, per_user in result.inserted.items():
+        for affected_user in per_user:
+            invalidate_tables(affected_user, table)
+    return result
+
+# Occurrences after today of the rules among the rows being deleted. Past
+# occurrences stay as history, unlinked by the ON DELETE SET NULL key.
+DELETE_FUTURE_OCCURRENCES_SQL = """
+    DELETE FROM {table} t
+    USING {table} r
+    WHERE r.id = ANY(%(ids)s)
+    AND r.user_id = %(user_id)s
+    AND r.is_recurring
+    AND r.recurrence_parent_id IS NULL
+    AND t.recurrence_parent_id = r.id
+    AND t.date > CURRENT_DATE
+"""
+
+def delete_transactions(cur, table: str, ids: list, user_id: int) -> int:
+    """Delete a user's rows by id, and the future occurrences of any rules among them"""
+    if table not in RULE_COLUMNS:
+        raise ValueError(f"Unknown transaction table: {table}")
+    params = {'ids': ids, 'user_id': user_id}
+    cur.execute(DELETE_FUTURE_OCCURRENCES_SQL.format(table=table), params)
+    cur.execute(f"DELETE FROM {table} WHERE id = ANY(%(ids)s) AND user_id = %(user_id)s", params)
+    return cur.rowcount
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+def _seconds_until_tomorrow() -> float:
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    return max((tomorrow - datetime.now()).total_seconds(), 1.0)
+
+def _sweep_daily():
+    while True:
+        try:
+            sweep()
+        except Exception:
+            logger.exception("recurrence sweep failed; retrying in %.0f s",
+                             RECURRENCE_SWEEP_RETRY_SECONDS)
+            time.sleep(RECURRENCE_SWEEP_RETRY_SECONDS)
+            continue
+        time.sleep(_seconds_until_tomorrow())
+
+def start_daily_sweep():
+    # Streamlit re-executes main.py on every interaction; one background
+    # thread per process sweeps now and after each midnight, off the render path
+    global _sweeper
+    if _sweeper is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_daily, name='recurrence-sweep', daemon=True)
+            _sweeper.start()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Materialize recurring income and expenses")
+    parser.add_argument('--through', type=date.fromisoformat,
+                        help=f"last date to generate (default: today + {RECURRENCE_LOOKAHEAD_DAYS} days)")
+    parser.add_argument('--user-id', type=int, help="limit to one user")
+    args = parser.parse_args(argv)
+
+    result = sweep(args.through, args.user_id)
+    for table, per_user in result.inserted.items():
+        print(f"{table}: {sum(per_user.values())} occurrences for {len(per_user)} users")
+    print(f"Generated through {result.through}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
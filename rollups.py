@@ -0,0 +1,115 @@
+import argparse
+import sys
+from typing import Optional
+from database import get_db_connection
+
+# monthly_rollups (migration 0007) holds per-user monthly sums of income and
+# expenses, kept current by statement-level triggers. verify() compares it
+# with a fresh aggregation of the raw tables; rebuild() recomputes it.
+
+ROLLUP_SOURCE_SQL = """
+    SELECT user_id, DATE_TRUNC('month', date)::date AS month, 'income' AS kind,
+           COALESCE(category_id, 0) AS category_id, 0 AS payment_source_id,
+           '' AS necessity_level, SUM(amount) AS total, COUNT(*) AS row_count
+    FROM income
+    WHERE user_id IS NOT NULL {user_filter}
+    GROUP BY 1, 2, 4
+    UNION ALL
+    SELECT user_id, DATE_TRUNC('month', date)::date, 'expense',
+           COALESCE(category_id, 0), COALESCE(payment_source_id, 0),
+           COALESCE(necessity_level, ''), SUM(amount), COUNT(*)
+    FROM expenses
+    WHERE user_id IS NOT NULL {user_filter}
+    GROUP BY 1, 2, 4, 5, 6
+"""
+
+ROLLUP_KEY = ('user_id', 'month', 'kind', 'category_id', 'payment_source_id', 'necessity_level')
+
+VERIFY_SQL = """
+    WITH expected AS ({source}),
+    actual AS (
+        SELECT * FROM monthly_rollups
+        WHERE true {user_filter}
+    )
+    SELECT COALESCE(e.user_id, a.user_id), COALESCE(e.month, a.month),
+           COALESCE(e.kind, a.kind), COALESCE(e.category_id, a.category_id),
+           COALESCE(e.payment_source_id, a.payment_source_id),
+           COALESCE(e.necessity_level, a.necessity_level),
+           e.total, a.total, e.row_count, a.row_count
+    FROM expected e
+    FULL OUTER JOIN actual a USING ({key})
+    WHERE e.total IS DISTINCT FROM a.total
+    OR e.row_count IS DISTINCT FROM a.row_count
+    ORDER BY 1, 2, 3, 4, 5, 6
+"""
+
+def _user_filter(user_id: Optional[int]) -> str:
+    return "AND user_id = %(user_id)s" if user_id is not None else ""
+
+def verify(user_id: Optional[int] = None) -> list:
+    """Rollup rows that disagree with the raw tables (empty when consistent).
+
+    Each mismatch is (user_id, month, kind, category_id, payment_source_id,
+    necessity_level, expected_total, actual_total, expected_count, actual_count).
+    """
+    user_filter = _user_filter(user_id)
+    sql = VERIFY_SQL.format(source=ROLLUP_SOURCE_SQL.format(user_filter=user_filter),
+                            user_filter=user_filter, key=', '.join(ROLLUP_KEY))
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # One snapshot for both sides of the comparison
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute(sql, {'user_id': user_id})
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+def rebuild(user_id: Optional[int] = None) -> int:
+    """Recompute rollups from the raw tables; returns the number of rollup rows"""
+    user_filter = _user_filter(user_id)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Hold off writers so the triggers can't apply a change twice
+        cur.execute("LOCK TABLE income, expenses IN SHARE MODE")
+        cur.execute(f"DELETE FROM monthly_rollups WHERE true {user_filter}", {'user_id': user_id})
+        cur.execute(
+            f"INSERT INTO monthly_rollups ({', '.join(ROLLUP_KEY)}, total, row_count) "
+            + ROLLUP_SOURCE_SQL.format(user_filter=user_filter),
+            {'user_id': user_id}
+        )
+        count = cur.rowcount
+        conn.commit()
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check or rebuild the monthly rollups")
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--user-id', type=int, help="limit to one user")
+    args = parser.parse_args(argv)
+
+    if args.command == 'rebuild':
+        count = rebuild(args.user_id)
+        print(f"Rebuilt {count} rollup rows")
+        return 0
+
+    mismatches = verify(args.user_id)
+    for row in mismatches[:50]:
+        print("user %s %s %s category=%s source=%s necessity=%r: expected %s/%s, found %s/%s"
+              % (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[8], row[7], row[9]))
+    if mismatches:
+        print(f"{len(mismatches)} rollup rows differ from the raw tables")
+        return 1
+    print("Rollups match the raw tables")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
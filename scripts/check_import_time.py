@@ -0,0 +1,126 @@
+"""Fail if cold-start import time of main.py or a page exceeds its budget.
+
+Imports each entry point in a fresh interpreter under ``python -X importtime``,
+keeps the fastest of several runs, and compares the cumulative time against
+the budgets in ``[tool.import-time]`` of pyproject.toml. It also fails if an
+entry point listed in ``lazy-entry-points`` imports one of the ``lazy``
+modules at startup. Run from the repository root:
+
+    python -m scripts.check_import_time --runs 5 --top 10
+
+Importing main.py runs init_db(), so the database must be reachable.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tomllib
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONFIG = {
+    'runs': 3,
+    'default-budget-ms': 2000,
+    'entry-points': ['main'],
+    'budgets': {},
+    'lazy': [],
+    'lazy-entry-points': [],
+}
+
+def load_config(path: str = os.path.join(ROOT, 'pyproject.toml')) -> dict:
+    with open(path, 'rb') as f:
+        configured = tomllib.load(f).get('tool', {}).get('import-time', {})
+    return {**DEFAULT_CONFIG, **configured}
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def measure(module: str) -> dict:
+    """Import ``module`` in a fresh interpreter and break down where the time went"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = parse_importtime(result.stderr)
+    total_us = next(cumulative for name, _, cumulative, depth in entries
+                    if name == module and depth == 0)
+    # Self time per top-level package, e.g. everything under plotly.*
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        by_package[name.split('.')[0]] += self_us
+    return {
+        'total_ms': total_us / 1000,
+        'packages_ms': {name: us / 1000 for name, us in by_package.items()},
+        'modules': {name for name, _, _, _ in entries},
+    }
+
+def check(config: dict, runs: int, top: int) -> tuple:
+    lazy = set(config['lazy'])
+    report = {}
+    failures = []
+    for module in config['entry-points']:
+        best = min((measure(module) for _ in range(runs)), key=lambda m: m['total_ms'])
+        budget = config['budgets'].get(module, config['default-budget-ms'])
+        loaded_lazy = sorted(lazy & best['modules'])
+        if module not in config['lazy-entry-points']:
+            loaded_lazy = []
+
+        over_budget = best['total_ms'] > budget
+        status = 'ok' if not over_budget and not loaded_lazy else 'FAIL'
+        print(f"{module:30} {best['total_ms']:8.0f} ms  (budget {budget} ms)  {status}")
+        heaviest = sorted(best['packages_ms'].items(), key=lambda item: -item[1])[:top]
+        for name, ms in heaviest:
+            print(f"    {name:26} {ms:8.1f} ms")
+        if loaded_lazy:
+            print(f"    imports lazy modules at startup: {', '.join(loaded_lazy)}")
+
+        if status == 'FAIL':
+            failures.append(module)
+        report[module] = {
+            'total_ms': round(best['total_ms'], 1),
+            'budget_ms': budget,
+            'lazy_packages_loaded': loaded_lazy,
+            'packages_ms': {name: round(ms, 1) for name, ms in heaviest},
+        }
+    return report, failures
+
+def main(argv=None) -> int:
+    config = load_config()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*',
+                        help="entry points to measure (default: all configured)")
+    parser.add_argument('--runs', type=int, default=config['runs'],
+                        help="fresh interpreters per entry point; the fastest counts")
+    parser.add_argument('--top', type=int, default=8,
+                        help="packages to list per entry point")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+    if args.modules:
+        config['entry-points'] = args.modules
+
+    report, failures = check(config, args.runs, args.top)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failures:
+        print(f"\n{len(failures)} entry point(s) over their import-time budget")
+        return 1
+    print("\nAll entry points within their import-time budget")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
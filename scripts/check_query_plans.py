@@ -0,0 +1,189 @@
+"""Fail if any hot application query sequentially scans a large table.
+
+Seeds a large synthetic dataset inside a transaction, runs EXPLAIN on each
+query shape the app issues against income/expenses, and rolls everything
+back afterwards. Run from the repository root:
+
+    python -m scripts.check_query_plans --users 200 --rows-per-user 1000
+
+Statements that live in a module are imported; the rest mirror the inline
+SQL in queries.py, so keep them in sync when those change.
+"""
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+
+from dashboard import DASHBOARD_SUMMARY_SQL
+from database import _connect, run_migrations
+from dedupe import NEAR_DUPLICATES_SQL, duplicate_report_sql
+from exporter import EXPORT_COUNT_SQL, EXPORT_SQL
+from forecast import RECURRING_RULES_SQL, STARTING_BALANCE_SQL
+from goal_simulation import SAVINGS_HISTORY_SQL
+from ledger import LEDGER_SQL
+from queries import build_transactions_query
+from recurrence import sweep_sql
+from utils import BUDGET_PROGRESS_SQL
+
+LARGE_TABLES = {'income', 'expenses', 'monthly_rollups'}
+
+APP_QUERIES = {
+    'dashboard.summary': DASHBOARD_SUMMARY_SQL,
+    'ledger.rows': LEDGER_SQL,
+    'exporter.income': EXPORT_SQL['income'],
+    'exporter.expenses': EXPORT_SQL['expenses'],
+    'exporter.count': EXPORT_COUNT_SQL.format(table='expenses'),
+    'utils.budget_progress': BUDGET_PROGRESS_SQL,
+    'income_expenses.income_page': build_transactions_query('income'),
+    'income_expenses.expenses_next_page': build_transactions_query('expenses', after=True),
+    'income_expenses.expenses_filtered': build_transactions_query(
+        'expenses', category_id=True, start_date=True, min_amount=True),
+    'dedupe.near_duplicates': NEAR_DUPLICATES_SQL['expenses'],
+    'dedupe.expense_report': duplicate_report_sql('expenses'),
+    'dedupe.income_report': duplicate_report_sql('income'),
+    'forecast.starting_balance': STARTING_BALANCE_SQL,
+    'forecast.recurring_rules': RECURRING_RULES_SQL,
+    'goal_simulation.savings_history': SAVINGS_HISTORY_SQL,
+    'recurrence.income_sweep': sweep_sql('income'),
+    'recurrence.expenses_sweep': sweep_sql('expenses'),
+    'payment_sources.usage_count': (
+        """
+        SELECT id, name, type, last_four, bank_name, is_active, created_at,
+               (SELECT COUNT(*) FROM expenses WHERE payment_source_id = payment_sources.id) as usage_count
+        FROM payment_sources
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC
+        """
+    ),
+}
+
+def seed(cur, users: int, rows_per_user: int) -> dict:
+    cur.execute("SELECT setseed(0.42)")
+    cur.execute(
+        """
+        INSERT INTO users (username, password_hash)
+        SELECT 'plan_check_' || g, 'x' FROM generate_series(1, %s) g
+        RETURNING id
+        """,
+        (users,)
+    )
+    user_ids = [row[0] for row in cur.fetchall()]
+
+    cur.execute(
+        """
+        INSERT INTO categories (name, type, is_custom)
+        SELECT 'plan_check_' || t || '_' || g, t, true
+        FROM generate_series(1, 10) g, (VALUES ('income'), ('expense')) v(t)
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO payment_sources (name, type, last_four, bank_name, is_active, user_id)
+        SELECT 'plan_check_card', 'credit_card', '0000', 'Plan Check Bank', true, u
+        FROM unnest(%s::int[]) u
+        """,
+        (user_ids,)
+    )
+
+    for table, kind in (('income', 'income'), ('expenses', 'expense')):
+        extra_columns = ", payment_source_id, necessity_level" if table == 'expenses' else ""
+        extra_values = (
+            ", (SELECT id FROM payment_sources WHERE user_id = u LIMIT 1), 'Essential'"
+            if table == 'expenses' else ""
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {table} (description, amount, category_id, date, is_recurring,
+                                 frequency, user_id{extra_columns})
+            SELECT 'plan check ' || g,
+                   round((random() * 500)::numeric, 2),
+                   (SELECT id FROM categories WHERE name = 'plan_check_{kind}_' || (1 + g %% 10)),
+                   CURRENT_DATE - (random() * 3650)::int,
+                   false, 'One-time', u{extra_values}
+            FROM unnest(%s::int[]) u, generate_series(1, %s) g
+            """,
+            (user_ids, rows_per_user)
+        )
+
+    probe_user_id = user_ids[len(user_ids) // 2]
+    cur.execute("SELECT id FROM categories WHERE name = 'plan_check_expense_1'")
+    category_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO budgets (category_id, amount, period, start_date, user_id)
+        SELECT c.id, 500, p.period, CURRENT_DATE, %s
+        FROM categories c, (VALUES ('weekly'), ('monthly')) p(period)
+        WHERE c.name LIKE 'plan_check_expense_%%'
+        """,
+        (probe_user_id,)
+    )
+
+    cur.execute("ANALYZE users, categories, payment_sources, budgets, income, expenses, monthly_rollups")
+
+    today = date.today()
+    return {
+        'user_id': probe_user_id,
+        'recent_limit': 5,
+        'today': today,
+        'start_date': today - timedelta(days=30),
+        'end_date': today,
+        'category_id': category_id,
+        'min_amount': 100,
+        'max_amount': None,
+        'after_date': today - timedelta(days=365),
+        'after_id': 0,
+        'limit': 51,
+        'amount': 100,
+        'window_days': 2,
+        'through': today + timedelta(days=31),
+        'months': 24,
+    }
+
+def seq_scans(plan: dict) -> list:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in LARGE_TABLES:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+def check(users: int, rows_per_user: int) -> list:
+    run_migrations()
+
+    conn = _connect()
+    cur = conn.cursor()
+    failures = []
+    try:
+        params = seed(cur, users, rows_per_user)
+        for name, sql in APP_QUERIES.items():
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned = seq_scans(plan[0]['Plan'])
+            status = "SEQ SCAN on " + ", ".join(sorted(set(scanned))) if scanned else "ok"
+            print(f"{name:40} {status}")
+            if scanned:
+                failures.append(name)
+    finally:
+        # Never keep the synthetic data
+        conn.rollback()
+        cur.close()
+        conn.close()
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rows-per-user', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    failures = check(args.users, args.rows_per_user)
+    if failures:
+        print(f"\n{len(failures)} query plan(s) use a sequential scan on a large table")
+        return 1
+    print("\nAll query plans use indexes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
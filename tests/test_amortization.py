@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from amortization import amortize, payoff_months, payoff_sweep
+
+def month_by_month(principal, annual_rate, payment):
+    """Reference loop: (months, total interest)"""
+    r = annual_rate / 12 / 100
+    balance, months, interest = principal, 0, 0.0
+    while balance > 1e-9:
+        charge = balance * r
+        interest += charge
+        balance = balance + charge - min(payment, balance + charge)
+        months += 1
+    return months, interest
+
+LOANS = [
+    (5000, 19.9, 150),
+    (12000, 6.5, 250),
+    (1200, 0, 100),     # no interest, pays off exactly
+    (1000, 0, 300),     # no interest, partial final payment
+    (250000, 4.25, 1300),
+]
+
+@pytest.mark.parametrize('principal, rate, payment', LOANS)
+def test_amortize_matches_a_month_by_month_loop(principal, rate, payment):
+    months, interest = month_by_month(principal, rate, payment)
+    schedule = amortize(principal, rate, payment)
+    assert schedule.months == months
+    assert schedule.total_interest == pytest.approx(interest)
+    assert schedule.balance.shape == (months,)
+    assert schedule.balance[-1] == pytest.approx(0, abs=1e-6)
+    assert schedule.interest.sum() == pytest.approx(interest)
+    assert schedule.principal_paid.sum() == pytest.approx(principal)
+
+def test_payment_at_or_below_interest_never_pays_off():
+    # 12% a year on 1000 is exactly 10 a month
+    schedule = amortize(1000, 12, [10, 5, 0], max_months=24)
+    np.testing.assert_array_equal(schedule.months, [-1, -1, -1])
+    assert schedule.negative_amortization.all()
+    assert np.isnan(schedule.total_interest).all()
+    assert schedule.balance.shape == (3, 24)
+
+def test_zero_principal_is_already_paid():
+    months, negative = payoff_months(0, 10, 0)
+    assert months == 0 and not negative
+    assert amortize(0, 10, 50).total_interest == 0
+
+def test_inputs_broadcast_and_trim_to_the_longest_payoff():
+    balances = np.array([1000.0, 3000.0])
+    payments = np.array([100.0, 200.0, 500.0])
+    schedule = amortize(balances[:, None], 12, payments[None, :])
+    assert schedule.months.shape == (2, 3)
+    assert schedule.balance.shape == (2, 3, schedule.months.max())
+    for i, balance in enumerate(balances):
+        for j, payment in enumerate(payments):
+            assert schedule.months[i, j] == month_by_month(balance, 12, payment)[0]
+
+def test_long_payoffs_are_counted_past_the_schedule():
+    schedule = amortize(100000, 6, 601, max_months=120)
+    assert schedule.months == month_by_month(100000, 6, 601)[0]
+    assert schedule.months > 120
+    assert schedule.balance.shape == (120,)
+
+def test_payoff_sweep_agrees_with_amortize():
+    payments = np.array([40.0, 100.0, 250.0, 1000.0, 5000.0])
+    sweep = payoff_sweep(4000, 18, payments)
+    schedule = amortize(4000, 18, payments)
+    np.testing.assert_array_equal(sweep['months'], schedule.months)
+    np.testing.assert_array_equal(sweep['negative_amortization'], [True] + [False] * 4)
+    np.testing.assert_allclose(sweep['total_interest'], schedule.total_interest)
+    assert sweep['months'][-1] == 1
+    assert sweep['total_interest'][-1] == pytest.approx(4000 * 0.015)
@@ -0,0 +1,23 @@
+import ipaddress
+import pytest
+import auth
+
+@pytest.fixture(autouse=True)
+def trusted_proxies(monkeypatch):
+    monkeypatch.setattr(auth, 'TRUSTED_PROXIES', (ipaddress.ip_network('127.0.0.1/32'),
+                                                  ipaddress.ip_network('10.0.0.0/8')))
+
+def test_right_most_untrusted_hop_wins():
+    assert auth._forwarded_client(['1.2.3.4, 203.0.113.7, 10.0.0.2']) == '203.0.113.7'
+
+def test_spoofed_left_hops_are_ignored():
+    assert auth._forwarded_client(['6.6.6.6', '198.51.100.1, 10.1.1.1']) == '198.51.100.1'
+
+def test_all_trusted_hops_fall_back_to_the_left_most():
+    assert auth._forwarded_client(['10.0.0.5, 127.0.0.1']) == '10.0.0.5'
+    assert auth._forwarded_client([]) is None
+
+def test_trusted_proxy_matching():
+    assert auth._is_trusted_proxy('10.200.0.1')
+    assert not auth._is_trusted_proxy('11.0.0.1')
+    assert not auth._is_trusted_proxy('not an address')
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import cache
+from cache import ResultCache, estimate_size
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+def key(namespace, user_id, call='f'):
+    return (namespace, user_id, call, ())
+
+def test_entries_expire_after_their_ttl(clock):
+    results = ResultCache(ttl=10)
+    results.set(key('debts', 1), 'a')
+    results.set(key('goals', 1), 'b', ttl=60)
+    clock[0] += 9.9
+    assert results.get(key('debts', 1)) == (True, 'a')
+    clock[0] += 0.1
+    assert results.get(key('debts', 1)) == (False, None)
+    assert results.get(key('goals', 1)) == (True, 'b')
+    assert results.stats()['entries'] == 1
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    results = ResultCache(max_entries=2)
+    results.set(key('debts', 1), 'a')
+    results.set(key('debts', 2), 'b')
+    results.get(key('debts', 1))
+    results.set(key('debts', 3), 'c')
+    assert results.get(key('debts', 2)) == (False, None)
+    assert results.get(key('debts', 1)) == (True, 'a')
+    assert results.get(key('debts', 3)) == (True, 'c')
+    assert results.stats()['evictions'] == 1
+
+def test_byte_cap_evicts_and_skips_oversized_values(clock):
+    array = np.zeros(100)
+    results = ResultCache(max_bytes=2 * array.nbytes)
+    results.set(key('ledger', 1), array)
+    results.set(key('ledger', 2), np.zeros(100))
+    assert results.stats()['bytes'] == 2 * array.nbytes
+    results.set(key('ledger', 3), np.zeros(100))
+    assert results.get(key('ledger', 1)) == (False, None)
+    assert results.stats()['bytes'] == 2 * array.nbytes
+
+    # A value over the whole cap is never stored and evicts nothing
+    results.set(key('ledger', 4), np.zeros(300))
+    assert results.get(key('ledger', 4)) == (False, None)
+    assert results.stats()['entries'] == 2
+
+def test_invalidate_drops_only_that_users_namespaces(clock):
+    results = ResultCache()
+    for user_id in (1, 2):
+        results.set(key('debts', user_id), 'debts')
+        results.set(key('goals', user_id), 'goals')
+    results.invalidate(1, 'debts')
+    assert results.get(key('debts', 1)) == (False, None)
+    assert results.get(key('goals', 1)) == (True, 'goals')
+    assert results.get(key('debts', 2)) == (True, 'debts')
+    results.invalidate_user(2)
+    assert results.get(key('debts', 2)) == (False, None)
+    assert results.get(key('goals', 2)) == (False, None)
+
+@pytest.mark.parametrize('invalidate', [
+    lambda results: results.invalidate(1, 'debts'),
+    lambda results: results.invalidate_user(1),
+    lambda results: results.clear(),
+])
+def test_load_that_raced_an_invalidation_is_not_stored(clock, invalidate):
+    results = ResultCache()
+    generation = results.generation(1, 'debts')
+    invalidate(results)
+    results.set(key('debts', 1), 'stale', generation=generation)
+    assert results.get(key('debts', 1)) == (False, None)
+    assert results.stats()['stale_sets'] == 1
+
+    results.set(key('debts', 1), 'fresh', generation=results.generation(1, 'debts'))
+    assert results.get(key('debts', 1)) == (True, 'fresh')
+
+def test_other_namespaces_keep_their_generation(clock):
+    results = ResultCache()
+    generation = results.generation(1, 'goals')
+    results.invalidate(1, 'debts')
+    results.invalidate(2, 'goals')
+    results.set(key('goals', 1), 'goals', generation=generation)
+    assert results.get(key('goals', 1)) == (True, 'goals')
+
+def test_estimate_size_counts_containers_once():
+    array = np.zeros(1000)
+    assert estimate_size([array, array]) < 2 * array.nbytes
+    assert estimate_size({'a': array}) > array.nbytes
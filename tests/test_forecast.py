@@ -0,0 +1,77 @@
+from datetime import date
+import numpy as np
+import pytest
+from forecast import FREQUENCY_STEPS, ForecastInputs, project
+
+def make_inputs(today, rules=(), debts=(), goals=(), starting_balance=0.0):
+    """rules: (anchor, frequency, signed amount); debts: (balance, rate, payment, due);
+    goals: (remaining, deadline)"""
+    steps = np.array([FREQUENCY_STEPS[rule[1]] for rule in rules], dtype=np.int64).reshape(-1, 2)
+    return ForecastInputs(
+        today=today,
+        starting_balance=starting_balance,
+        rule_anchor=np.array([rule[0] for rule in rules], dtype='datetime64[D]'),
+        rule_step_days=steps[:, 0],
+        rule_step_months=steps[:, 1],
+        rule_amount=np.array([rule[2] for rule in rules], dtype=np.float64),
+        debt_balance=np.array([debt[0] for debt in debts], dtype=np.float64),
+        debt_rate=np.array([debt[1] for debt in debts], dtype=np.float64),
+        debt_payment=np.array([debt[2] for debt in debts], dtype=np.float64),
+        debt_due=np.array([debt[3] for debt in debts], dtype='datetime64[D]'),
+        goal_remaining=np.array([goal[0] for goal in goals], dtype=np.float64),
+        goal_deadline=np.array([goal[1] for goal in goals], dtype='datetime64[D]'),
+    )
+
+def flow_dates(forecast, flow):
+    return [str(day) for day in forecast.dates[flow > 0]]
+
+def test_days_run_from_tomorrow_to_the_end_of_the_last_month():
+    forecast = project(make_inputs(date(2024, 1, 31)), 2)
+    assert forecast.dates[0] == np.datetime64('2024-02-01')
+    assert forecast.dates[-1] == np.datetime64('2024-04-30')
+    assert len(forecast.dates) == len(forecast.balance) == 29 + 31 + 30
+
+def test_monthly_rule_clamps_to_the_end_of_short_months():
+    rules = [(date(2023, 10, 31), 'Monthly', 1000.0)]
+    forecast = project(make_inputs(date(2024, 1, 10), rules), 4)
+    assert flow_dates(forecast, forecast.inflow) == [
+        '2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30', '2024-05-31']
+    assert forecast.inflow.sum() == 5000
+
+def test_annual_rule_on_a_leap_day_falls_on_february_28():
+    rules = [(date(2024, 2, 29), 'Annually', -120.0)]
+    forecast = project(make_inputs(date(2024, 3, 1), rules), 24)
+    assert flow_dates(forecast, forecast.outflow) == ['2025-02-28', '2026-02-28']
+
+def test_weekly_rule_keeps_its_weekday_and_future_anchors_start_on_time():
+    rules = [(date(2024, 1, 3), 'Weekly', 50.0), (date(2024, 2, 20), 'Weekly', -20.0)]
+    forecast = project(make_inputs(date(2024, 2, 1), rules), 0)
+    assert flow_dates(forecast, forecast.inflow) == [
+        '2024-02-07', '2024-02-14', '2024-02-21', '2024-02-28']
+    assert flow_dates(forecast, forecast.outflow) == ['2024-02-20', '2024-02-27']
+
+def test_debt_payments_fall_on_the_due_day_and_stop_at_payoff():
+    # 1000 at 12% with 400 a month: 400, 400, then the remaining 218.26
+    debts = [(1000.0, 12.0, 400.0, date(2024, 1, 31))]
+    forecast = project(make_inputs(date(2024, 1, 15), debts=debts), 6)
+    assert flow_dates(forecast, forecast.outflow) == ['2024-01-31', '2024-02-29', '2024-03-31']
+    payments = forecast.outflow[forecast.outflow > 0]
+    assert payments == pytest.approx([400, 400, 218.261])
+    assert project(make_inputs(date(2024, 1, 15), debts=debts), 6,
+                   include_debts=False).outflow.sum() == 0
+
+def test_goal_contributions_are_spread_over_the_months_to_the_deadline():
+    goals = [(900.0, date(2024, 4, 20))]
+    forecast = project(make_inputs(date(2024, 1, 15), goals=goals), 6)
+    assert flow_dates(forecast, forecast.outflow) == ['2024-02-01', '2024-03-01', '2024-04-01']
+    assert forecast.outflow.sum() == pytest.approx(900)
+
+def test_balance_and_monthly_totals():
+    rules = [(date(2024, 1, 1), 'Monthly', 3000.0), (date(2024, 1, 5), 'Monthly', -1200.0)]
+    forecast = project(make_inputs(date(2024, 1, 10), rules, starting_balance=500.0), 2,
+                       starting_balance=100.0)
+    months, net, balance = forecast.monthly()
+    assert [str(month) for month in months] == ['2024-01', '2024-02', '2024-03']
+    assert net.tolist() == [0, 1800, 1800]
+    assert balance.tolist() == [100, 1900, 3700]
+    assert forecast.balance[forecast.lowest_balance_index] == 100
@@ -0,0 +1,23 @@
+import numpy as np
+from goal_simulation import MAX_SIMULATION_MONTHS, simulate_goals
+
+def test_deadline_past_the_horizon_is_judged_at_it():
+    # 100 a month always; the goal needs more than the horizon can save
+    target = 100 * MAX_SIMULATION_MONTHS + 1200
+    outlook = simulate_goals([100.0], [target], [MAX_SIMULATION_MONTHS + 60], paths=10)
+    assert outlook.probability[0] == 0
+    assert outlook.required_monthly_contribution[0] == 1200 / MAX_SIMULATION_MONTHS
+    assert np.isinf(outlook.median_months[0])
+
+def test_shared_goals_fill_in_priority_order():
+    outlook = simulate_goals([100.0], [300, 300], [3, 5], paths=10)
+    np.testing.assert_array_equal(outlook.probability, [1, 0])
+    # The second goal is only funded in month 6, past the 5-month horizon
+    np.testing.assert_array_equal(outlook.median_months, [3, np.inf])
+    np.testing.assert_allclose(outlook.required_monthly_contribution, [0, 20])
+
+def test_funded_goal_needs_nothing():
+    outlook = simulate_goals([50.0], [0], [0], paths=10)
+    assert outlook.probability[0] == 1
+    assert outlook.required_monthly_contribution[0] == 0
+    assert outlook.median_months[0] == 0
@@ -0,0 +1,62 @@
+import io
+from datetime import date
+from decimal import Decimal
+import pytest
+from importer import (ImportReport, RowError, _Lookups, _staging_rows, parse_amount,
+                      parse_csv, parse_ofx, parse_qif)
+
+MAPPING = {'date': 'Date', 'amount': 'Amount', 'description': 'Desc'}
+
+def stage(records):
+    report = ImportReport()
+    rows = list(_staging_rows(records, _Lookups(1, 10, 20, 30), 'Essential', report))
+    return rows, report
+
+def test_short_csv_row_is_rejected_per_row():
+    stream = io.StringIO('Date,Amount,Desc\n2024-01-02,5.00,ok\n2024-01-03\n')
+    rows, report = stage(parse_csv(stream, MAPPING))
+    assert [row[0] for row in rows] == [2]
+    assert report.rejects == [(3, 'missing amount')]
+
+def test_short_csv_row_missing_date_is_rejected():
+    stream = io.StringIO('Amount,Desc,Date\n5.00,ok,2024-01-02\n-3.00,short\n')
+    rows, report = stage(parse_csv(stream, MAPPING))
+    assert len(rows) == 1
+    assert report.rejects == [(3, 'missing date')]
+
+@pytest.mark.parametrize('value', ['NaN', 'sNaN', '-nan', 'Infinity', '(inf)'])
+def test_non_finite_amounts_are_rejected(value):
+    with pytest.raises(RowError):
+        parse_amount(value)
+
+@pytest.mark.parametrize('value', ['10000000000', '-10000000000.00', '9999999999.995', '1e30'])
+def test_amounts_beyond_the_column_are_rejected(value):
+    with pytest.raises(RowError, match='out of range'):
+        parse_amount(value)
+
+def test_amounts_round_to_the_column_scale():
+    assert parse_amount('9999999999.994') == Decimal('9999999999.99')
+    assert parse_amount('(1,234.565)') == Decimal('-1234.57')
+    assert parse_amount('$0.125') == Decimal('0.13')
+
+def test_bad_amounts_do_not_abort_the_file():
+    stream = io.StringIO('Date,Amount,Desc\n'
+                         '2024-01-02,NaN,a\n'
+                         '2024-01-03,123456789012,b\n'
+                         '2024-01-04,-7.50,c\n')
+    rows, report = stage(parse_csv(stream, MAPPING))
+    assert [(row[0], row[1], row[3]) for row in rows] == [(4, 'expense', '7.50')]
+    assert [line_no for line_no, _ in report.rejects] == [2, 3]
+    assert report.rows_read == 3
+
+def test_ofx_and_qif_reject_non_finite_amounts():
+    ofx = io.StringIO('<STMTTRN>\n<DTPOSTED>20240102\n<TRNAMT>NaN\n<NAME>x\n</STMTTRN>\n')
+    qif = io.StringIO('!Type:Bank\nD01/02/2024\nT1e12\nPx\n^\n')
+    for records in (parse_ofx(ofx), parse_qif(qif)):
+        [(line_no, record)] = list(records)
+        assert isinstance(record, RowError)
+
+def test_valid_csv_row_parses():
+    stream = io.StringIO('Date,Amount,Desc\n2024-01-02,5.00, ok \n')
+    [(line_no, record)] = list(parse_csv(stream, MAPPING))
+    assert record == {'description': 'ok', 'amount': Decimal('5.00'), 'date': date(2024, 1, 2)}
@@ -0,0 +1,87 @@
+from datetime import date
+import numpy as np
+from ledger import ROW_COLUMNS, Ledger, _encode
+
+# (is_expense, date, cents, category_id, payment_source_id, necessity_level)
+ROWS = [
+    (False, date(2024, 1, 1), 500000, 1, 0, ''),
+    (True, date(2024, 1, 1), 1250, 2, 7, 'Essential'),
+    (True, date(2024, 1, 15), 4000, 3, 7, 'Optional'),
+    (True, date(2024, 1, 31), 999, 2, 0, 'Essential'),
+    (True, date(2024, 2, 1), 2500, 9, 8, 'Essential'),
+    (False, date(2024, 2, 1), 10000, 0, 0, ''),
+]
+
+def make_ledger(rows=ROWS):
+    columns = list(zip(*rows))
+    category_ids, category = _encode(np.array(columns[3], dtype=np.int64))
+    source_ids, source = _encode(np.array(columns[4], dtype=np.int64))
+    necessity_levels, necessity = _encode(np.array(columns[5], dtype=str))
+    names = {1: 'Salary', 2: 'Food', 3: 'Fun'}  # category 9 was deleted
+    return Ledger(
+        is_expense=np.array(columns[0], dtype=bool),
+        dates=np.array(columns[1], dtype='datetime64[D]'),
+        cents=np.array(columns[2], dtype=np.int64),
+        category=category,
+        payment_source=source,
+        necessity=necessity,
+        category_ids=category_ids,
+        category_names=tuple(names.get(int(i)) for i in category_ids),
+        payment_source_ids=source_ids,
+        payment_sources=tuple(None if i == 0 else ('Card', 'Bank', 'credit_card') for i in source_ids),
+        necessity_levels=tuple(necessity_levels.tolist()),
+    )
+
+def test_between_is_inclusive_and_slices_every_row_column():
+    ledger = make_ledger()
+    january = ledger.between(date(2024, 1, 1), date(2024, 1, 31))
+    assert len(january) == 4
+    assert january.cents.tolist() == [500000, 1250, 4000, 999]
+    for name in ROW_COLUMNS:
+        assert len(getattr(january, name)) == 4
+    assert january.category_ids is ledger.category_ids
+    assert january.category_names == ledger.category_names
+
+def test_between_returns_views_not_copies():
+    ledger = make_ledger()
+    middle = ledger.between(date(2024, 1, 2), date(2024, 1, 31))
+    for name in ROW_COLUMNS:
+        assert np.shares_memory(getattr(middle, name), getattr(ledger, name))
+
+def test_between_outside_the_data_is_empty():
+    ledger = make_ledger()
+    assert len(ledger.between(date(2023, 1, 1), date(2023, 12, 31))) == 0
+    assert len(ledger.between(date(2024, 2, 2), date(2024, 3, 1))) == 0
+    assert len(ledger.between(date(2024, 1, 31), date(2024, 1, 1))) == 0
+    empty = ledger.between(date(2025, 1, 1), date(2025, 1, 1))
+    assert empty.sum_by_day()[1].tolist() == []
+
+def test_known_category_drops_missing_and_deleted_categories():
+    ledger = make_ledger()
+    assert ledger.known_category().tolist() == [True, True, True, True, False, False]
+
+def test_sums_over_a_slice():
+    january = make_ledger().between(date(2024, 1, 1), date(2024, 1, 31))
+    expenses = january.is_expense & january.known_category()
+    assert january.total(expenses) == 1250 + 4000 + 999
+
+    cents, counts = january.sum_by('category', expenses)
+    by_id = dict(zip(january.category_ids.tolist(), zip(cents.tolist(), counts.tolist())))
+    assert by_id[2] == (2249, 2)
+    assert by_id[3] == (4000, 1)
+    assert by_id[9] == (0, 0)
+
+    cents, _ = january.sum_by('necessity', expenses)
+    assert dict(zip(january.necessity_levels, cents.tolist())) == {
+        '': 0, 'Essential': 2249, 'Optional': 4000}
+
+    days, cents = january.sum_by_day(expenses)
+    assert [str(day) for day in days] == ['2024-01-01', '2024-01-15', '2024-01-31']
+    assert cents.tolist() == [1250, 4000, 999]
+
+def test_encode_uses_the_narrowest_code_type():
+    labels, codes = _encode(np.array([30, 10, 30, 20]))
+    assert labels.tolist() == [10, 20, 30]
+    assert codes.tolist() == [2, 0, 2, 1]
+    assert codes.dtype == np.int8
+    assert _encode(np.arange(300))[1].dtype == np.int16
@@ -0,0 +1,54 @@
+from datetime import date
+import numpy as np
+import pytest
+from amortization import amortize
+from payoff_strategies import simulate_strategies, strategy_orders
+
+BALANCES = [3000.0, 500.0, 8000.0]
+RATES = [22.0, 9.0, 5.0]
+MINIMUMS = [60.0, 25.0, 120.0]
+
+def test_orders_put_highest_rate_or_smallest_balance_first():
+    orders = strategy_orders(BALANCES, RATES, [2, 0, 1])
+    np.testing.assert_array_equal(orders, [[0, 1, 2], [1, 0, 2], [2, 0, 1]])
+
+def test_custom_order_must_be_a_permutation():
+    with pytest.raises(ValueError, match='permutation'):
+        strategy_orders(BALANCES, RATES, [0, 0, 1])
+
+def test_budget_must_cover_the_minimums():
+    with pytest.raises(ValueError, match='minimum'):
+        simulate_strategies(BALANCES, RATES, MINIMUMS, sum(MINIMUMS) - 1)
+
+def test_single_debt_matches_amortize():
+    results = simulate_strategies([5000.0], [19.9], [100.0], 150.0, start=date(2024, 1, 15))
+    schedule = amortize(5000, 19.9, 150)
+    for result in results.values():
+        assert result.months == schedule.months
+        assert result.total_interest == pytest.approx(schedule.total_interest, abs=0.01)
+        assert result.payoff_date[0] == np.datetime64('2024-01') + schedule.months.astype('timedelta64[M]')
+
+def test_budget_is_spent_in_priority_order_and_never_exceeded():
+    budget = 400.0
+    results = simulate_strategies(BALANCES, RATES, MINIMUMS, budget)
+    for result in results.values():
+        assert (result.payment.sum(axis=1) <= budget + 1e-9).all()
+        assert result.payment[:-1].sum(axis=1) == pytest.approx(budget)
+        # Debts clear in the strategy's order, the last one on the final month
+        assert (np.diff(result.payoff_month[result.order]) >= 0).all()
+        assert result.payoff_month.max() == result.months == len(result.balance)
+        assert not result.balance[-1].any()
+
+    avalanche, snowball = results['avalanche'], results['snowball']
+    assert avalanche.total_interest < snowball.total_interest
+    assert snowball.payoff_month[1] < avalanche.payoff_month[1]
+
+def test_empty_debts_and_unreached_payoffs():
+    results = simulate_strategies([0.0, 10000.0], [10.0, 12.0], [0.0, 101.0], 101.0,
+                                  horizon_months=24, start=date(2024, 1, 1))
+    result = results['avalanche']
+    np.testing.assert_array_equal(result.payoff_month, [0, -1])
+    assert result.payoff_date[0] == np.datetime64('2024-01')
+    assert np.isnat(result.payoff_date[1])
+    assert result.months == -1
+    assert result.balance.shape == (24, 2)
@@ -0,0 +1,63 @@
+import os
+import psycopg2
+import pytest
+from database import _connect
+from query_log import InstrumentedCursor, get_query_log
+
+SERIES_SQL = "SELECT g FROM generate_series(1, %(n)s) g"
+
+@pytest.fixture
+def conn():
+    # database._connect() needs DATABASE_URL or the PG* variables
+    if not (os.environ.get('DATABASE_URL') or os.environ.get('PGHOST')):
+        pytest.skip("no database configured (DATABASE_URL or PGHOST)")
+    try:
+        conn = _connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no database: {e}")
+    conn.cursor_factory = InstrumentedCursor
+    get_query_log().reset()
+    yield conn
+    conn.rollback()
+    conn.close()
+
+def recorded(sql=SERIES_SQL):
+    return [row for row in get_query_log().statement_totals() if row['sql'] == sql]
+
+def test_named_cursor_counts_rows_fetched_after_execute(conn):
+    cur = conn.cursor(name='query_log_named')
+    cur.itersize = 10
+    cur.execute(SERIES_SQL, {'n': 25})
+    assert recorded() == []
+    assert [row[0] for row in cur] == list(range(1, 26))
+    [statement] = recorded()
+    assert (statement['calls'], statement['rows']) == (1, 25)
+    cur.close()
+    assert recorded()[0]['calls'] == 1
+
+def test_named_cursor_partly_fetched_ends_on_close(conn):
+    cur = conn.cursor(name='query_log_partial')
+    cur.execute(SERIES_SQL, {'n': 25})
+    assert len(cur.fetchmany(5)) == 5
+    assert recorded() == []
+    cur.close()
+    [statement] = recorded()
+    assert (statement['calls'], statement['rows']) == (1, 5)
+
+def test_client_cursor_ends_when_rows_are_used_up(conn):
+    cur = conn.cursor()
+    cur.execute(SERIES_SQL, {'n': 3})
+    cur.fetchone()
+    assert recorded() == []
+    cur.fetchall()
+    [statement] = recorded()
+    assert (statement['calls'], statement['rows']) == (1, 3)
+    cur.close()
+
+def test_statement_without_result_set_ends_on_execute(conn):
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE query_log_t (n INTEGER)")
+    cur.execute("INSERT INTO query_log_t SELECT generate_series(1, 4)")
+    [statement] = recorded("INSERT INTO query_log_t SELECT generate_series(1, 4)")
+    assert statement['rows'] == 4
+    cur.close()
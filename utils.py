@@ -1,105 +1,118 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from database import get_db_connection
+import io
+from datetime import date, datetime, timedelta
+from cache import cached
+from database import db_connection
+import lookups
 from decimal import Decimal
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 def calculate_monthly_savings(income_total: float, expense_total: float) -> float:
     return income_total - expense_total
 
-def generate_spending_chart(expenses_df: pd.DataFrame):
+def generate_spending_chart(expenses_df: "pd.DataFrame"):
+    import plotly.express as px
     fig = px.pie(expenses_df, values='amount', names='category', title='Spending by Category')
     return fig
 
-def generate_trend_chart(transactions_df: pd.DataFrame):
+def generate_trend_chart(transactions_df: "pd.DataFrame"):
+    import plotly.express as px
     fig = px.line(transactions_df, x='date', y='amount', title='Spending Trend')
     return fig
 
 def calculate_debt_payoff(principal: float, interest_rate: float, monthly_payment: float) -> dict:
-    months = 0
-    remaining_balance = principal
-    total_interest = 0
-    
-    while remaining_balance > 0:
-        interest = remaining_balance * (interest_rate / 12 / 100)
-        total_interest += interest
-        
-        if monthly_payment > remaining_balance + interest:
-            monthly_payment = remaining_balance + interest
-            
-        principal_payment = monthly_payment - interest
-        remaining_balance -= principal_payment
-        months += 1
-        
-        if months > 360:  # 30 years maximum
-            break
-            
+    from amortization import amortize
+    schedule = amortize(principal, interest_rate, monthly_payment)
+    if schedule.negative_amortization:
+        # The payment doesn't cover the monthly interest, so the balance only grows
+        return {
+            'months': None,
+            'total_interest': None,
+            'total_payment': None,
+            'negative_amortization': True
+        }
+    total_interest = float(schedule.total_interest)
     return {
-        'months': months,
+        'months': int(schedule.months),
         'total_interest': total_interest,
-        'total_payment': principal + total_interest
+        'total_payment': principal + total_interest,
+        'negative_amortization': False
     }
 
-def export_to_csv(data: pd.DataFrame, filename: str):
-    return data.to_csv(index=False).encode('utf-8')
+def export_to_csv(data: "pd.DataFrame", filename: str):
+    # Encode straight into the buffer rather than building a str and copying it
+    buffer = io.BytesIO()
+    data.to_csv(buffer, index=False, encoding='utf-8')
+    return buffer.getvalue()
 
 def calculate_goal_progress(current_amount: Decimal, target_amount: Decimal) -> float:
     if target_amount == 0:
         return 0.0
     return float(min((current_amount / target_amount) * 100, 100))
 
-def get_category_name(category_id: int) -> str:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM categories WHERE id = %s", (category_id,))
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-    return result[0] if result else "Unknown"
-
-def calculate_budget_progress(category_id: int, period: str, user_id: int) -> dict:
-    conn = get_db_connection()
-    cur = conn.cursor()
+def get_category_name(category_id: int, user_id: int = None) -> str:
+    return lookups.get_category_name(category_id, user_id) or "Unknown"
 
-    # Get budget amount
-    cur.execute(
-        "SELECT amount FROM budgets WHERE category_id = %s AND period = %s AND user_id = %s",
-        (category_id, period, user_id)
+# Spent/remaining for every budget of a user in one grouped pass. Monthly
+# budgets read monthly_rollups; weekly periods start on Monday, matching
+# datetime.weekday(), and are summed from expenses.
+BUDGET_PROGRESS_SQL = """
+    WITH periods AS (
+        SELECT b.category_id, b.period, b.amount,
+               CASE WHEN b.period = 'monthly'
+                    THEN DATE_TRUNC('month', %(today)s::date)::date
+                    ELSE DATE_TRUNC('week', %(today)s::date)::date
+               END AS start_date
+        FROM budgets b
+        WHERE b.user_id = %(user_id)s
     )
-    budget = cur.fetchone()
+    SELECT p.category_id, p.period, p.amount,
+           CASE WHEN p.period = 'monthly' THEN (
+               SELECT COALESCE(SUM(r.total), 0)
+               FROM monthly_rollups r
+               WHERE r.user_id = %(user_id)s
+               AND r.month = p.start_date
+               AND r.kind = 'expense'
+               AND r.category_id = p.category_id
+           ) ELSE (
+               SELECT COALESCE(SUM(e.amount), 0)
+               FROM expenses e
+               WHERE e.user_id = %(user_id)s
+               AND e.category_id = p.category_id
+               AND e.date >= p.start_date
+               AND e.date < p.start_date + 7
+           ) END AS spent
+    FROM periods p
+"""
 
-    if not budget:
-        return {'progress': 0, 'remaining': 0}
-
-    budget_amount = float(budget[0])
+@cached('budget_progress')
+def _budget_progress_for(user_id: int, today: date) -> dict:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(BUDGET_PROGRESS_SQL, {'user_id': user_id, 'today': today})
+        rows = cur.fetchall()
+        cur.close()
 
-    # Calculate period dates
-    today = datetime.now()
-    if period == 'monthly':
-        start_date = datetime(today.year, today.month, 1)
-        end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    else:  # weekly
-        start_date = today - timedelta(days=today.weekday())
-        end_date = start_date + timedelta(days=6)
+    progress = {}
+    for category_id, period, amount, spent in rows:
+        budget_amount = float(amount)
+        spent = float(spent)
+        progress[(category_id, period)] = {
+            'budget': budget_amount,
+            'spent': spent,
+            'progress': (spent / budget_amount) * 100 if budget_amount else 0,
+            'remaining': budget_amount - spent
+        }
+    return progress
 
-    # Get spent amount for the specific user
-    cur.execute(
-        """
-        SELECT COALESCE(SUM(amount), 0) 
-        FROM expenses 
-        WHERE category_id = %s 
-        AND date BETWEEN %s AND %s
-        AND user_id = %s
-        """,
-        (category_id, start_date, end_date, user_id)
-    )
-    spent = float(cur.fetchone()[0])
+def calculate_all_budget_progress(user_id: int) -> dict:
+    """Progress for all of a user's budgets, keyed by (category_id, period)"""
+    return _budget_progress_for(user_id, date.today())
 
-    cur.close()
-    conn.close()
-
-    return {
-        'progress': (spent / budget_amount) * 100,
-        'remaining': budget_amount - spent
-    }
+def calculate_budget_progress(category_id: int, period: str, user_id: int) -> dict:
+    progress = calculate_all_budget_progress(user_id).get((category_id, period))
+    if not progress:
+        return {'progress': 0, 'remaining': 0}
+    return {'progress': progress['progress'], 'remaining': progress['remaining']}